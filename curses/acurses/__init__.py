@@ -1,11 +1,47 @@
 import curses
 import _curses
+import sys
 
-import acurses.main
+from acurses import perf, startup
+
+PROFILE_STARTUP_FLAG = "--profile-startup"
+PERF_FLAG = "--perf"
+PERF_JSON_FLAG = "--perf-json" # followed by the path to write the latencies to on exit
 
 def run_mm(scr: _curses.window) -> None:
-    mm = main.MainMenu(scr)
+    startup.mark("curses initialised")
+
+    # imported here rather than at module level, so that `import acurses` is
+    # cheap and the curses screen comes up before the rest is imported
+    from acurses.main import MainMenu
+
+    mm = MainMenu(scr)
     mm.mainloop()
 
 def run() -> None:
-    curses.wrapper(run_mm)
+    """Runs the curses front-end; with --profile-startup, an import-time and
+    startup phase-time breakdown is printed to stderr on exit. With --perf,
+    operation latencies are recorded (see acurses.perf) and shown by :perf;
+    --perf-json <path> also writes them to path on exit"""
+    args = sys.argv[1:]
+    perf_json_path = None
+
+    if PERF_JSON_FLAG in args:
+        i = args.index(PERF_JSON_FLAG)
+        if i + 1 >= len(args):
+            sys.exit(f"{PERF_JSON_FLAG} needs a path")
+        perf_json_path = args[i + 1]
+
+    if PROFILE_STARTUP_FLAG in args:
+        startup.enable_profile()
+
+    if PERF_FLAG in args or perf_json_path is not None:
+        perf.enable()
+
+    try:
+        curses.wrapper(run_mm)
+    finally:
+        if startup.profile is not None:
+            startup.profile.report()
+        if perf_json_path is not None:
+            perf.recorder.dump_json(perf_json_path)
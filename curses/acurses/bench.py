@@ -0,0 +1,280 @@
+"""Benchmarks: `python -m acurses.bench print` times styled printing on the
+real terminal; the other scenarios drive whole screens headlessly (see
+acurses.headless) against a generated collection, reporting per-key frame
+times, backend calls, curses calls and (with --allocations) memory.
+
+    python -m acurses.bench [print|decks|search|review|all] [--decks N] [--notes N] [--reviews N]
+"""
+
+import argparse
+import curses
+import _curses
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from acurses.io import print_text_and_attrs, print_styled_mu
+from acurses.html import AttrParser
+from acurses.headless import PAUSE, FakeScreen, KeyRecord, ScriptExhausted, headless_curses, keys
+from acurses.style import init_style
+
+SCREEN_LINES, SCREEN_COLS = 40, 120
+WORDS = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+         "incididunt ut labore et dolore magna aliqua enim ad minim veniam quis nostrud").split()
+
+def print_text_and_attrs_per_char(
+    win: _curses.window,
+    line: int,
+    col: int,
+    raw_text: str,
+    attrs: list[int]
+    ) -> None:
+    """Reference implementation of print_text_and_attrs (one curses call per
+    char), kept for comparison"""
+    for i in range(len(raw_text)):
+        if col + i >= win.getmaxyx()[1]: # out of bounds
+            return
+
+        if col + i + 1 == win.getmaxyx()[1]: # last col
+            win.insstr(line, col + i, raw_text[i], attrs[i])
+        else:
+            win.addstr(line, col + i, raw_text[i], attrs[i])
+
+def time_print(
+    win: _curses.window,
+    print_fn,
+    lines: list[tuple[str, list[int]]],
+    frames: int
+    ) -> float:
+    """Returns the mean time (in seconds) taken by print_fn to print every line
+    of a frame onto win"""
+    start = time.perf_counter()
+
+    for _ in range(frames):
+        for i, (raw_text, attrs) in enumerate(lines):
+            print_fn(win, i, 0, raw_text, attrs)
+
+    return (time.perf_counter() - start) / frames
+
+def bench_print(scr: _curses.window, frames: int = 200) -> list[str]:
+    """Compares per-char and run-length printing of a full screen of styled
+    text onto an (unrefreshed) pad"""
+    init_style()
+
+    height, width = curses.LINES, curses.COLS
+    pad = curses.newpad(height, width)
+
+    # alternate list-style rows and card-style text lines
+    text = ("lorem ipsum dolor sit amet " * (width // 27 + 1))[:width // 2]
+    row_markup = f"<so> {text}</so>" + " " * (width // 3) + "<blue>12</blue> <red>3</red> <green>40</green>"
+    card_markup = f"{text} <blue>{text[:width // 8]}</blue> {text[:width // 4]}"
+    markup_lines = [row_markup if i % 2 else card_markup for i in range(height)]
+    lines = [AttrParser.parse(markup) for markup in markup_lines]
+
+    per_char = time_print(pad, print_text_and_attrs_per_char, lines, frames)
+    batched = time_print(pad, print_text_and_attrs, lines, frames)
+    markup = time_print(pad, lambda win, line, col, text, attrs: print_styled_mu(win, line, col, text),
+                        [(markup, None) for markup in markup_lines], frames)
+
+    return [
+        f"full-screen frame ({height}x{width}), mean of {frames}:",
+        f"  per-char: {per_char * 1000:8.3f} ms",
+        f"  batched:  {batched * 1000:8.3f} ms  ({per_char / batched:.1f}x)",
+        f"  markup:   {markup * 1000:8.3f} ms  ({per_char / markup:.1f}x, cached parse + runs)",
+    ]
+
+# Synthetic collection
+##########################################################################
+
+def deck_name(i: int) -> str:
+    return f"Synthetic::Group {i // 100:03}::Deck {i:05}"
+
+def build_synthetic_collection(path: str, decks: int, notes: int, reviews: int, seed: int = 0) -> None:
+    """Creates a collection at path with decks decks (nested in groups of 100),
+    notes basic notes spread across them, and reviews of their cards due for
+    review today"""
+    from anki.collection import Collection
+
+    rng = random.Random(seed)
+    col = Collection(path)
+
+    conf = col.decks.get_config(1) # the default options group
+    conf["rev"]["perDay"] = max(conf["rev"]["perDay"], reviews)
+    col.decks.update_config(conf)
+
+    deck_ids = [col.decks.id(deck_name(i)) for i in range(decks)]
+    notetype = col.models.by_name("Basic")
+    card_ids = []
+
+    for i in range(notes):
+        note = col.new_note(notetype)
+        note["Front"] = f"front {i} " + " ".join(rng.choices(WORDS, k = 8))
+        note["Back"] = f"back {i} " + " ".join(rng.choices(WORDS, k = 24))
+        col.add_note(note, deck_ids[i % decks])
+
+        if len(card_ids) < reviews:
+            card_ids.extend(note.card_ids())
+
+        if i % 10000 == 0:
+            print(f"  generating notes: {i}/{notes}", file = sys.stderr)
+
+    col.sched.set_due_date(card_ids[:reviews], "0")
+    col.close()
+
+def synthetic_collection(decks: int, notes: int, reviews: int) -> str:
+    """Returns the path of a synthetic collection of the given size, generating
+    it on first use (it's kept in the temp dir between runs)"""
+    path = os.path.join(tempfile.gettempdir(), f"acurses-bench-{decks}d-{notes}n-{reviews}r.anki2")
+
+    if not os.path.exists(path):
+        print(f"Generating {path}", file = sys.stderr)
+        build_synthetic_collection(path + ".tmp", decks, notes, reviews)
+        os.rename(path + ".tmp", path)
+
+    return path
+
+# Scenarios
+##########################################################################
+
+def decks_script(args: argparse.Namespace) -> list[int | None]:
+    """Scrolls through the deck list, then searches it"""
+    return keys(
+        "j" * 2000, "k" * 500, "f" * 300, "b" * 300, "G", "g",
+        "/", "Deck 00777", PAUSE, "\n", "n" * 10,
+        "q",
+    )
+
+def search_script(args: argparse.Namespace) -> list[int | None]:
+    """Finds notes with :find, then scrolls and searches the results"""
+    return keys(
+        ":find\n", "dolor\n",
+        "j" * 500, "f" * 50,
+        "/", f"front {args.notes // 2}", PAUSE, "\n", "n" * 10,
+        "q", "q",
+    )
+
+def review_script(args: argparse.Namespace) -> list[int | None]:
+    """Studies all decks, flipping and answering args.reviews cards"""
+    return keys("L", " 3" * args.reviews, "q", "q")
+
+SCENARIOS = {
+    "decks": decks_script,
+    "search": search_script,
+    "review": review_script,
+}
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    """Nearest-rank percentile (0 <= p <= 100) of a non-empty sorted list"""
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p / 100))]
+
+def summarize(label: str, records: list[KeyRecord]) -> str:
+    times = sorted(r.seconds * 1000 for r in records)
+    backend = sum(r.backend_calls for r in records)
+    curses_calls = sum(r.curses_calls for r in records)
+
+    return (f"  {label:<8} {len(records):6} keys | ms p50 {percentile(times, 50):7.3f}  "
+            f"p90 {percentile(times, 90):7.3f}  p99 {percentile(times, 99):7.3f}  max {times[-1]:8.3f} | "
+            f"backend/key {backend / len(records):6.1f} | curses/key {curses_calls / len(records):7.1f}")
+
+def run_scenario(name: str, args: argparse.Namespace, col_path: str) -> list[str]:
+    """Runs a MainMenu (with a config pointing at a scratch copy of col_path)
+    on a FakeScreen playing the scenario's key script"""
+    from acurses.main import MainMenu
+
+    home = tempfile.mkdtemp(prefix = "acurses-bench-")
+    scratch_path = os.path.join(home, "collection.anki2")
+    shutil.copy(col_path, scratch_path)
+
+    os.makedirs(os.path.join(home, ".config", "anki-curses"))
+    with open(os.path.join(home, ".config", "anki-curses", "config.toml"), "w") as file:
+        file.write(f'collection_path = "{scratch_path}"\nsync = false\n')
+
+    mm = None
+
+    def probe() -> tuple[int, int]:
+        backend_calls = mm.col._backend.command_count if mm is not None and hasattr(mm, "col") else 0
+        memory = tracemalloc.get_traced_memory()[0] if args.allocations else 0
+        return backend_calls, memory
+
+    screen = FakeScreen(SCREEN_LINES, SCREEN_COLS, SCENARIOS[name](args), args.typeahead, probe)
+    old_home = os.environ.get("HOME")
+    os.environ["HOME"] = home
+    error = None
+
+    if args.allocations:
+        tracemalloc.start()
+
+    start = time.perf_counter()
+
+    try:
+        with headless_curses(screen):
+            mm = MainMenu(screen)
+            try:
+                mm.mainloop()
+            except SystemExit:
+                pass
+            screen.end_record()
+            mm.col.close()
+    except ScriptExhausted as e:
+        error = str(e)
+    finally:
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if args.allocations else 0
+        tracemalloc.stop()
+        if old_home is not None:
+            os.environ["HOME"] = old_home
+        shutil.rmtree(home, ignore_errors = True)
+
+    records = screen.records
+    out = [f"{name}: {SCENARIOS[name].__doc__}",
+           f"  total {elapsed:.2f} s, {len(records)} keys"]
+
+    if error is not None:
+        out.append(f"  error: {error}")
+
+    if records:
+        out.append(f"  first key read after {(elapsed - sum(r.seconds for r in records)) * 1000:.1f} ms"
+                   f" (startup: opening the collection and the first frame)")
+        out.append(summarize("all", records))
+
+        by_key = {}
+        for record in records:
+            by_key.setdefault(record.key, []).append(record)
+        for key, key_records in sorted(by_key.items(), key = lambda kv: -len(kv[1])):
+            out.append(summarize(repr(chr(key)), key_records))
+
+    if args.allocations:
+        growth = sum(r.memory_delta for r in records)
+        out.append(f"  memory: peak {peak / 2**20:.1f} MiB, net growth over the keys {growth / 2**20:.1f} MiB"
+                   f" (times above include tracemalloc overhead)")
+
+    return out
+
+def main(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(prog = "python -m acurses.bench")
+    parser.add_argument("scenario", nargs = "?", default = "all", choices = ["print", "all", *SCENARIOS])
+    parser.add_argument("--decks", type = int, default = 10000)
+    parser.add_argument("--notes", type = int, default = 100000)
+    parser.add_argument("--reviews", type = int, default = 1000)
+    parser.add_argument("--typeahead", action = "store_true",
+                        help = "deliver each scripted key as soon as it's read (like a held key), "
+                               "rather than one key per frame")
+    parser.add_argument("--allocations", action = "store_true", help = "trace memory allocations")
+    args = parser.parse_args(argv)
+
+    if args.scenario == "print":
+        print("\n".join(curses.wrapper(bench_print)))
+        return
+
+    col_path = synthetic_collection(args.decks, args.notes, args.reviews)
+    names = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+
+    for name in names:
+        print("\n".join(run_scenario(name, args, col_path)))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
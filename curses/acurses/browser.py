@@ -1,16 +1,18 @@
-from typing import Sequence
+from typing import Iterable
 
+from anki.errors import NotFoundError
 from anki.notes import Note, NoteId
 from anki.collection import Collection
 
 from acurses.keyhandler import KeyHandler
 from acurses.select_from_list import SelectFromList
 from acurses.html import NoteParser
-from acurses.wrappers import NoteInfo
+from acurses.wrappers import LazyNoteInfoList, NoteInfo
 
 class NoteBrowser(SelectFromList):
     col: Collection
-    note_list: list[NoteInfo]
+    note_list: LazyNoteInfoList
+    marked: set[NoteId]
 
     def init_keybinds(self) -> None:
         super().init_keybinds()
@@ -18,21 +20,88 @@ class NoteBrowser(SelectFromList):
         self.keybind_map |= \
         {
             'l': self.edit_current,
+            'm': self.toggle_mark,
+            'E': self.edit_marked,
         }
 
-    def __init__(self, mm, col: Collection, note_ids: Sequence[NoteId]):
+    def __init__(self, mm, col: Collection, note_ids: Iterable[NoteId]):
         self.col = col
         self.mm = mm
 
-        self.note_list = [NoteInfo(self.col, self.col.get_note(id)) for id in note_ids]
+        # rows are only fetched as they're displayed (or searched)
+        self.note_list = LazyNoteInfoList(self.col, note_ids)
+        self.marked = set()
 
         super().__init__(mm, mm, f"Select a Note to edit ({len(self.note_list)} matches)",
-                         self.note_list, self.note_info_to_strs, lambda n, s: any([s in f for f in n.fields]))
+                         self.note_list, self.note_info_to_strs, lambda n: "\x1f".join(n.fields),
+                         "hq=back  jk=navigate  l=edit  m=mark  E=edit marked")
 
     def note_info_to_strs(self, note: NoteInfo) -> tuple[str, str, str]:
-        return (note.field_str, "", note.deck_str)
+        mark = "* " if note.note_id in self.marked else ""
+        return (mark + note.field_str, "", note.deck_str)
 
     def edit_current(self) -> None:
-        note_obj = self.note_list[self.cursor_pos].note_obj
-        self.mm.edit_note(note_obj)
-        self.note_list[self.cursor_pos] = NoteInfo(self.col, note_obj)
+        if not self.note_list:
+            return
+
+        notes = self.existing_notes([self.cursor_pos])
+
+        if notes:
+            self.mm.edit_note(notes[0])
+            self.note_list.reload(self.cursor_pos)
+            self.invalidate_search_index()
+            self.redraw() # the editor took over the terminal
+
+        self.report_deleted(1 - len(notes))
+
+    def toggle_mark(self) -> None:
+        if not self.note_list:
+            return
+
+        self.marked ^= {self.note_list[self.cursor_pos].note_id}
+        self.mark_dirty(self.cursor_pos)
+        self.move_down()
+
+    def edit_marked(self) -> None:
+        """Edits the marked notes (or the current one, if none are marked) in
+        a single editor session"""
+        if not self.note_list:
+            return
+
+        note_ids = self.marked or {self.note_list[self.cursor_pos].note_id}
+        rows = [i for i, note_id in enumerate(self.note_list.note_ids) if note_id in note_ids]
+
+        notes = self.existing_notes(rows)
+        self.marked.clear()
+
+        if notes:
+            self.mm.edit_notes(notes)
+
+            for i in rows:
+                self.note_list.reload(i)
+            self.invalidate_search_index()
+            self.redraw() # the editor took over the terminal
+        else:
+            self.mark_dirty() # to unmark the rows
+
+        self.report_deleted(len(rows) - len(notes))
+
+    def existing_notes(self, rows: list[int]) -> list[Note]:
+        """The notes in the given rows, skipping those deleted since the list
+        was made (their rows are re-fetched, to show them as deleted)"""
+        notes = []
+
+        for i in rows:
+            try:
+                notes.append(self.col.get_note(self.note_list.note_ids[i]))
+            except NotFoundError:
+                self.note_list.reload(i)
+                self.mark_dirty(i)
+                self.invalidate_search_index()
+
+        return notes
+
+    def report_deleted(self, deleted: int) -> None:
+        if deleted:
+            self.mm.set_foot(f"<red>{deleted} note{'s' if deleted != 1 else ''} skipped: "
+                             "deleted since the list was made</red>")
@@ -11,6 +11,11 @@ class ConfigManager:
         "hkey": str,
         "sync": bool,
         "hide_child_decks": bool,
+        "show_frame_time": bool,
+        "search_delay_ms": int,
+        "use_daemon": bool,
+        "review_journal": bool,
+        "review_batch_size": int,
     }
 
     def __init__(self, mm):
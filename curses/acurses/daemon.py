@@ -0,0 +1,475 @@
+"""A long-lived process that keeps a collection open and serves it to acurses
+clients over a unix socket, so that starting acurses doesn't pay to open the
+collection (and warm the backend's caches) every time.
+
+Run with `python -m acurses.daemon <collection path>`; `--stop` asks a
+running daemon to close the collection and exit (eg. before opening it in the
+qt app). Clients attach with connect_collection(), which returns an ordinary
+Collection whose backend calls are forwarded to the daemon.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import signal
+import socket
+import socketserver
+import stat
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from anki.collection import Collection
+
+SOCKET_NAME = "anki-curses.sock"
+SOCKET_DIR = "anki-curses-{uid}" # in the temp dir, when there's no runtime dir
+LOG_NAME = "anki-curses-daemon.log" # a spawned daemon's output, beside the socket
+START_TIMEOUT = 30.0 # seconds given to a spawned daemon to open the collection
+IDLE_FLUSH_SECS = 10.0 # an attached client's changes are committed after this long without requests
+
+# a frame is a length-prefixed payload; request payloads start with a kind
+# byte and the client's session id, responses with a status byte
+FRAME_HEADER = struct.Struct("!I")
+REQUEST_HEADER = struct.Struct("!B16s")
+COMMAND_HEADER = struct.Struct("!II") # service, method
+PEERCRED = struct.Struct("3i") # pid, uid, gid
+
+ATTACH, DETACH, COMMAND, DB, SHUTDOWN = range(5)
+OK, BACKEND_ERROR, DAEMON_ERROR = range(3)
+
+class DaemonError(Exception):
+    pass
+
+def socket_path() -> str:
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+
+    if runtime_dir is None:
+        # the temp dir is shared with other users, so the socket goes in a
+        # directory of its own
+        runtime_dir = os.path.join(tempfile.gettempdir(), SOCKET_DIR.format(uid = os.getuid()))
+
+    return os.path.join(private_dir(runtime_dir), SOCKET_NAME)
+
+def private_dir(path: str) -> str:
+    """Creates the directory at path if needed, and checks that only this user
+    can access it, so that no one else can have put a socket there"""
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise DaemonError(f"{path} must be a directory only accessible by its owner")
+
+    return path
+
+def peer_uid(sock: socket.socket) -> int | None:
+    """The uid of the process at the other end of a unix socket, or None if
+    the platform doesn't say"""
+    if not hasattr(socket, "SO_PEERCRED"):
+        return None
+
+    creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, PEERCRED.size)
+    return PEERCRED.unpack(creds)[1]
+
+def recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise EOFError
+        buf += chunk
+
+    return bytes(buf)
+
+def send_frame(sock: socket.socket, payload: bytes) -> None:
+    sock.sendall(FRAME_HEADER.pack(len(payload)) + payload)
+
+def recv_frame(sock: socket.socket) -> bytes:
+    (length,) = FRAME_HEADER.unpack(recv_exact(sock, FRAME_HEADER.size))
+    return recv_exact(sock, length)
+
+# Server
+##########################################################################
+
+class RequestHandler(socketserver.BaseRequestHandler):
+    """Serves one client connection; a client uses one connection per thread,
+    so that eg. progress polling isn't stuck behind a running sync"""
+    server: DaemonServer
+
+    def handle(self) -> None:
+        daemon = self.server.collection_daemon
+
+        try:
+            while True:
+                payload = recv_frame(self.request)
+                status, body = daemon.handle_request(self, payload)
+                send_frame(self.request, bytes([status]) + body)
+        except (EOFError, ConnectionError):
+            pass
+        finally:
+            daemon.connection_closed(self)
+
+class DaemonServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    collection_daemon: CollectionDaemon
+
+    def verify_request(self, request: socket.socket, client_address: Any) -> bool:
+        # the socket's permissions should already keep out other users
+        uid = peer_uid(request)
+        return uid is None or uid == os.getuid()
+
+class CollectionDaemon:
+    """Holds the collection open, and lets one client session at a time use
+    it. Requests are passed straight to the backend, which serializes access
+    to the collection itself."""
+    col: Collection
+    session: bytes | None
+    owner: RequestHandler | None
+    in_trx: bool
+    unflushed: bool
+    active: int
+    last_request: float
+
+    def __init__(self, col: Collection):
+        self.col = col
+        self.col.save(trx = False) # clients begin their own transaction
+        self.bridge = self.col._backend._backend
+        self.lock = threading.Lock()
+        self.session = None
+        self.owner = None # the connection that attached the session
+        self.in_trx = False
+        self.unflushed = False
+        self.active = 0 # requests being passed to the backend
+        self.last_request = time.monotonic()
+        self.server = None
+
+    def handle_request(self, conn: RequestHandler, payload: bytes) -> tuple[int, bytes]:
+        kind, session = REQUEST_HEADER.unpack_from(payload)
+        body = payload[REQUEST_HEADER.size:]
+
+        with self.lock:
+            self.last_request = time.monotonic()
+
+            if kind == ATTACH:
+                return self.attach(conn, session, body.decode())
+            elif kind == SHUTDOWN:
+                return self.shutdown(session)
+            elif session != self.session:
+                return DAEMON_ERROR, b"not attached to the collection"
+            elif kind == DETACH:
+                self.end_session(commit = True)
+                return OK, b""
+            elif kind not in (COMMAND, DB):
+                return DAEMON_ERROR, f"unknown request kind {kind}".encode()
+
+            if kind == DB:
+                self.track_trx(body)
+            self.unflushed = True
+            self.active += 1
+
+        try:
+            if kind == COMMAND:
+                service, method = COMMAND_HEADER.unpack_from(body)
+                return OK, self.bridge.command(service, method, body[COMMAND_HEADER.size:])
+            else:
+                return OK, self.bridge.db_command(body)
+        except Exception as error:
+            if error.args and isinstance(error.args[0], bytes): # a serialized BackendError
+                return BACKEND_ERROR, error.args[0]
+            return DAEMON_ERROR, str(error).encode()
+        finally:
+            with self.lock:
+                self.active -= 1
+                self.last_request = time.monotonic()
+
+    def track_trx(self, body: bytes) -> None:
+        """Follows the client's begin/commit/rollback requests, so that idle
+        flushes only happen inside its transaction"""
+        if body.startswith(b"{"): # binary requests (see _dbwire) are never transaction requests
+            kind = json.loads(body).get("kind")
+            if kind == "begin":
+                self.in_trx = True
+            elif kind in ("commit", "rollback"):
+                self.in_trx = False
+
+    def attach(self, conn: RequestHandler, session: bytes, path: str) -> tuple[int, bytes]:
+        if self.session is not None:
+            return DAEMON_ERROR, b"the collection is in use by another acurses client"
+
+        if os.path.abspath(path) != self.col.path:
+            return DAEMON_ERROR, f"the daemon is serving {self.col.path}, not {path}".encode()
+
+        self.session = session
+        self.owner = conn
+        self.in_trx = False
+        return OK, b""
+
+    def end_session(self, commit: bool) -> None:
+        """Hands the collection back from the attached client; uncommitted
+        changes are kept on detach and dropped if the client went away"""
+        self.db(b'{"kind":"commit"}' if commit else b'{"kind":"rollback"}')
+        self.session = None
+        self.owner = None
+        self.in_trx = False
+        self.unflushed = False
+
+    def connection_closed(self, conn: RequestHandler) -> None:
+        with self.lock:
+            if conn is self.owner: # the client exited (or crashed) without detaching
+                self.end_session(commit = False)
+
+    def shutdown(self, session: bytes) -> tuple[int, bytes]:
+        if self.session is not None and session != self.session:
+            return DAEMON_ERROR, b"the collection is in use by an acurses client"
+
+        threading.Thread(target = self.server.shutdown, daemon = True).start()
+        return OK, b""
+
+    def db(self, request: bytes) -> None:
+        try:
+            self.bridge.db_command(request)
+        except Exception:
+            pass # eg. committing with no transaction open
+
+    def flush_when_idle(self) -> None:
+        """Commits the attached client's changes once it's been idle for
+        IDLE_FLUSH_SECS, then reopens its transaction"""
+        while True:
+            time.sleep(IDLE_FLUSH_SECS / 4)
+
+            # under the lock, so the client can't begin a request (eg. its own
+            # commit) in the middle of the flush
+            with self.lock:
+                idle = time.monotonic() - self.last_request >= IDLE_FLUSH_SECS
+                if idle and self.unflushed and self.in_trx and not self.active:
+                    self.db(b'{"kind":"commit"}')
+                    self.db(b'{"kind":"begin"}')
+                    self.unflushed = False
+
+    def serve(self, path: str) -> None:
+        if os.path.exists(path):
+            os.unlink(path) # left behind by a daemon that didn't exit cleanly
+
+        old_umask = os.umask(0o177) # socket only accessible by this user
+        try:
+            self.server = DaemonServer(path, RequestHandler)
+        finally:
+            os.umask(old_umask)
+
+        self.server.collection_daemon = self
+        threading.Thread(target = self.flush_when_idle, daemon = True).start()
+
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            os.unlink(path)
+
+            with self.lock:
+                if self.session is not None:
+                    self.end_session(commit = True)
+                self.col.close()
+
+# Client
+##########################################################################
+
+def make_request(kind: int, session: bytes, body: bytes = b"") -> bytes:
+    return REQUEST_HEADER.pack(kind, session) + body
+
+def daemon_running(path: str) -> bool:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    try:
+        sock.connect(path)
+    except OSError:
+        return False
+    else:
+        return True
+    finally:
+        sock.close()
+
+def served_by_user(sock: socket.socket, path: str) -> bool:
+    uid = peer_uid(sock)
+
+    if uid is not None:
+        return uid == os.getuid()
+
+    # judge by who could have created the socket instead
+    st = os.stat(path)
+    return st.st_uid == os.getuid() and not st.st_mode & 0o077
+
+def connect(path: str) -> socket.socket:
+    """Connects to the daemon's socket, after checking that the daemon is run
+    by this user"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    try:
+        sock.connect(path)
+        if not served_by_user(sock, path):
+            raise DaemonError(f"{path} is not served by a daemon of this user")
+    except BaseException:
+        sock.close()
+        raise
+
+    return sock
+
+def spawn_daemon(col_path: str, path: str) -> None:
+    """Starts a daemon for col_path in its own session (so that it outlives
+    this process), and waits for it to start listening; its output goes to
+    LOG_NAME beside the socket, and the last line of it is raised if it exits
+    first"""
+    env = dict(os.environ, PYTHONPATH = os.pathsep.join(sys.path))
+    log_path = os.path.join(os.path.dirname(path), LOG_NAME)
+
+    with open(log_path, "wb") as log:
+        daemon = subprocess.Popen([sys.executable, "-m", "acurses.daemon", col_path], env = env,
+                                  stdin = subprocess.DEVNULL, stdout = log, stderr = log,
+                                  start_new_session = True)
+
+    deadline = time.monotonic() + START_TIMEOUT
+    while not daemon_running(path):
+        if daemon.poll() is not None:
+            with open(log_path, encoding = "utf-8", errors = "replace") as log:
+                lines = log.read().strip().splitlines() or ["no output"]
+            raise DaemonError(f"the collection daemon exited with status {daemon.returncode}: "
+                              f"{lines[-1]} (see {log_path})")
+        if time.monotonic() > deadline:
+            raise DaemonError(f"timed out waiting for the collection daemon to start (see {log_path})")
+        time.sleep(0.05)
+
+class RemoteBridge:
+    """Stands in for the rsbridge backend (see _rsbridge.pyi) of a RustBackend,
+    forwarding its calls to a CollectionDaemon over one connection per
+    thread"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.session = uuid.uuid4().bytes
+        self.local = threading.local()
+
+    def connection(self) -> socket.socket:
+        if not hasattr(self.local, "sock"):
+            self.local.sock = connect(self.path)
+
+        return self.local.sock
+
+    def request(self, kind: int, body: bytes = b"") -> bytes:
+        sock = self.connection()
+        send_frame(sock, make_request(kind, self.session, body))
+        response = recv_frame(sock)
+        status, body = response[0], response[1:]
+
+        if status == BACKEND_ERROR:
+            raise Exception(body) # a serialized BackendError, as rsbridge raises
+        elif status == DAEMON_ERROR:
+            raise DaemonError(body.decode())
+
+        return body
+
+    def backend_request(self, kind: int, body: bytes) -> bytes:
+        """Like request(), but raises daemon errors as serialized BackendErrors,
+        which is what RustBackend expects of the methods below"""
+        try:
+            return self.request(kind, body)
+        except DaemonError as error:
+            from anki import backend_pb2
+
+            err = backend_pb2.BackendError(kind = backend_pb2.BackendError.INVALID_INPUT,
+                                           message = str(error))
+            raise Exception(err.SerializeToString()) from error
+
+    def command(self, service: int, method: int, data: bytes) -> bytes:
+        return self.backend_request(COMMAND, COMMAND_HEADER.pack(service, method) + data)
+
+    def db_command(self, data: bytes) -> bytes:
+        return self.backend_request(DB, data)
+
+def remote_backend_class():
+    """RemoteBackend subclasses RustBackend, so it's only defined once anki
+    has been imported"""
+    from anki._backend import RustBackend
+
+    class RemoteBackend(RustBackend):
+        """A RustBackend whose calls are served by a CollectionDaemon"""
+
+        def __init__(self, path: str):
+            # the fields RustBackend.__init__() sets, without opening a
+            # backend in this process
+            self._backend = RemoteBridge(path)
+            self.command_count = 0
+            self.change_count = 0
+
+        def open_collection(self, collection_path: str, **kwargs) -> None:
+            # the daemon already has it open
+            self._backend.request(ATTACH, collection_path.encode())
+
+        def close_collection(self, **kwargs) -> None:
+            # the daemon keeps it open for the next client
+            self._backend.request(DETACH)
+
+    return RemoteBackend
+
+def connect_collection(col_path: str) -> Collection:
+    """Attaches to the daemon serving col_path, starting one if none is
+    running"""
+    from anki.collection import Collection
+
+    path = socket_path()
+
+    if not daemon_running(path):
+        spawn_daemon(col_path, path)
+
+    return Collection(col_path, backend = remote_backend_class()(path))
+
+def stop_daemon() -> None:
+    path = socket_path()
+
+    try:
+        sock = connect(path)
+    except OSError:
+        print("No collection daemon is running")
+        return
+    except DaemonError as e:
+        print(f"Could not stop the collection daemon: {e}")
+        return
+
+    try:
+        send_frame(sock, make_request(SHUTDOWN, bytes(16)))
+        response = recv_frame(sock)
+    finally:
+        sock.close()
+
+    if response[0] != OK:
+        print(f"Could not stop the collection daemon: {response[1:].decode()}")
+        return
+
+    while daemon_running(path) or os.path.exists(path):
+        time.sleep(0.05) # wait for the collection to be closed
+
+def main(args: list[str]) -> None:
+    if args == ["--stop"]:
+        stop_daemon()
+    elif len(args) == 1:
+        # exit through serve()'s cleanup (closing the collection) on SIGTERM
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        path = socket_path()
+
+        from anki.collection import Collection
+
+        CollectionDaemon(Collection(args[0])).serve(path)
+    else:
+        print("usage: python -m acurses.daemon (<collection path> | --stop)")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
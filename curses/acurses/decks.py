@@ -1,6 +1,8 @@
 from anki import decks_pb2
+from anki import search_pb2
 from anki.collection import Collection
-from anki.decks import DeckManager
+from anki.decks import DeckId, DeckManager
+from anki.errors import FilteredDeckError
 
 from acurses.keyhandler import KeyHandler
 from acurses.io import align_style_print, fill_line_attr
@@ -8,8 +10,11 @@ from acurses.reviewer import Reviewer
 from acurses.wrappers import DeckInfo
 from acurses.select_from_list import SelectFromList
 
-DeckNameId = decks_pb2.DeckNameId
 DeckTreeNode = decks_pb2.DeckTreeNode
+FilteredSearchTerm = decks_pb2.Deck.Filtered.SearchTerm
+SearchNode = search_pb2.SearchNode
+
+STUDY_ALL_DECK_NAME = "acurses study-all" # transient filtered deck used by study_all
 
 class DeckManager(SelectFromList):
     col: Collection
@@ -34,23 +39,30 @@ class DeckManager(SelectFromList):
         self.init_deck_list()
 
         super().__init__(mm, mm, "Deck Manager", self.deck_list, self.deck_info_to_strs,
-                         lambda d, s: s in d.name, "q=quit  jk=navigate  l=study  L=study-all  r=refresh")
+                         lambda d: d.name, "q=quit  jk=navigate  l=study  L=study-all  r=refresh")
 
     def init_deck_list(self):
-        self.deck_list = [DeckInfo(nameid.name, nameid.id, self.get_deck_counts(nameid))
-                          for nameid in self.col.decks.all_names_and_ids(skip_empty_default = True)]
-
-        if self.mm.conf.hide_child_decks:
-            self.deck_list = list(filter(lambda d: "::" not in d.name, self.deck_list))
+        """Builds deck_list (with counts) from a single traversal of the scheduler's
+        due tree, without changing the current deck"""
+        self.deck_list = []
+        self.remove_study_all_deck() # left over if study_all was interrupted
+        self.add_tree_children(self.col.sched.deck_due_tree(), "")
 
     def refresh_deck_list(self):
+        self.mm.wait_for_sync()
         self.init_deck_list()
         self.set_choices(self.deck_list)
 
-    def get_deck_counts(self, deck: DeckNameId) -> tuple[int, int, int]:
-        self.col.decks.set_current(deck.id)
-        self.col.sched.reset()
-        return self.col.sched.counts()
+    def add_tree_children(self, node: DeckTreeNode, prefix: str) -> None:
+        """Appends node's descendants to deck_list in pre-order (which matches
+        sorted-by-name order); tree counts include children, with limits applied"""
+        for child in node.children:
+            name = prefix + child.name
+            counts = (child.new_count, child.learn_count, child.review_count)
+            self.deck_list.append(DeckInfo(name, child.deck_id, counts))
+
+            if not self.mm.conf.hide_child_decks:
+                self.add_tree_children(child, name + "::")
 
     def deck_info_to_strs(self, deck: DeckInfo) -> tuple[str, str, str]:
         new, lrn, rev = deck.counts
@@ -60,14 +72,95 @@ class DeckManager(SelectFromList):
         return (name, "", count_str)
 
     def study(self) -> None:
-        Reviewer(self, [self.cursor_pos]).mainloop()
-        self.mm.redraw_scr(self.head_str, self.foot_str)
+        if not self.deck_list:
+            return
+
+        self.mm.wait_for_sync() # the collection is locked while syncing
+
+        Reviewer(self, self.deck_list[self.cursor_pos]).mainloop()
+        self.refresh_deck_list()
+        self.redraw()
+
+    def build_study_all_deck(self, decks: list[DeckInfo]) -> tuple[DeckId, int]:
+        """(Re)builds a transient filtered deck holding the due, learning and new
+        cards of the given decks, so they can be studied through one scheduler
+        queue. Returns its id, and the number of those cards left out because
+        they're in another filtered deck."""
+        deck_search = self.col.build_search_string(*[SearchNode(deck=d.name) for d in decks],
+                                                   joiner = "OR")
+        # learning cards that aren't due yet aren't in the counts, but become
+        # due during the session
+        learn_ahead = len(self.col.find_cards(f"({deck_search}) is:learn -is:due"))
+        due_limit = sum(lrn + rev for _, lrn, rev in (d.counts for d in decks)) + learn_ahead
+        new_limit = sum(d.counts[0] for d in decks)
+
+        filtered = self.col.sched.get_or_create_filtered_deck(
+            self.col.decks.id_for_name(STUDY_ALL_DECK_NAME) or DeckId(0))
+        filtered.name = STUDY_ALL_DECK_NAME
+        filtered.config.reschedule = True
+        del filtered.config.search_terms[:]
+        filtered.config.search_terms.extend([
+            FilteredSearchTerm(search = f"({deck_search}) (is:due OR is:learn)", limit = due_limit,
+                               order = FilteredSearchTerm.DUE_PRIORITY),
+            FilteredSearchTerm(search = f"({deck_search}) is:new", limit = new_limit,
+                               order = FilteredSearchTerm.DUE),
+        ])
+
+        deck_id = DeckId(self.col.sched.add_or_update_filtered_deck(filtered).id)
+
+        # cards can only be in one filtered deck at a time
+        in_other_filtered = len(self.col.find_cards(self.col.build_search_string(
+            deck_search, "(is:due OR is:learn OR is:new) -is:suspended -is:buried",
+            SearchNode(deck="filtered"),
+            SearchNode(negated=SearchNode(deck=STUDY_ALL_DECK_NAME)))))
+
+        return deck_id, in_other_filtered
+
+    def remove_study_all_deck(self) -> None:
+        """Empties the study-all deck, returning its cards to their home decks,
+        and removes it"""
+        deck_id = self.col.decks.id_for_name(STUDY_ALL_DECK_NAME)
+
+        if deck_id and self.col.decks.is_filtered(deck_id):
+            self.col.sched.empty_filtered_deck(deck_id)
+            self.col.decks.remove([deck_id])
 
     def study_all(self) -> None:
-        all_decks = []
-        for i, deck in enumerate(self.deck_list):
-            if deck.counts != (0, 0, 0):
-                all_decks.append(i)
-
-        Reviewer(self, all_decks).mainloop()
-        self.mm.redraw_scr(self.head_str, self.foot_str)
+        self.mm.wait_for_sync() # the collection is locked while syncing
+
+        # parent counts already include their children (with limits applied),
+        # so only the top-most decks with cards are searched
+        decks = []
+        for deck in self.deck_list:
+            if deck.counts == (0, 0, 0):
+                continue
+            if decks and deck.name.startswith(decks[-1].name + "::"):
+                continue
+            decks.append(deck)
+
+        if not decks:
+            self.mm.set_foot("<red>No cards to study</red>")
+            return
+
+        current_id = self.col.decks.get_current_id()
+
+        try:
+            deck_id, in_other_filtered = self.build_study_all_deck(decks)
+        except FilteredDeckError as e:
+            self.mm.set_foot(f"<red>Error building study-all deck: {e}</red>")
+            return
+
+        name = f"{len(decks)} deck{'s' if len(decks) > 1 else ''}"
+        totals = tuple(sum(d.counts[i] for d in decks) for i in range(3))
+        reviewer = Reviewer(self, DeckInfo(name, deck_id, totals))
+
+        if in_other_filtered:
+            reviewer.foot_str = (f"<red>{in_other_filtered} card{'s' if in_other_filtered != 1 else ''} "
+                                 "left out: they're in other filtered decks</red>")
+
+        reviewer.mainloop()
+
+        self.remove_study_all_deck()
+        self.col.decks.set_current(current_id)
+        self.refresh_deck_list()
+        self.redraw()
@@ -0,0 +1,256 @@
+"""In-memory stand-ins for curses windows and keyboard input, so that acurses
+screens can be driven (and timed) by a script, without a terminal"""
+
+import curses
+import time
+
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+PAUSE = None # in a key script: the user stops typing long enough for timed reads to time out
+
+class ScriptExhausted(Exception):
+    pass
+
+class KeyRecord:
+    """The work done in response to one key: from the read returning it, up
+    to the next read that returns a key"""
+    key: int
+    seconds: float
+    backend_calls: int
+    curses_calls: int
+    memory_delta: int
+
+    def __init__(self, key: int):
+        self.key = key
+        self.seconds = 0.0
+        self.backend_calls = 0
+        self.curses_calls = 0
+        self.memory_delta = 0
+
+class FakeWindow:
+    """A window (or pad) that keeps its text in memory, and counts calls"""
+    rows: list[str]
+
+    def __init__(self, height: int, width: int, counter: list[int]):
+        self.height = height
+        self.width = width
+        self.rows = [" " * width for _ in range(height)]
+        self.cursor = (0, 0)
+        self.counter = counter # shared by every window: [total calls]
+
+    def put(self, y: int, x: int, s: str) -> None:
+        self.counter[0] += 1
+
+        if not (0 <= y < self.height and 0 <= x < self.width):
+            raise curses.error("position out of bounds")
+
+        s = s[:self.width - x]
+        row = self.rows[y]
+        self.rows[y] = row[:x] + s + row[x + len(s):]
+        self.cursor = (y, min(x + len(s), self.width - 1))
+
+    def addstr(self, *args) -> None:
+        if len(args) <= 2: # (str[, attr]) at the cursor
+            self.put(*self.cursor, args[0])
+        else:
+            self.put(args[0], args[1], args[2])
+
+    def addnstr(self, y: int, x: int, s: str, n: int, attr: int = 0) -> None:
+        self.put(y, x, s[:n])
+
+    def insert(self, y: int, x: int, s: str) -> None:
+        """Inserts s before the char at (y, x), shifting the rest of the line
+        right (and off the edge); the cursor doesn't move"""
+        self.counter[0] += 1
+
+        if not (0 <= y < self.height and 0 <= x < self.width):
+            raise curses.error("position out of bounds")
+
+        row = self.rows[y]
+        self.rows[y] = (row[:x] + s + row[x:])[:self.width]
+
+    def insstr(self, *args) -> None:
+        if len(args) <= 2: # (str[, attr]) at the cursor
+            self.insert(*self.cursor, args[0])
+        else:
+            self.insert(args[0], args[1], args[2])
+
+    def insnstr(self, *args) -> None:
+        if len(args) <= 3: # (str, n[, attr]) at the cursor
+            self.insert(*self.cursor, args[0][:args[1]])
+        else:
+            self.insert(args[0], args[1], args[2][:args[3]])
+
+    def hline(self, y: int, x: int, ch, n: int) -> None:
+        self.put(y, x, (ch if isinstance(ch, str) else "-") * min(n, self.width - x))
+
+    def chgat(self, *args) -> None:
+        self.counter[0] += 1
+
+    def move(self, y: int, x: int) -> None:
+        self.cursor = (y, x)
+
+    def clrtoeol(self) -> None:
+        y, x = self.cursor
+        self.put(y, x, " " * (self.width - x))
+
+    def erase(self) -> None:
+        self.counter[0] += 1
+        self.rows = [" " * self.width for _ in range(self.height)]
+
+    clear = erase
+
+    def scroll(self, n: int = 1) -> None:
+        self.counter[0] += 1
+        blank = [" " * self.width] * min(abs(n), self.height)
+
+        if n > 0:
+            self.rows = self.rows[n:] + blank
+        elif n < 0:
+            self.rows = blank + self.rows[:n]
+
+    def refresh(self, *args) -> None:
+        self.counter[0] += 1
+
+    noutrefresh = refresh
+
+    def getmaxyx(self) -> tuple[int, int]:
+        return (self.height, self.width)
+
+    def scrollok(self, flag: bool) -> None:
+        pass
+
+    def keypad(self, flag: bool) -> None:
+        pass
+
+    def text(self, y: int) -> str:
+        return self.rows[y].rstrip()
+
+class FakeScreen(FakeWindow):
+    """The screen, whose getch() plays back a key script. A timed read returns
+    -1 when the script has a PAUSE next; with typeahead, non-blocking reads see
+    the script's next key as already typed (like a held key), otherwise nothing
+    is ever pending. Every key read starts a new KeyRecord."""
+    records: list[KeyRecord]
+
+    def __init__(
+        self,
+        height: int,
+        width: int,
+        script: list[int | None],
+        typeahead: bool = False,
+        probe: Callable[[], tuple[int, int]] = lambda: (0, 0),
+        ):
+        super().__init__(height, width, [0])
+        self.script = list(reversed(script)) # popped from the end
+        self.typeahead = typeahead
+        self.probe = probe # returns (backend calls, traced memory) so far
+        self.delay = -1
+        self.records = []
+        self.start = None
+        self.pushed_back = False # the next key was already read (and recorded) once
+
+    def timeout(self, delay: int) -> None:
+        self.delay = delay
+
+    def nodelay(self, flag: bool) -> None:
+        self.delay = 0 if flag else -1
+
+    def ungetch(self, kc: int) -> None:
+        self.script.append(kc)
+        self.pushed_back = True
+
+    def next_key(self) -> int:
+        if self.delay == 0 and not self.typeahead:
+            return -1
+
+        while self.script and self.script[-1] is PAUSE:
+            if self.delay == 0:
+                return -1 # nothing has been typed yet
+            self.script.pop() # the pause elapses
+            if self.delay > 0:
+                return -1 # ...and a timed read times out
+
+        if not self.script:
+            if self.delay >= 0:
+                return -1
+            raise ScriptExhausted("the key script ended before the screen was quit")
+
+        return self.script.pop()
+
+    def getch(self) -> int:
+        kc = self.next_key()
+
+        if kc != -1 and self.pushed_back:
+            self.pushed_back = False
+        elif kc != -1:
+            self.end_record()
+            self.records.append(KeyRecord(kc))
+            self.start = (time.perf_counter(), self.counter[0], *self.probe())
+
+        return kc
+
+    def end_record(self) -> None:
+        """Closes the current KeyRecord (if any)"""
+        if self.start is None:
+            return
+
+        start_time, start_curses, start_backend, start_memory = self.start
+        backend, memory = self.probe()
+
+        record = self.records[-1]
+        record.seconds = time.perf_counter() - start_time
+        record.curses_calls = self.counter[0] - start_curses
+        record.backend_calls = backend - start_backend
+        record.memory_delta = memory - start_memory
+        self.start = None
+
+def keys(*parts: str | list[int | None] | None) -> list[int | None]:
+    """Builds a key script from strings (typed a char at a time), lists of
+    keycodes, and PAUSEs"""
+    script = []
+
+    for part in parts:
+        if part is PAUSE:
+            script.append(PAUSE)
+        elif isinstance(part, str):
+            script.extend(ord(c) for c in part)
+        else:
+            script.extend(part)
+
+    return script
+
+@contextmanager
+def headless_curses(screen: FakeScreen) -> Iterator[None]:
+    """Points the curses module functions used by acurses at in-memory
+    windows sized like screen, for the duration of the block"""
+    patches = {
+        "LINES": screen.height,
+        "COLS": screen.width,
+        "ACS_HLINE": "-",
+        "newpad": lambda h, w: FakeWindow(h, w, screen.counter),
+        "newwin": lambda h, w, y = 0, x = 0: FakeWindow(h, w, screen.counter),
+        "ungetch": screen.ungetch,
+        "curs_set": lambda visibility: 0,
+        "noecho": lambda: None,
+        "endwin": lambda: None,
+        "doupdate": lambda: None,
+        "use_default_colors": lambda: None,
+        "init_pair": lambda pair, fg, bg: None,
+        "color_pair": lambda pair: pair << 8,
+    }
+    missing = object()
+    saved = {name: getattr(curses, name, missing) for name in patches}
+
+    for name, value in patches.items():
+        setattr(curses, name, value)
+
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is missing:
+                delattr(curses, name)
+            else:
+                setattr(curses, name, value)
@@ -1,6 +1,8 @@
 import curses
 import html
+import re
 
+from functools import lru_cache
 from html.parser import HTMLParser
 from acurses.style import *
 
@@ -53,46 +55,64 @@ class CardParser(HTMLParser):
         parser.feed(card)
         return parser.parsed_text
 
-class AttrParser(HTMLParser):
+class AttrParser:
     """Converts style-marked text (with tags exclusively from ATTR_TAGS) into
-    a (un-marked text, attribute-list) pair for printing to the screen
+    a (un-marked text, attribute-run list) pair for printing to the screen;
+    each run is an (offset, length, attr) triple
     """
 
-    parsed_text: str
-    tag_stack: list[str]
-    attr_list: list[int]
-    current_attr: int
-
-    def __init__(self):
-        super().__init__()
-        self.parsed_text = ""
-        self.tag_stack = []
-        self.attr_list = []
-        self.current_attr = 0
-
-    def handle_starttag(self, tag: str, attrs: list[str]) -> None:
-        if not tag in ATTR_TAGS:
-            return
+    TAG_RE = re.compile(r"<(/?)([a-zA-Z][a-zA-Z0-9]*)[^<>]*>")
+    CACHE_SIZE = 4096 # distinct markup strings (headers, footers, list rows) to remember
 
-        self.tag_stack.append(tag)
-        self.current_attr |= ATTR_TAGS[tag]
+    @staticmethod
+    @lru_cache(maxsize = CACHE_SIZE)
+    def parse_runs(s: str) -> tuple[str, tuple[tuple[int, int, int], ...]]:
+        """Single-pass tokenization of s; results are cached, so repeatedly
+        printed strings are only parsed once"""
+        parsed_text = ""
+        runs = []
+        tag_stack = []
+        current_attr = 0
+        pos = 0
+
+        def add_data(data: str) -> None:
+            nonlocal parsed_text
+            data = html.unescape(data)
+            if data:
+                runs.append((len(parsed_text), len(data), current_attr))
+                parsed_text += data
+
+        for match in AttrParser.TAG_RE.finditer(s):
+            add_data(s[pos:match.start()])
+            pos = match.end()
+
+            is_end, tag = match.group(1), match.group(2).lower()
+
+            if is_end:
+                assert tag in ATTR_TAGS
+                assert tag in tag_stack
+                tag_stack.remove(tag)
+            elif tag in ATTR_TAGS:
+                tag_stack.append(tag)
+            else:
+                continue
 
-    def handle_endtag(self, tag: str) -> None:
-        assert tag in ATTR_TAGS
-        assert tag in self.tag_stack
+            current_attr = 0
+            for t in tag_stack:
+                current_attr |= ATTR_TAGS[t]
 
-        self.tag_stack.remove(tag)
-        self.current_attr ^= ATTR_TAGS[tag]
+        add_data(s[pos:])
 
-    def handle_data(self, data: str) -> None:
-        self.parsed_text += data
-        self.attr_list += [self.current_attr] * len(data)
+        return (parsed_text, tuple(runs))
 
     @staticmethod
-    def parse(s: str) -> str:
-        parser = AttrParser()
-        parser.feed(s)
-        return (parser.parsed_text, parser.attr_list)
+    def parse(s: str) -> tuple[str, list[int]]:
+        """Returns the (un-marked text, per-char attribute list) pair for s"""
+        parsed_text, runs = AttrParser.parse_runs(s)
+        attr_list = []
+        for _, length, attr in runs:
+            attr_list += [attr] * length
+        return (parsed_text, attr_list)
 
 class NoteParser(HTMLParser):
     """Converts backend-note text into editable text, decoding html escape
@@ -155,7 +175,7 @@ class NoteParser(HTMLParser):
                     elif s[i + 1].islower():
                         sp += f"<{s[i + 1]}>"
                     else:
-                        sp += f"</{s[i + 1]}>"
+                        sp += f"</{s[i + 1].lower()}>"
                 i += 2
             else:
                 sp += s[i]
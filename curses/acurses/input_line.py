@@ -11,12 +11,15 @@ class InputLine():
     quit_on_empty: bool
 
     def __init__(self, mm, prompt: str, init_txt: str = "", quit_on_empty: bool = False,
-                 on_update: Callable[[str], None] = lambda s: None):
+                 on_update: Callable[[str], None] = lambda s: None, update_delay: int = 0):
+        """If update_delay (ms) is nonzero, on_update is only called once no key
+        has been pressed for that long, rather than after every key"""
         self.mm = mm
         self.prompt = prompt
         self.txt = init_txt
         self.quit_on_empty = quit_on_empty
         self.on_update = on_update
+        self.update_delay = update_delay
         self.win = win = curses.newwin(1, curses.COLS, curses.LINES - 1, 0)
 
     def out(self) -> str:
@@ -25,9 +28,13 @@ class InputLine():
         curses.curs_set(2) # set cursor to "very visible"
 
         result = ""
+        update_pending = True
 
         while True:
-            self.on_update(self.txt)
+            if update_pending and not self.update_delay:
+                self.on_update(self.txt)
+                update_pending = False
+
             self.win.hline(0, 0, " ", curses.COLS)
             self.win.addnstr(0, 0, self.prompt + self.txt, curses.COLS - 1)
             self.win.refresh()
@@ -36,7 +43,17 @@ class InputLine():
                 result = ""
                 break
 
+            if update_pending:
+                self.mm.scr.timeout(self.update_delay) # wait for an idle period
             kc = self.mm.scr.getch()
+            self.mm.scr.timeout(-1)
+
+            if kc == -1: # idle (timed out); run the delayed update
+                self.on_update(self.txt)
+                update_pending = False
+                continue
+
+            update_pending = True
 
             if kc == curses.KEY_ENTER or kc == ord('\n'): # enter
                 result = self.txt
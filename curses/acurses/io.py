@@ -1,4 +1,8 @@
-from typing import Literal
+import re
+
+from itertools import groupby
+from textwrap import wrap
+from typing import Literal, Sequence
 
 import curses
 import _curses
@@ -20,6 +24,44 @@ def fill_line_attr(win: _curses.window, line: int, attr: int = 0) -> None:
     """Fills the given line with the given attribute"""
     win.chgat(line, 0, win.getmaxyx()[1], attr)
 
+def attr_runs(attrs: list[int]) -> list[tuple[int, int, int]]:
+    """Coalesces a per-char attribute list into maximal (offset, length, attr)
+    runs of equal attributes"""
+    runs = []
+    start = 0
+
+    for attr, group in groupby(attrs):
+        length = sum(1 for _ in group)
+        runs.append((start, length, attr))
+        start += length
+
+    return runs
+
+def print_text_and_runs(
+    win: _curses.window,
+    line: int,
+    col: int,
+    raw_text: str,
+    runs: Sequence[tuple[int, int, int]]
+    ) -> None:
+    """Prints raw_text at the given (line, col), with one curses call per
+    (offset, length, attr) run; chars outside of the window are ignored"""
+    width = win.getmaxyx()[1]
+
+    for offset, length, attr in runs:
+        start = max(col + offset, 0)
+        end = min(col + offset + length, width)
+
+        if start >= end:
+            continue
+
+        text = raw_text[start - col:end - col]
+
+        if end == width: # touches last col (addstr would move the cursor off the window)
+            win.insnstr(line, start, text, end - start, attr)
+        else:
+            win.addnstr(line, start, text, end - start, attr)
+
 def print_text_and_attrs(
     win: _curses.window,
     line: int,
@@ -29,21 +71,20 @@ def print_text_and_attrs(
     ) -> None:
     """Prints the (char-str, attr-list) pair at the given (line, col); chars
     past the end of the window are ignored """
-    for i in range(len(raw_text)):
-        if col + i >= win.getmaxyx()[1]: # out of bounds
-            return
+    width = win.getmaxyx()[1]
+    start = max(0, -col)
+    end = max(start, width - col)
 
-        if col + i + 1 == win.getmaxyx()[1]: # last col
-            win.insstr(line, col + i, raw_text[i], attrs[i])
-        else:
-            win.addstr(line, col + i, raw_text[i], attrs[i])
+    # clip before coalescing, so off-window chars cost nothing
+    runs = [(start + offset, length, attr) for offset, length, attr in attr_runs(attrs[start:end])]
+    print_text_and_runs(win, line, col, raw_text, runs)
 
 def print_styled_mu(win: _curses.window, line: int, col:int, text: str) -> None:
     """Prints the given markup text att the given (line, col); chars
     past the end of the window are ignored
     """
-    raw_text, attrs = AttrParser.parse(text)
-    print_text_and_attrs(win, line, col, raw_text, attrs)
+    raw_text, runs = AttrParser.parse_runs(text)
+    print_text_and_runs(win, line, col, raw_text, runs)
 
 def align_style_print_block(
     win: _curses.window,
@@ -56,20 +97,69 @@ def align_style_print_block(
     """
     width = win.getmaxyx()[1]
 
-    parser = AttrParser()
-
     for i, text in enumerate(lines):
-        parser.feed(text)
-        raw_text, attrs = parser.parsed_text, parser.attr_list
-        parser.parsed_text, parser.attr_list = "", []
+        raw_text, runs = AttrParser.parse_runs(text)
 
         if align == 1: # left-align
-            print_text_and_attrs(win, start_line + i, 0, raw_text, attrs) # directly on left
+            print_text_and_runs(win, start_line + i, 0, raw_text, runs) # directly on left
         elif align == 3: # right-align
-            print_text_and_attrs(win, start_line + i, width - len(raw_text), raw_text, attrs)
+            print_text_and_runs(win, start_line + i, width - len(raw_text), raw_text, runs)
         else: # centered
-            print_text_and_attrs(win, start_line + i, (width - len(raw_text)) // 2, raw_text, attrs)
+            print_text_and_runs(win, start_line + i, (width - len(raw_text)) // 2, raw_text, runs)
 
 def align_style_print(win: _curses.window, line: int, align: Literal[1, 2, 3], text: str) -> None:
     """Single-line version of align_style_print_block"""
     align_style_print_block(win, line, align, [text])
+
+def wrap_line(line: str, width: int) -> list[str]:
+    """Wraps a single (newline-free) line of markup text to the given width"""
+    if len(line) < width:
+        return [line]
+
+    return wrap(line, width = width, expand_tabs = False,
+                replace_whitespace = False, drop_whitespace = False)
+
+def wrap_text(s: str, width: int) -> list[str]:
+    """Splits markup text into lines, wrapping any line that doesn't fit in the
+    given width"""
+    lines = []
+
+    for l in s.strip().split("\n"):
+        lines += wrap_line(l, width)
+
+    return lines
+
+class WrappedLines:
+    """The lines of wrap_text(s, width), wrapped on demand: source lines are
+    only wrapped once a line at or past them is asked for (see ensure()), so
+    the start of a long text is available without wrapping the rest"""
+    text: str
+    width: int
+    line_starts: list[int]
+    lines: list[str]
+    wrapped_sources: int
+
+    def __init__(self, s: str, width: int):
+        self.text = s.strip()
+        self.width = width
+        # offset of each source line in text; finding them doesn't copy the text
+        self.line_starts = [0] + [m.end() for m in re.finditer("\n", self.text)]
+        self.lines = []
+        self.wrapped_sources = 0
+
+    def done(self) -> bool:
+        return self.wrapped_sources == len(self.line_starts)
+
+    def ensure(self, count: int) -> None:
+        """Wraps source lines until there are at least count lines (or all of
+        the text has been wrapped)"""
+        while len(self.lines) < count and not self.done():
+            i = self.wrapped_sources
+            end = self.line_starts[i + 1] - 1 if i + 1 < len(self.line_starts) else len(self.text)
+            self.lines += wrap_line(self.text[self.line_starts[i]:end], self.width)
+            self.wrapped_sources += 1
+
+    def line(self, i: int) -> str | None:
+        """Line i, or None if the text has fewer lines"""
+        self.ensure(i + 1)
+        return self.lines[i] if i < len(self.lines) else None
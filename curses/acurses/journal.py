@@ -0,0 +1,125 @@
+"""Write-behind of reviews: answers are appended to a journal file beside the
+collection as they're given, and applied to the collection (and committed)
+in groups, so answering a card doesn't wait on the collection's writes.
+
+Answers left in the journal by a run that didn't apply them (eg. after a
+crash, or :q!) are replayed when the collection is next opened.
+"""
+
+import base64
+import binascii
+import os
+
+from anki.collection import Collection
+from anki.errors import InvalidInput, NotFoundError
+from anki.scheduler.v3 import CardAnswer
+from google.protobuf.message import DecodeError
+
+JOURNAL_SUFFIX = ".acurses-journal"
+FSYNC_EVERY = 5 # answers written between fsyncs (each is flushed to the OS as it's written)
+BATCH_SIZE = 20 # default number of answers applied together
+IDLE_APPLY_MS = 2000 # pending answers are applied after this long without a key
+
+def journal_path(col_path: str) -> str:
+    return col_path + JOURNAL_SUFFIX
+
+def is_stale_answer(err: InvalidInput) -> bool:
+    """Whether answering a card failed because its scheduling changed since
+    the answer was given"""
+    return str(err).startswith("card was modified")
+
+class ReviewJournal:
+    """The answers not yet applied to the collection, in the order they were
+    given; the file holds one base64-encoded CardAnswer per line"""
+    path: str
+    pending: list[CardAnswer]
+    unsynced: int
+
+    def __init__(self, path: str):
+        self.path = path
+        self.pending, torn = self.read()
+        self.file = open(path, "a", encoding = "ascii")
+        self.unsynced = 0
+
+        if torn:
+            self.file.write("\n") # so the next answer starts a line of its own
+
+    def read(self) -> tuple[list[CardAnswer], bool]:
+        """The answers in the journal file, and whether its last line is
+        incomplete (from a crash while it was written; it's ignored)"""
+        try:
+            with open(self.path, encoding = "ascii") as file:
+                lines = file.read().split("\n")
+        except FileNotFoundError:
+            return [], False
+
+        answers = []
+        for line in lines[:-1]: # the last is empty, unless it's incomplete
+            try:
+                answers.append(CardAnswer.FromString(base64.b64decode(line, validate = True)))
+            except (binascii.Error, DecodeError, ValueError):
+                continue
+
+        return [answer for answer in answers if answer.card_id], lines[-1] != ""
+
+    def __len__(self) -> int:
+        return len(self.pending)
+
+    def card_ids(self) -> set[int]:
+        return {answer.card_id for answer in self.pending}
+
+    def append(self, answer: CardAnswer) -> None:
+        self.file.write(base64.b64encode(answer.SerializeToString()).decode() + "\n")
+        self.file.flush()
+        self.pending.append(answer)
+
+        self.unsynced += 1
+        if self.unsynced >= FSYNC_EVERY:
+            self.sync()
+
+    def sync(self) -> None:
+        if self.unsynced:
+            os.fsync(self.file.fileno())
+            self.unsynced = 0
+
+    def apply(self, col: Collection) -> tuple[int, int]:
+        """Answers the pending cards in the collection and commits, then
+        empties the journal. Answers that were already applied (the journal is
+        only emptied after the commit) are skipped, as are answers to cards
+        that have since changed (eg. by a sync). Returns (applied, dropped).
+
+        Any other error is raised with the journal left as it was, so the
+        answers are tried again (those applied before it are then skipped)."""
+        if not self.pending:
+            return 0, 0
+
+        applied = dropped = 0
+
+        for answer in self.pending:
+            # revlog ids are answer times, so a later entry means it's done
+            if col.db.scalar("select 1 from revlog where cid = ? and id >= ? limit 1",
+                             answer.card_id, answer.answered_at_millis):
+                continue
+
+            try:
+                col.sched.answer_card(answer)
+                applied += 1
+            except InvalidInput as err:
+                if not is_stale_answer(err):
+                    raise
+                dropped += 1 # answered from a stale state
+            except NotFoundError:
+                dropped += 1 # the card has since been deleted
+
+        col.save()
+
+        self.pending = []
+        self.file.truncate(0)
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+
+        return applied, dropped
+
+    def close(self) -> None:
+        self.sync()
+        self.file.close()
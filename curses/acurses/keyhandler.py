@@ -5,6 +5,9 @@ class KeyHandler:
     keys_handled_by_parent: set[int] | None
     keybind_map: dict[int, Callable[[], bool] | Callable[[], None] |
                            Callable[[KeyHandler], bool] | Callable[[KeyHandler], None]]
+    # movement keys, mapped to a handler taking a signed count and the count for
+    # one press; runs of these in a batch of input are folded together (see handle_keys())
+    count_keybind_map: dict[str, tuple[Callable[[int], None], int]] = {}
     mainloop: Callable[[KeyHandler], None]
 
     def handle_key(self, keycode: int, child: KeyHandler = None) -> bool:
@@ -16,10 +19,50 @@ class KeyHandler:
 
         if key in self.keybind_map:
             return self.keybind_map[key](child) if child else self.keybind_map[key]()
+        elif key in self.count_keybind_map:
+            handler, count = self.count_keybind_map[key]
+            handler(count)
+            return False
         elif self.keys_handled_by_parent and key in self.keys_handled_by_parent:
             return self.parent.handle_key(keycode, self if child is None else child)
         else:
             return False
 
+    def is_count_key(self, key: str) -> bool:
+        """Whether key is handled through count_keybind_map; keybind_map takes
+        precedence, as in handle_key()"""
+        return key in self.count_keybind_map and key not in self.keybind_map
+
+    def handle_keys(self, keycodes: list[int]) -> bool:
+        """Handles a batch of keys (as read by MainMenu.getch_batch()); each run
+        of count_keybind_map keys sharing a handler becomes one call with the
+        run's net count (so 'jjjk' moves down 2), and the caller redraws once
+        for the whole batch. Returns True on a termination request"""
+        i = 0
+
+        while i < len(keycodes):
+            key = chr(keycodes[i])
+
+            if not self.is_count_key(key):
+                if self.handle_key(keycodes[i]):
+                    return True
+                i += 1
+                continue
+
+            handler, count = self.count_keybind_map[key]
+            i += 1
+
+            while i < len(keycodes) and self.is_count_key(chr(keycodes[i])):
+                next_handler, next_count = self.count_keybind_map[chr(keycodes[i])]
+                if next_handler != handler:
+                    break
+                count += next_count
+                i += 1
+
+            if count != 0:
+                handler(count)
+
+        return False
+
     def redraw(self) -> None:
         """Redraw the entire screen (header, footer, etc.)- blank in superclass"""
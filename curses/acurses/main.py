@@ -8,26 +8,31 @@ import tempfile
 import os
 import subprocess
 
-from anki import decks_pb2
-from anki import search_pb2
-from anki.collection import Collection
-from anki.models import NotetypeDict, NotetypeId, NotetypeNameId
-from anki.notes import Note, NoteId
+from typing import TYPE_CHECKING, Callable
 
+from acurses import PERF_FLAG, perf, startup
 from acurses.conf import ConfigManager
 from acurses.keyhandler import KeyHandler
-from acurses.decks import DeckManager
 from acurses.io import fill_line, align_style_print
-from acurses.sync import sync_collection
 from acurses.style import init_style
 from acurses.select_from_list import SelectFromList
-from acurses.wrappers import DeckInfo
-from acurses.html import NoteParser
-from acurses.browser import NoteBrowser
 from acurses.input_line import InputLine
 
-DeckNameId = decks_pb2.DeckNameId
-SearchNode = search_pb2.SearchNode
+# anki (and the acurses modules built on it) is slow to import, so it's
+# imported where it's first used, after the UI shell has been drawn
+if TYPE_CHECKING:
+    from anki.collection import Collection
+    from anki.decks import DeckNameId
+    from anki.models import NotetypeNameId
+    from anki.notes import Note, NoteId
+
+    from acurses.decks import DeckManager
+    from acurses.journal import ReviewJournal
+    from acurses.sync import BackgroundSync
+
+SYNC_POLL_MS = 100 # how often the footer's sync progress is updated
+SYNC_CANCEL_KEY = 27 # escape
+MAX_KEY_BATCH = 256 # most keys read (and folded together) between two frames
 
 class MainMenu(KeyHandler):
     scr: _curses.window
@@ -38,6 +43,9 @@ class MainMenu(KeyHandler):
     mw: _curses.window
     command_map: dict[str, Callable[[MainMenu], None] | Callable[[MainMenu], str]]
     edited_note_ids: set[NoteId]
+    bg_sync: BackgroundSync | None
+    dm: DeckManager | None
+    journal: ReviewJournal | None
 
     def init_keybinds(self) -> None:
         self.keybind_map = \
@@ -60,6 +68,7 @@ class MainMenu(KeyHandler):
             "find": self.find_notes,
             "findin": self.find_notes_in,
             "edits": self.browse_edited_notes,
+            "perf": self.show_perf,
         }
 
     def init_curses(self) -> None:
@@ -75,11 +84,38 @@ class MainMenu(KeyHandler):
         else:
             col_path = self.prompt("Enter collection db path:")
 
+        if self.conf.use_daemon:
+            from acurses.daemon import connect_collection
+
+            try:
+                self.col = connect_collection(col_path)
+            except Exception as e:
+                self.dump_debug(f"Error attaching to the collection daemon: {e}")
+            return
+
+        from anki.collection import Collection
+
         try:
             self.col = Collection(col_path)
         except Exception as e:
             self.dump_debug(f"Error opening collection db: {e}")
 
+    def open_journal(self) -> None:
+        """With review_journal set, reviews are written behind through a
+        journal (see acurses.journal); answers a previous run left in it are
+        applied first"""
+        if not self.conf.review_journal or not self.col.v3_scheduler():
+            return
+
+        from acurses.journal import ReviewJournal, journal_path
+
+        self.journal = ReviewJournal(journal_path(self.col.path))
+
+        if self.journal.pending:
+            applied, dropped = self.journal.apply(self.col)
+            self.set_foot(f"Replayed {applied} journaled review{'s' if applied != 1 else ''}"
+                          + (f" ({dropped} for cards changed since were dropped)" if dropped else ""))
+
     def __init__(self, scr: _curses.window):
         self.parent = None
         self.scr = scr
@@ -87,14 +123,18 @@ class MainMenu(KeyHandler):
         self.foot_str = "Loading collection..."
         self.mw = curses.newwin(curses.LINES - 4, curses.COLS, 2, 0)
         self.edited_note_ids = set()
+        self.bg_sync = None
+        self.dm = None
+        self.journal = None
 
         self.init_curses()
         self.init_keybinds()
         self.init_commands()
 
-        self.conf = ConfigManager(self)
+        startup.mark("first frame (UI shell)")
 
-        self.init_collection()
+        self.conf = ConfigManager(self)
+        startup.mark("config")
 
     def set_head(self, s: str) -> None:
         """Clear the head-line and place the given string into it"""
@@ -157,6 +197,8 @@ class MainMenu(KeyHandler):
         cmd = self.prompt("", ":", True)[1:]
 
         if cmd in self.command_map:
+            if cmd != "":
+                self.wait_for_sync() # commands use the collection
             result = self.command_map[cmd]()
             active_keyhandler.redraw()
             if result: self.set_foot(result)
@@ -170,19 +212,127 @@ class MainMenu(KeyHandler):
         return self.ask_yn("Sync collection?")
 
     def sync(self) -> None:
+        """Starts a background sync; its progress is shown in the footer"""
+        if self.sync_running():
+            return
+
+        from acurses.sync import start_sync
+
+        if self.journal is not None:
+            self.journal.apply(self.col) # so journaled reviews are synced
+
         try:
-            sync_collection(self.conf, self.col, self.set_foot, self.prompt)
+            self.bg_sync = start_sync(self.conf, self.col, self.set_foot, self.prompt)
         except Exception as e:
             self.dump_debug(f"Error while syncing: {e}")
+        else:
+            self.set_foot(self.sync_progress_str())
 
     def sync_if_consented(self) -> None:
         if self.consent_to_sync():
             self.sync()
 
+    def sync_running(self) -> bool:
+        return self.bg_sync is not None and self.bg_sync.running()
+
+    def sync_progress_str(self) -> str:
+        return f"{self.bg_sync.progress_str()}  (esc=cancel)"
+
+    def finish_sync(self) -> None:
+        """Reports the result of a finished background sync, and reloads the
+        deck list (which may have been changed by it)"""
+        bg_sync = self.bg_sync
+        self.bg_sync = None
+
+        if self.dm is not None:
+            self.dm.refresh_deck_list()
+            self.dm.draw_pad()
+            self.dm.refresh_pad()
+
+        self.set_foot(bg_sync.result_str())
+
+    def getch(self) -> int:
+        """Reads a key; while a background sync runs, the footer's progress is
+        updated every SYNC_POLL_MS, and SYNC_CANCEL_KEY cancels the sync"""
+        while True:
+            if self.bg_sync is None:
+                return self.scr.getch()
+
+            if not self.bg_sync.running():
+                self.finish_sync()
+                continue
+
+            self.scr.timeout(SYNC_POLL_MS)
+            kc = self.scr.getch()
+            self.scr.timeout(-1)
+
+            if kc == -1: # timed out
+                self.set_foot(self.sync_progress_str())
+            elif kc == SYNC_CANCEL_KEY:
+                self.bg_sync.cancel()
+            else:
+                return kc
+
+    def getch_batch(self, handler: KeyHandler) -> list[int]:
+        """Reads a key and, if it's one of handler's count keys, every pending
+        key that follows it up to the next non-count key (which is left to be
+        read next). Keys that arrive while a frame is drawn are then handled
+        together, so a slow terminal gets fewer, larger steps instead of a
+        backlog of frames."""
+        keys = [self.getch()]
+
+        if not handler.is_count_key(chr(keys[0])):
+            return keys
+
+        self.scr.timeout(0) # don't wait for keys that haven't arrived
+        try:
+            while len(keys) < MAX_KEY_BATCH:
+                kc = self.scr.getch()
+                if kc == -1:
+                    break
+                if not handler.is_count_key(chr(kc)):
+                    curses.ungetch(kc) # eg. ':' must be read by the prompt it opens
+                    break
+                keys.append(kc)
+        finally:
+            self.scr.timeout(-1)
+
+        return keys
+
+    def key_pending(self, timeout_ms: int) -> bool:
+        """Waits up to timeout_ms for a key, which is left to be read"""
+        self.scr.timeout(timeout_ms)
+        kc = self.scr.getch()
+        self.scr.timeout(-1)
+
+        if kc == -1:
+            return False
+
+        curses.ungetch(kc)
+        return True
+
+    def wait_for_sync(self) -> None:
+        """Blocks (showing progress) until any background sync is done"""
+        while self.sync_running():
+            self.set_foot(self.sync_progress_str())
+
+            self.scr.timeout(SYNC_POLL_MS)
+            if self.scr.getch() == SYNC_CANCEL_KEY:
+                self.bg_sync.cancel()
+            self.scr.timeout(-1)
+
+        if self.bg_sync is not None:
+            self.finish_sync()
+
     def force_quit(self) -> None:
+        if self.sync_running():
+            self.bg_sync.cancel()
+            self.wait_for_sync()
         exit()
 
     def write_col(self) -> None:
+        if self.journal is not None:
+            self.journal.apply(self.col) # (which saves)
         self.col.save()
 
     def write_and_quit(self) -> None:
@@ -192,6 +342,7 @@ class MainMenu(KeyHandler):
     def sync_and_quit(self) -> None:
         self.write_col()
         self.sync()
+        self.wait_for_sync()
         exit()
 
     def select_notetype(self) -> NotetypeNameId | None:
@@ -201,11 +352,13 @@ class MainMenu(KeyHandler):
             return (notetype.name, "", "")
 
         selector = SelectFromList(self, self, "Select a note type", notetypes, notetype_to_strs,
-                                  lambda nid, s: s in nid.name)
+                                  lambda nid: nid.name)
         selector.mainloop()
         return selector.get_selection()
 
     def current_deck_nameid(self) -> DeckNameId:
+        from anki.decks import DeckNameId
+
         current_id = self.col.decks.get_current_id()
         current_name = self.col.decks.name(current_id)
         return DeckNameId(name = current_name, id = current_id)
@@ -222,7 +375,7 @@ class MainMenu(KeyHandler):
             return (deck.name, "", "")
 
         selector = SelectFromList(self, self, "Select a deck", deck_list, deck_nameid_to_strs,
-                                  lambda dnid, s: s in dnid.name)
+                                  lambda dnid: dnid.name)
         selector.mainloop()
         return selector.get_selection()
 
@@ -236,28 +389,59 @@ class MainMenu(KeyHandler):
         self.edit_note(note)
 
     def edit_note(self, note: Note) -> None:
-        self.edited_note_ids.add(note.id)
-        fields = note.items()
+        self.edit_notes([note])
 
+    def run_editor(self, path: str) -> None:
+        """Opens path in $EDITOR, handing it the terminal until it exits"""
         EDITOR = os.environ.get("EDITOR", "vim")
 
         curses.endwin()
+        subprocess.call([EDITOR, path])
+
+    def edit_notes(self, notes: list[Note]) -> int:
+        """Edits every field of the given notes in a single $EDITOR session
+        (see acurses.note_document), then saves the notes that were changed with
+        one update; returns the number of notes changed"""
+        from acurses.note_document import NoteDocumentError, parse_notes, serialize_notes
+
+        self.edited_note_ids.update(note.id for note in notes)
+
+        doc = serialize_notes(notes)
+        unedited = parse_notes(doc, notes) # decoding and re-encoding isn't always exact
 
-        for k, v in fields:
-            with tempfile.NamedTemporaryFile(prefix = f"{k}__", suffix = ".tmp") as tf:
-                tf.write(str.encode(NoteParser.decode(v)))
-                tf.flush()
+        with tempfile.NamedTemporaryFile(prefix = "acurses-notes-", suffix = ".txt") as tf:
+            tf.write(str.encode(doc))
+            tf.flush()
 
-                subprocess.call([EDITOR, tf.name])
+            while True:
+                self.run_editor(tf.name)
 
-                tf.seek(0)
-                new_v = NoteParser.encode(tf.read().decode())
+                with open(tf.name, encoding = "utf-8") as file: # the editor may have replaced it
+                    doc = file.read()
 
-            note[k] = new_v
+                try:
+                    values = parse_notes(doc, notes)
+                    break
+                except NoteDocumentError as e:
+                    if not self.ask_yn(f"Invalid note document ({e}). Edit again?"):
+                        return 0
 
-        note.flush() # update cards that rely on this note
+        changed = [note for note in notes if values[note.id] != unedited[note.id]]
+
+        for note in changed:
+            for name, value in values[note.id].items():
+                if value != unedited[note.id][name]: # untouched fields keep their exact html
+                    note[name] = value
+
+        if changed:
+            self.col.update_notes(changed) # also updates cards that rely on the notes
+
+        return len(changed)
 
     def find_notes(self, regex: bool = False) -> str:
+        from anki.collection import SearchNode
+        from acurses.browser import NoteBrowser
+
         query = self.prompt("search for literal text:")
         matches = self.col.find_notes(self.col.build_search_string(SearchNode(literal_text=query)))
 
@@ -269,6 +453,9 @@ class MainMenu(KeyHandler):
         return ""
 
     def find_notes_in(self, regex: bool = False) -> str:
+        from anki.collection import SearchNode
+        from acurses.browser import NoteBrowser
+
         deck = self.select_deck()
         if deck is None: return
         query = self.prompt("search for literal text:")
@@ -286,16 +473,51 @@ class MainMenu(KeyHandler):
         if not self.edited_note_ids:
             return "<red>No matches</red>"
 
+        from acurses.browser import NoteBrowser
+
         NoteBrowser(self, self.col, self.edited_note_ids).mainloop()
 
         return ""
 
+    def show_perf(self) -> str:
+        """Lists the operation latencies recorded with --perf"""
+        if perf.recorder is None:
+            return f"<red>Latencies are only recorded with {PERF_FLAG}</red>"
+
+        summaries = list(perf.recorder.summaries().items())
+
+        def summary_to_strs(item: tuple[str, dict[str, float]]) -> tuple[str, str, str]:
+            name, s = item
+            return (name, f"{s['count']} calls  {s['total_ms']:.0f} ms total",
+                    f"p50 {s['p50_ms']:.3f}  p90 {s['p90_ms']:.3f}  p99 {s['p99_ms']:.3f}  max {s['max_ms']:.3f}")
+
+        SelectFromList(self, self, f"Operation latencies in ms (percentiles of the last {perf.WINDOW} calls)",
+                       summaries, summary_to_strs, keybind_help = "hq=back  jk=navigate").mainloop()
+
+        return ""
+
     def redraw(self) -> None:
         self.redraw_scr(self.head_str, self.foot_str)
 
     def mainloop(self) -> None:
+        # the collection is opened (and anki imported) only once the shell is
+        # on screen
+        self.init_collection()
+        perf.instrument_backend(self.col._backend)
+        self.open_journal()
+        startup.mark("collection opened")
+
+        from acurses.decks import DeckManager
+
+        # the deck list is built from local state before syncing, so it can be
+        # browsed while the sync runs
+        self.dm = DeckManager(self, self.col)
+        startup.mark("deck list built")
         self.sync_if_consented()
-        DeckManager(self, self.col).mainloop()
+        self.dm.mainloop()
+        self.dm = None
 
+        self.wait_for_sync()
         self.write_col()
         self.sync_if_consented()
+        self.wait_for_sync()
@@ -0,0 +1,118 @@
+"""Serializes notes into a single plain-text document (so that any number of
+notes, and all of their fields, can be edited in one editor session), and
+parses the edited document back into field values.
+
+    === note 1623456789012 ===
+    --- Front ---
+    field text, as produced by NoteParser.decode
+    --- Back ---
+    ...
+
+Field text lines that look like delimiters are written with a leading
+backslash, which is removed again when parsing.
+"""
+
+import re
+
+from anki.notes import Note, NoteId
+
+from acurses.html import NoteParser
+
+NOTE_DELIMITER_RE = re.compile(r"^=== note (\d+) ===$")
+FIELD_DELIMITER_RE = re.compile(r"^--- (.*) ---$")
+COMMENT_PREFIX = "#" # lines before the first note starting with this are ignored
+
+class NoteDocumentError(Exception):
+    pass
+
+def is_delimiter(line: str) -> bool:
+    return bool(NOTE_DELIMITER_RE.match(line) or FIELD_DELIMITER_RE.match(line))
+
+def serialize_notes(notes: list[Note]) -> str:
+    """The document for editing notes"""
+    out = [
+        f"{COMMENT_PREFIX} Editing {len(notes)} note{'s' if len(notes) != 1 else ''}; "
+        "keep the '===' and '---' lines as they are.",
+    ]
+
+    for note in notes:
+        out.append(f"=== note {note.id} ===")
+
+        for name, value in note.items():
+            out.append(f"--- {name} ---")
+
+            text = NoteParser.decode(value)
+            if text.endswith("\n"):
+                text = text[:-1] # the line break before the next delimiter ends it
+
+            if text:
+                out += [f"\\{line}" if is_delimiter(line) else line for line in text.split("\n")]
+
+    return "\n".join(out) + "\n"
+
+def parse_notes(doc: str, notes: list[Note]) -> dict[NoteId, dict[str, str]]:
+    """Returns the (encoded) field values given for each of notes in doc,
+    which must contain each note exactly once, with all of its fields in order;
+    raises NoteDocumentError (with the line number) otherwise"""
+    expected = {note.id: note.keys() for note in notes}
+    values = {}
+    note_id = None
+    field = None
+    field_lines = []
+
+    def end_field() -> None:
+        if field is not None:
+            try:
+                values[note_id][field] = NoteParser.encode("\n".join(field_lines))
+            except Exception as e:
+                raise NoteDocumentError(f"note {note_id}, field '{field}': {e}")
+
+    def end_note(line_no: int) -> None:
+        if note_id is not None and list(values[note_id]) != expected[note_id]:
+            missing = [name for name in expected[note_id] if name not in values[note_id]]
+            raise NoteDocumentError(f"line {line_no}: note {note_id} is missing fields {missing}")
+
+    for line_no, line in enumerate(doc.split("\n"), start = 1):
+        if (match := NOTE_DELIMITER_RE.match(line)):
+            end_field()
+            end_note(line_no)
+
+            note_id = NoteId(int(match.group(1)))
+            if note_id not in expected:
+                raise NoteDocumentError(f"line {line_no}: note {note_id} isn't being edited")
+            if note_id in values:
+                raise NoteDocumentError(f"line {line_no}: note {note_id} appears twice")
+
+            values[note_id] = {}
+            field = None
+        elif (match := FIELD_DELIMITER_RE.match(line)):
+            end_field()
+
+            if note_id is None:
+                raise NoteDocumentError(f"line {line_no}: field before the first note")
+
+            field = match.group(1)
+            fields = expected[note_id]
+            if len(values[note_id]) >= len(fields) or fields[len(values[note_id])] != field:
+                raise NoteDocumentError(f"line {line_no}: unexpected field '{field}' in note {note_id}")
+
+            values[note_id][field] = None # filled in by end_field()
+            field_lines = []
+        elif field is not None:
+            if line.startswith("\\") and is_delimiter(line[1:]):
+                line = line[1:]
+            field_lines.append(line)
+        elif line.strip() and not (note_id is None and line.startswith(COMMENT_PREFIX)):
+            raise NoteDocumentError(f"line {line_no}: text outside of a field")
+
+    # the document's final line break leaves an empty last line
+    if field is not None and field_lines and field_lines[-1] == "":
+        field_lines.pop()
+
+    end_field()
+    end_note(line_no)
+
+    if (missing := [id for id in expected if id not in values]):
+        raise NoteDocumentError(f"notes missing from the document: {missing}")
+
+    return values
@@ -0,0 +1,161 @@
+"""Latency timers for the hot paths (key dispatch, backend calls, html and
+markup parsing, and printing), kept as rolling windows of recent call times
+and shown by the :perf command.
+
+Timing is only set up by enable() (see the --perf flag), which wraps the
+timed functions in place, so they cost nothing extra otherwise. Time spent
+waiting for the user (reading keys, prompts, the editor) is left out of the
+operations it happens within, so eg. a key that opens a prompt is only
+charged for its own work.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+
+from collections import deque
+from functools import wraps
+from typing import Any, Callable
+
+WINDOW = 2048 # most recent calls kept (per operation) for the percentiles
+
+class OpStats:
+    """Call times for one operation: totals over every call, and a rolling
+    window of the most recent"""
+    samples: deque[float]
+    count: int
+    total: float
+
+    def __init__(self):
+        self.samples = deque(maxlen = WINDOW)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def summary(self) -> dict[str, float]:
+        """Times in ms; percentiles and max are over the window"""
+        window = sorted(self.samples)
+
+        def percentile(p: float) -> float:
+            return window[min(len(window) - 1, int(len(window) * p / 100))] * 1000
+
+        return {
+            "count": self.count,
+            "total_ms": self.total * 1000,
+            "mean_ms": self.total / self.count * 1000,
+            "p50_ms": percentile(50),
+            "p90_ms": percentile(90),
+            "p99_ms": percentile(99),
+            "max_ms": window[-1] * 1000,
+        }
+
+class PerfRecorder:
+    """Times operations (see timed()), less any time spent waiting for the user
+    within them (see waiting()) on the same thread"""
+    stats: dict[str, OpStats]
+
+    def __init__(self):
+        self.stats = {}
+        self.local = threading.local() # waited: total time spent waiting, wait_depth
+
+    def waited(self) -> float:
+        return getattr(self.local, "waited", 0.0)
+
+    def add(self, name: str, seconds: float) -> None:
+        if name not in self.stats:
+            self.stats[name] = OpStats()
+        self.stats[name].add(seconds)
+
+    def timed(self, name: str, fn: Callable) -> Callable:
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            waited = self.waited()
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.add(name, time.perf_counter() - start - (self.waited() - waited))
+
+        return wrapper
+
+    def waiting(self, fn: Callable) -> Callable:
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            depth = getattr(self.local, "wait_depth", 0)
+            self.local.wait_depth = depth + 1
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.local.wait_depth = depth
+                if depth == 0: # nested waits are already counted
+                    self.local.waited = self.waited() + time.perf_counter() - start
+
+        return wrapper
+
+    def summaries(self) -> dict[str, dict[str, float]]:
+        """Every operation's summary, slowest (in total) first"""
+        summaries = {name: stats.summary() for name, stats in self.stats.items()}
+        return dict(sorted(summaries.items(), key = lambda kv: -kv[1]["total_ms"]))
+
+    def dump_json(self, path: str) -> None:
+        with open(path, "w") as file:
+            json.dump({"window": WINDOW, "operations": self.summaries()}, file, indent = 2)
+
+recorder: PerfRecorder | None = None
+
+def patch(owner: Any, name: str, wrap: Callable[[Callable], Callable]) -> None:
+    """Replaces owner.name (a function, method or staticmethod) with wrap(it)"""
+    original = owner.__dict__[name]
+
+    if isinstance(original, staticmethod):
+        setattr(owner, name, staticmethod(wrap(original.__func__)))
+    else:
+        setattr(owner, name, wrap(original))
+
+def enable() -> None:
+    """Starts timing; must be called before the rest of acurses is imported,
+    so the printing functions other modules import are the timed ones"""
+    global recorder
+    recorder = PerfRecorder()
+
+    from acurses import io
+    from acurses.html import AttrParser, CardParser
+    from acurses.input_line import InputLine
+    from acurses.keyhandler import KeyHandler
+
+    patch(KeyHandler, "handle_key", lambda fn: recorder.timed("key: handle_key", fn))
+    patch(KeyHandler, "handle_keys", lambda fn: recorder.timed("key: handle_keys (batch)", fn))
+    patch(CardParser, "parse", lambda fn: recorder.timed("html: CardParser.parse", fn))
+    patch(AttrParser, "parse", lambda fn: recorder.timed("markup: AttrParser.parse", fn))
+    patch(AttrParser, "parse_runs", lambda fn: recorder.timed("markup: AttrParser.parse_runs", fn))
+
+    for name in ("print_text_and_runs", "print_text_and_attrs", "print_styled_mu",
+                 "align_style_print", "align_style_print_block"):
+        patch(io, name, lambda fn, name = name: recorder.timed(f"print: {name}", fn))
+
+    patch(InputLine, "out", recorder.waiting)
+
+    from acurses.main import MainMenu
+
+    for name in ("getch", "getch_batch", "key_pending", "dump_debug", "wait_for_sync", "run_editor"):
+        patch(MainMenu, name, recorder.waiting)
+
+def instrument_backend(backend: Any) -> None:
+    """Times the calls made through backend (once anki has been imported and
+    the collection opened)"""
+    backend_class = type(backend)
+
+    if recorder is None or getattr(backend_class, "_perf_timed", False):
+        return
+
+    for name in ("_run_command", "_db_command_bytes"):
+        setattr(backend_class, name, recorder.timed(f"backend: {name}", getattr(backend_class, name)))
+
+    backend_class._perf_timed = True
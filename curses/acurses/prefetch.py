@@ -0,0 +1,151 @@
+import curses
+import threading
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from anki.cards import BackendCard, Card, CardId
+from anki.collection import Collection
+from anki.notes import NoteId
+
+from acurses.html import AttrParser, CardParser
+from acurses.io import WrappedLines
+
+PREFETCH_LIMIT = 3 # number of upcoming cards to render ahead of time
+RENDER_CACHE_SIZE = 64 # rendered cards kept (the current one, prefetched ones, and recent ones)
+
+# (card id, template ord, note mod, notetype mod, width): anything that changes
+# a card's rendering changes its key, so stale entries are never hit
+RenderKey = tuple[CardId, int, int, int, int]
+
+def render_key(col: Collection, card: Card, width: int) -> RenderKey:
+    note_mod, notetype_mod = col.db.first(
+        "select n.mod, nt.mtime_secs from notes n join notetypes nt on nt.id = n.mid where n.id = ?",
+        card.nid)
+    return (card.id, card.ord, note_mod, notetype_mod, width)
+
+class RenderedCard:
+    """A card's question and answer, parsed into markup text that's wrapped
+    into printable lines as they're needed"""
+    key: RenderKey
+    note_id: NoteId
+    question: WrappedLines
+    answer: WrappedLines
+
+    def __init__(self, key: RenderKey, note_id: NoteId, question_html: str, answer_html: str,
+                 warm_lines: int = 0):
+        self.key = key
+        self.note_id = note_id
+        width = key[-1]
+        self.question = WrappedLines(CardParser.parse(question_html), width)
+        self.answer = WrappedLines(CardParser.parse(answer_html), width)
+
+        # wrap the first screen of each face, and warm the markup cache so
+        # printing those lines doesn't need to parse them
+        for face in (self.question, self.answer):
+            face.ensure(warm_lines)
+            for line in face.lines[:warm_lines]:
+                AttrParser.parse_runs(line)
+
+class RenderCache:
+    """A bounded (LRU) cache of rendered cards, shared by the reviewer and the
+    prefetch worker"""
+    rendered: OrderedDict[RenderKey, RenderedCard]
+
+    def __init__(self, size: int = RENDER_CACHE_SIZE):
+        self.size = size
+        self.rendered = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: RenderKey) -> RenderedCard | None:
+        with self.lock:
+            rendered = self.rendered.get(key)
+            if rendered is not None:
+                self.rendered.move_to_end(key)
+
+        return rendered
+
+    def put(self, rendered: RenderedCard) -> None:
+        with self.lock:
+            self.rendered[rendered.key] = rendered
+            self.rendered.move_to_end(rendered.key)
+
+            while len(self.rendered) > self.size:
+                self.rendered.popitem(last = False)
+
+    def render(self, col: Collection, card: Card, width: int) -> RenderedCard:
+        """Returns card rendered at width, from the cache if possible"""
+        key = render_key(col, card, width)
+
+        if (rendered := self.get(key)) is None:
+            rendered = RenderedCard(key, card.nid, card.question(), card.answer())
+            self.put(rendered)
+
+        return rendered
+
+    def discard_note(self, note_id: NoteId) -> None:
+        """Drops the cards of an edited note"""
+        with self.lock:
+            for key in [key for key, r in self.rendered.items() if r.note_id == note_id]:
+                del self.rendered[key]
+
+    def clear(self) -> None:
+        with self.lock:
+            self.rendered.clear()
+
+class CardPrefetcher:
+    """Renders the next few cards in the (v3) scheduler queue into a
+    RenderCache on a worker thread, while the user is looking at the current one.
+    The caller's thread only reads the queue, from the scheduler's snapshot
+    (which the reviewer has just fetched the current card from); the worker
+    renders the templates (the backend serializes its calls, so this only
+    waits on the caller's own backend calls), then parses and wraps them."""
+    col: Collection
+    cache: RenderCache
+    fetch_limit: int
+    generation: int
+
+    def __init__(self, col: Collection, cache: RenderCache, fetch_limit: int = PREFETCH_LIMIT):
+        self.col = col
+        self.cache = cache
+        self.fetch_limit = fetch_limit
+        self.generation = 0
+        self.executor = ThreadPoolExecutor(max_workers = 1)
+
+    def prefetch(self, width: int, skip: set[CardId] = frozenset()) -> None:
+        """Starts rendering the cards at the front of the queue (other than
+        those in skip, i.e. answered but not yet written); any prefetch still
+        running against an older queue is abandoned"""
+        self.generation += 1
+        queued_cards = self.col.sched.queue_snapshot(fetch_limit = self.fetch_limit + len(skip) + 1).cards
+        backend_cards = [queued_card.card for queued_card in queued_cards if queued_card.card.id not in skip]
+
+        # the first is the card being shown, which was rendered to show it
+        if len(backend_cards) > 1:
+            self.executor.submit(self.fill, self.generation, width, backend_cards[1:])
+
+    def invalidate(self) -> None:
+        """Abandons any prefetch in progress (i.e. after a note was edited)"""
+        self.generation += 1
+
+    def fill(self, generation: int, width: int, backend_cards: list[BackendCard]) -> None:
+        for backend_card in backend_cards:
+            if generation != self.generation:
+                return # the queue changed (i.e. a card was answered)
+
+            card = Card(self.col)
+            card._load_from_backend_card(backend_card)
+            key = render_key(self.col, card, width)
+
+            if self.cache.get(key) is not None: # (which also keeps it from being evicted)
+                continue
+
+            rendered = RenderedCard(key, card.nid, card.question(), card.answer(),
+                                    warm_lines = curses.LINES)
+
+            if generation == self.generation: # not invalidated while rendering
+                self.cache.put(rendered)
+
+    def shutdown(self) -> None:
+        self.generation += 1
+        self.executor.shutdown(wait = True, cancel_futures = True)
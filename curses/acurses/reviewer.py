@@ -1,17 +1,16 @@
 import _curses
 import curses
 
-from textwrap import wrap
-
 from anki.collection import Collection
-from anki.cards import Card
+from anki.cards import Card, CardId
+from anki.scheduler.v3 import CardAnswer, QueuedCards
 
-from acurses.io import align_style_print, align_style_print_block, fill_line, fill_line_attr
+from acurses.io import WrappedLines, align_style_print, fill_line, fill_line_attr
 from acurses.keyhandler import KeyHandler
-from acurses.html import CardParser, NoteParser
+from acurses.html import NoteParser
 from acurses.wrappers import DeckInfo
-
-PAD_HEIGHT = 1000
+from acurses.prefetch import CardPrefetcher, RenderCache, RenderKey
+from acurses.journal import BATCH_SIZE, IDLE_APPLY_MS, ReviewJournal
 
 CARD_TYPE_NEW = 0
 CARD_TYPE_LRN = 1
@@ -22,17 +21,80 @@ HARD = 2
 GOOD = 3
 EASY = 4
 
+RATINGS = {
+    AGAIN: CardAnswer.AGAIN,
+    HARD: CardAnswer.HARD,
+    GOOD: CardAnswer.GOOD,
+    EASY: CardAnswer.EASY,
+}
+
+class FacePad:
+    """A pad holding the visible window (from line top) of one face of a card;
+    lines are only wrapped and printed once they scroll into view"""
+    pad: _curses.window
+    height: int
+    lines: WrappedLines | None
+    top: int
+
+    def __init__(self, height: int, width: int):
+        self.height = height
+        self.pad = curses.newpad(height, width)
+        self.pad.scrollok(True) # allow shifting drawn lines with pad.scroll()
+        self.lines = None
+        self.top = -1 # nothing drawn
+
+    def set_lines(self, lines: WrappedLines) -> None:
+        self.lines = lines
+        self.top = -1
+
+    def clamp_top(self, top: int) -> int:
+        """The nearest top to the given one that doesn't scroll past the end"""
+        self.lines.ensure(top + self.height)
+        return max(0, min(top, len(self.lines.lines) - self.height))
+
+    def draw(self, top: int) -> None:
+        """Shows lines from top; lines already in the pad are scrolled rather
+        than reprinted"""
+        if top == self.top:
+            return
+
+        shift = top - self.top
+
+        if self.top == -1 or abs(shift) >= self.height:
+            self.pad.erase()
+            rows = range(self.height)
+        else:
+            self.pad.scroll(shift)
+            rows = range(self.height - shift, self.height) if shift > 0 else range(-shift)
+
+        self.top = top
+
+        for row in rows:
+            self.pad.move(row, 0)
+            self.pad.clrtoeol()
+
+            if (line := self.lines.line(top + row)) is not None:
+                align_style_print(self.pad, row, 2, line)
+
 class Reviewer(KeyHandler):
     col: Collection
-    deck_queue: list[int]
-    deck_list: list[DeckInfo]
+    deck: DeckInfo
     head_str: str
     foot_str: str
-    pad: _curses.window
+    face: FacePad
+    question_face: FacePad
+    answer_face: FacePad
+    pad_width: int
     pad_scroll: int
-    lines_displayed: int
     card: Card
     answer_displayed: bool
+    render_cache: RenderCache
+    drawn_key: RenderKey | None
+    prefetcher: CardPrefetcher | None
+    journal: ReviewJournal | None
+    batch_size: int
+    queued: QueuedCards.QueuedCard | None
+    pending_queues: dict[CardId, int]
     PAD_DISP_HEIGHT: int
 
     def init_keybinds(self) -> None:
@@ -49,59 +111,77 @@ class Reviewer(KeyHandler):
             'g': lambda: self.answer_card(GOOD),
             '4': lambda: self.answer_card(EASY),
             'e': lambda: self.answer_card(EASY),
-            'j': self.scroll_down,
-            'k': self.scroll_up,
             'v': self.edit_note,
         }
 
+        self.count_keybind_map = \
+        {
+            'j': (self.scroll_by, 1),
+            'k': (self.scroll_by, -1),
+            'f': (self.scroll_by, curses.LINES - 6),
+            'b': (self.scroll_by, -(curses.LINES - 6)),
+            'd': (self.scroll_by, (curses.LINES - 6) // 2),
+            'u': (self.scroll_by, -((curses.LINES - 6) // 2)),
+        }
+
         self.keys_handled_by_parent = [':']
 
-    def __init__(self, dm, deck_queue: list[int]):
+    def __init__(self, dm, deck: DeckInfo):
         self.dm = dm
         self.parent = dm
         self.mm = dm.mm
         self.col = dm.col
 
-        self.pad = curses.newpad(PAD_HEIGHT, curses.COLS)
-        self.pad_scroll = 0
-        self.lines_displayed = 0
+        # both faces of the current card are drawn into their own pads, so
+        # flipping just shows the other pad
         self.PAD_DISP_HEIGHT = curses.LINES - 6
+        self.init_pads()
+        self.pad_scroll = 0
 
-        self.head_str = "Reviewer  |  Hq=back  <space>=flip  jk=scroll  1a=again  2h=hard  3g=good  4e=easy  v=edit-note"
+        self.head_str = "Reviewer  |  Hq=back  <space>=flip  jk=scroll  fbdu=page  1a=again  2h=hard  3g=good  4e=easy  v=edit-note"
         self.foot_str = ""
 
-        self.deck_queue = deck_queue
-        self.deck_list = self.dm.deck_list
+        self.deck = deck
+
+        self.render_cache = RenderCache()
+
+        # upcoming cards can only be looked at ahead of time with the v3 scheduler
+        if self.col.v3_scheduler():
+            self.prefetcher = CardPrefetcher(self.col, self.render_cache)
+        else:
+            self.prefetcher = None
+
+        # with a journal (see acurses.journal), answers are written to the
+        # collection in batches; until then, the queue is read past them
+        self.journal = self.mm.journal
+        self.batch_size = self.mm.conf.review_batch_size or BATCH_SIZE
+        self.queued = None
+        self.pending_queues = {} # the queue (new/learning/review) each pending answer came from
 
         self.init_keybinds()
 
-    def refresh_pad(self) -> None:
-        self.pad.refresh(self.pad_scroll, 0, 4, 0, curses.LINES - 3, curses.COLS - 1)
+    def init_pads(self) -> None:
+        """The pads only hold the visible window, however long the card is"""
+        self.pad_width = curses.COLS
+        self.question_face = FacePad(self.PAD_DISP_HEIGHT, self.pad_width)
+        self.answer_face = FacePad(self.PAD_DISP_HEIGHT, self.pad_width)
+        self.face = self.question_face
+        self.drawn_key = None
 
-    def scroll_down(self) -> None:
-        if self.pad_scroll + self.PAD_DISP_HEIGHT < self.lines_displayed:
-            self.pad_scroll += 1
-        self.refresh_pad()
+    def refresh_pad(self) -> None:
+        self.face.pad.refresh(0, 0, 4, 0, curses.LINES - 3, curses.COLS - 1)
 
-    def scroll_up(self) -> None:
-        if self.pad_scroll > 0:
-            self.pad_scroll -= 1
+    def scroll_by(self, count: int) -> None:
+        """Scroll down (or up, if negative) by count lines, refreshing once"""
+        self.pad_scroll = self.face.clamp_top(self.pad_scroll + count)
+        self.face.draw(self.pad_scroll)
         self.refresh_pad()
 
-    def curr_deck_cards_remaining(self) -> tuple[int, int, int]:
-        """Returns the (new, learn, review) count sum across all decks in the queue"""
-        pass
-
     def display_header(self):
         """Prints deck name and counts on the first line of the main window"""
         fill_line(self.mm.mw, 0, char = " ")
 
-        new, lrn, rev = self.deck_list[self.deck_queue[0]].counts
-
-        # totals
-        tnew = sum([self.deck_list[i].counts[0] for i in self.deck_queue])
-        tlrn = sum([self.deck_list[i].counts[1] for i in self.deck_queue])
-        trev = sum([self.deck_list[i].counts[2] for i in self.deck_queue])
+        new, lrn, rev = self.deck.counts
 
         if self.card.type == CARD_TYPE_NEW:
             count_str = f"<u><blue>{new}</blue></u> <red>{lrn}</red> <green>{rev}</green> "
@@ -110,12 +190,12 @@ class Reviewer(KeyHandler):
         else:
             count_str = f"<blue>{new}</blue> <red>{lrn}</red> <u><green>{rev}</green></u> "
 
-        remaining_str = f" [{len(self.deck_queue)} deck{'s' if len(self.deck_queue) > 1 else ''} " \
-                        f"remaining (<blue>{tnew}</blue> <red>{tlrn}</red> <green>{trev}</green>)]"
+        studying_str = f" [{self.deck.name}]"
 
-        deck_name_str = self.col.decks.name(self.card.did)
+        # cards in a filtered deck (i.e. when studying all decks) show their home deck
+        deck_name_str = self.col.decks.name(self.card.odid or self.card.did)
 
-        align_style_print(self.mm.mw, 0, 1, remaining_str)
+        align_style_print(self.mm.mw, 0, 1, studying_str)
         align_style_print(self.mm.mw, 0, 2, f"<u>{deck_name_str}</u>")
         align_style_print(self.mm.mw, 0, 3, count_str)
 
@@ -123,52 +203,67 @@ class Reviewer(KeyHandler):
         self.mm.mw.refresh()
 
     def flip(self):
-        if self.answer_displayed:
-            self.display_question()
-        else:
-            self.display_answer()
-
-    def display_wrapped_string(self, s: str):
-        lines = []
+        self.show_face(not self.answer_displayed)
 
-        for l in s.strip().split("\n"):
-            if len(l) < curses.COLS:
-                lines.append(l)
-            else:
-                lines += wrap(l, width = curses.COLS, expand_tabs = False,
-                                 replace_whitespace = False, drop_whitespace = False)
+    def draw_card(self) -> None:
+        """Sets up both faces of the current card in their pads, unless they
+        already hold it (rendering it, unless it's in the render cache)"""
+        if self.pad_width != curses.COLS: # resized
+            self.init_pads()
 
-        self.pad_scroll = 0
-        self.lines_displayed = len(lines)
+        rendered = self.render_cache.render(self.col, self.card, curses.COLS)
+        if rendered.key == self.drawn_key:
+            return
 
-        self.pad.clear()
+        self.question_face.set_lines(rendered.question)
+        self.answer_face.set_lines(rendered.answer)
+        self.drawn_key = rendered.key
 
-        align_style_print_block(self.pad, 0, 2, lines)
+    def show_face(self, answer: bool) -> None:
+        """Shows the top of the question or answer pad (which is only redrawn
+        if it isn't already showing it)"""
+        self.answer_displayed = answer
+        self.face = self.answer_face if answer else self.question_face
+        self.pad_scroll = 0
+        self.face.draw(0)
 
         self.refresh_pad()
 
     def display_question(self):
         "Prints the question onto the pad"
-
-        self.answer_displayed = False
-        self.display_wrapped_string(CardParser.parse(self.card.question()))
+        self.draw_card()
+        self.show_face(False)
 
     def display_answer(self):
         "Prints the answer onto the pad"
-
-        self.answer_displayed = True
-        self.display_wrapped_string(CardParser.parse(self.card.answer()))
+        self.draw_card()
+        self.show_face(True)
 
     def answer_card(self, ease: int) -> None:
         assert 1 <= ease <= 4
-        self.col.sched.answerCard(self.card, ease)
 
-        idx = self.deck_queue[0]
-        self.deck_list[idx].counts = self.col.sched.counts()
+        if self.journal is None:
+            self.col.sched.answerCard(self.card, ease)
+            self.deck.counts = self.col.sched.counts()
+        else:
+            answer = self.col.sched.build_answer(card = self.card, states = self.queued.states,
+                                                 rating = RATINGS[ease])
+            self.journal.append(answer)
+            self.pending_queues[self.card.id] = self.queued.queue
+
+            if len(self.journal) >= self.batch_size:
+                self.apply_journal()
+
         self.next_card()
 
     def next_card(self) -> None:
-        self.card = self.col.sched.getCard()
+        if self.journal is None:
+            if self.prefetcher is not None:
+                # fetch the cards to prefetch along with this one, in one queue build
+                self.col.sched.queue_snapshot(fetch_limit = self.prefetcher.fetch_limit + 1)
+            self.card = self.col.sched.getCard()
+        else:
+            self.card = self.next_unanswered_card()
 
         if self.card is None:
             return
@@ -176,24 +271,89 @@ class Reviewer(KeyHandler):
         self.display_header()
         self.display_question()
 
+        if self.prefetcher is not None:
+            self.prefetcher.prefetch(curses.COLS, self.journal.card_ids() if self.journal else set())
+
+    def next_unanswered_card(self) -> Card | None:
+        """The first card in the queue without a pending answer (the backend's
+        queue starts with the cards answered since the journal was applied);
+        the counts are set leaving out the pending answers. The queue is read
+        far enough for the prefetcher to reuse it"""
+        pending = self.journal.card_ids()
+        queued_cards = self.col.sched.queue_snapshot(fetch_limit = len(pending) + 1 + self.prefetcher.fetch_limit)
+        self.queued = next((q for q in queued_cards.cards if q.card.id not in pending), None)
+
+        if self.queued is None and pending:
+            # every queued card is pending (eg. a learning card due again)
+            self.apply_journal()
+            return self.next_unanswered_card()
+
+        counts = [queued_cards.new_count, queued_cards.learning_count, queued_cards.review_count]
+        for card_id in pending:
+            if (queue := self.pending_queues.get(card_id)) is not None:
+                counts[queue] = max(0, counts[queue] - 1)
+        self.deck.counts = tuple(counts)
+
+        if self.queued is None:
+            return None
+
+        card = Card(self.col)
+        card._load_from_backend_card(self.queued.card)
+        card.start_timer()
+        return card
+
+    def apply_journal(self) -> None:
+        applied, dropped = self.journal.apply(self.col)
+        self.pending_queues.clear()
+
+        if dropped:
+            self.mm.set_foot(f"<red>{dropped} answer{'s' if dropped != 1 else ''} dropped: "
+                             "the cards were changed elsewhere</red>")
+
+    def apply_when_idle(self) -> None:
+        """Applies the pending answers while the user reads the current card;
+        the card is fetched again, in case applying them changed it (eg. buried
+        it as a sibling of an answered card)"""
+        self.apply_journal()
+
+        shown = self.card
+        self.card = self.next_unanswered_card()
+
+        if self.card is None:
+            return
+
+        if self.card.id == shown.id:
+            self.card = shown # keep its timer running
+
+        self.display_header()
+        if self.card is not shown:
+            self.display_question()
+
     def edit_note(self) -> None:
         self.mm.edit_note(self.card.note())
         self.card.load()
+
+        self.render_cache.discard_note(self.card.nid)
+        if self.prefetcher is not None:
+            self.prefetcher.invalidate()
+
         self.display_header()
         self.display_question()
 
-    def study_decks_in_queue(self) -> None:
-        while self.deck_queue:
-            idx = self.deck_queue[0]
-            self.col.decks.set_current(self.deck_list[idx].id)
-            self.col.sched.reset()
-            self.next_card()
+    def study_deck(self) -> None:
+        """Studies self.deck (and its children) through a single scheduler queue"""
+        self.col.decks.set_current(self.deck.id)
+        self.col.sched.reset()
+        self.deck.counts = self.col.sched.counts()
+        self.next_card()
 
-            while self.card != None:
-                if self.handle_key(self.mm.scr.getch()):
-                    return
+        while self.card != None:
+            if self.journal is not None and self.journal.pending and not self.mm.key_pending(IDLE_APPLY_MS):
+                self.apply_when_idle()
+                continue
 
-            self.deck_queue.pop(0)
+            if self.handle_keys(self.mm.getch_batch(self)):
+                return
 
     def redraw(self) -> None:
         self.mm.redraw_scr(self.head_str, self.foot_str)
@@ -202,4 +362,10 @@ class Reviewer(KeyHandler):
 
     def mainloop(self) -> None:
         self.mm.redraw_scr(self.head_str, self.foot_str)
-        self.study_decks_in_queue()
+        self.study_deck()
+
+        if self.prefetcher is not None:
+            self.prefetcher.shutdown()
+
+        if self.journal is not None:
+            self.apply_journal()
@@ -0,0 +1,45 @@
+from typing import Callable, Sequence, TypeVar
+
+T = TypeVar("T")
+
+class SearchIndex:
+    """Substring search over a list of elements; the lower-cased haystacks are
+    built on the first query, and a query that extends the previous one only
+    re-checks the previous matches"""
+    elems: Sequence[T]
+    elem_to_haystack: Callable[[T], str]
+    haystacks: list[str] | None
+    last_query: str | None
+    last_matches: list[int]
+
+    def __init__(self, elems: Sequence[T], elem_to_haystack: Callable[[T], str]):
+        self.elems = elems
+        self.elem_to_haystack = elem_to_haystack
+        self.haystacks = None
+        self.last_query = None
+        self.last_matches = []
+
+    def build(self) -> None:
+        self.haystacks = [self.elem_to_haystack(e).lower() for e in self.elems]
+
+    def matches(self, query: str) -> list[int]:
+        """Returns the (sorted) indices of the elements containing query,
+        ignoring case"""
+        if self.haystacks is None:
+            self.build()
+
+        query = query.lower()
+
+        if query == self.last_query:
+            return self.last_matches
+
+        if self.last_query is not None and self.last_query in query:
+            candidates = self.last_matches # anything matching query also matched last_query
+        else:
+            candidates = range(len(self.haystacks))
+
+        haystacks = self.haystacks
+        self.last_matches = [i for i in candidates if query in haystacks[i]]
+        self.last_query = query
+
+        return self.last_matches
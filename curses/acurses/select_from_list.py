@@ -1,53 +1,75 @@
 import curses
 import _curses
+import time
 
-from typing import Callable, TypeVar
+from bisect import bisect_left, bisect_right
+from typing import Callable, Sequence, TypeVar
 
+from acurses import startup
 from acurses.keyhandler import KeyHandler
 from acurses.io import align_style_print, fill_line_attr
 from acurses.input_line import InputLine
+from acurses.search import SearchIndex
 
 T = TypeVar("T")
 
+OVERSCAN = 8 # rows rendered above/below the visible window, to absorb small scrolls
+SEARCH_DELAY_MS = 100 # default idle time before search-as-you-type results are updated
+FRAME_STATS_WIDTH = 32 # columns kept for the frame stats, so a shorter one covers the last
+
 class SelectFromList(KeyHandler):
-    choices: list[T]
-    is_match: list[bool]
+    choices: Sequence[T]
+    matches: list[int]
+    search_index: SearchIndex | None
     head_str: str
     foot_str: str
     pad: _curses.window
+    pad_top: int
     pad_scroll: int
     cursor_pos: int
     PAD_DISP_HEIGHT: int
+    PAD_HEIGHT: int
     SCROLL_THRESHOLD: int
+    rendered_rows: set[int]
+    dirty_rows: set[int]
+    drawn_cursor_pos: int
+    frame_rows: int
+    frame_time: float
+
+    first_frame_marked = False # set once any list has drawn a frame (see startup.mark())
 
     def init_keybinds(self) -> None:
         self.keybind_map = \
         {
             'h': self.no_selection,
             'q': self.no_selection,
-            'j': self.move_down,
-            'k': self.move_up,
             '/': self.search,
             'n': self.next_match,
             'N': self.prev_match,
-            'f': lambda: self.screen_down(curses.LINES - 4),
-            'b': lambda: self.screen_up(curses.LINES - 4),
-            'd': lambda: self.screen_down((curses.LINES - 4) // 2),
-            'u': lambda: self.screen_up((curses.LINES - 4) // 2),
             'g': lambda: self.screen_up(1e18), # go to top
             'G': lambda: self.screen_down(1e18), # go to bottom
             'l': lambda: True,
         }
 
+        self.count_keybind_map = \
+        {
+            'j': (self.move_by, 1),
+            'k': (self.move_by, -1),
+            'f': (self.screen_by, curses.LINES - 4),
+            'b': (self.screen_by, -(curses.LINES - 4)),
+            'd': (self.screen_by, (curses.LINES - 4) // 2),
+            'u': (self.screen_by, -((curses.LINES - 4) // 2)),
+        }
+
         self.keys_handled_by_parent = [':']
 
     def __init__(self,
         mm,
         parent: KeyHandler,
         prompt: str,
-        choices: list[T],
+        choices: Sequence[T],
         elem_to_strs: Callable[[T], tuple[str, str, str]],
-        elem_is_match: Callable[[T, str], bool] = lambda e, s: False,
+        elem_to_haystack: Callable[[T], str] = lambda e: "",
         keybind_help = "hq=back  jk=navigate  l=select"):
 
         self.mm = mm
@@ -57,35 +79,103 @@ class SelectFromList(KeyHandler):
         self.foot_str = ""
 
         self.choices = choices
-        self.is_match = [False for c in choices]
+        self.matches = []
         self.elem_to_strs = elem_to_strs
-        self.elem_is_match = elem_is_match
+        self.elem_to_haystack = elem_to_haystack
+        self.search_index = None # built on first search
 
-        self.pad = curses.newpad(len(self.choices), curses.COLS)
-        self.pad_scroll = 0
-        self.cursor_pos = 0
+        # the pad only holds the visible window plus OVERSCAN rows on either side;
+        # pad row 0 corresponds to choice index pad_top
         self.PAD_DISP_HEIGHT = curses.LINES - 4
+        self.PAD_HEIGHT = self.PAD_DISP_HEIGHT + 2 * OVERSCAN
         self.SCROLL_THRESHOLD = max(1, curses.LINES // 6)
+        self.pad = curses.newpad(self.PAD_HEIGHT, curses.COLS)
+        self.pad.scrollok(True) # allow shifting rendered rows with pad.scroll()
+        self.pad_top = 0
+        self.pad_scroll = 0
+        self.cursor_pos = 0
+
+        # damage tracking: choice indices currently rendered into the pad, and
+        # those whose content changed since they were rendered
+        self.rendered_rows = set()
+        self.dirty_rows = set()
+        self.drawn_cursor_pos = -1
+        self.frame_rows = 0
+        self.frame_time = 0.0
 
         self.init_keybinds()
 
+    def rebase_pad(self) -> None:
+        """Move pad_top so that the visible window (starting at pad_scroll) lies
+        within the pad, leaving OVERSCAN rows above it where possible; rows that
+        stay within the pad are shifted with curses scrolling rather than re-rendered"""
+        if self.pad_top <= self.pad_scroll and \
+           self.pad_scroll + self.PAD_DISP_HEIGHT <= self.pad_top + self.PAD_HEIGHT:
+            return
+
+        new_top = max(0, self.pad_scroll - OVERSCAN)
+        shift = new_top - self.pad_top
+        self.pad_top = new_top
+
+        if abs(shift) >= self.PAD_HEIGHT:
+            self.pad.erase()
+            self.rendered_rows.clear()
+            return
+
+        self.pad.scroll(shift)
+        self.rendered_rows = {i for i in self.rendered_rows
+                              if self.pad_top <= i < self.pad_top + self.PAD_HEIGHT}
+
+    def mark_dirty(self, i: int | None = None) -> None:
+        """Flag choice i (or every choice, if i is None) to be re-rendered on the
+        next frame"""
+        if i is None:
+            self.rendered_rows.clear()
+            self.pad.erase()
+        else:
+            self.dirty_rows.add(i)
+
+    def draw_row(self, i: int) -> None:
+        """Render choice i into its pad row (i must be within the pad)"""
+        row = i - self.pad_top
+
+        self.pad.move(row, 0)
+        self.pad.clrtoeol()
+
+        attr = "normal"
+        if i == self.cursor_pos:
+            attr = "so"
+            fill_line_attr(self.pad, row, curses.A_STANDOUT)
+
+        left, center, right = self.elem_to_strs(self.choices[i])
+
+        align_style_print(self.pad, row, 1, f"<{attr}> {left}</{attr}>")
+        align_style_print(self.pad, row, 2, f"<{attr}>{center}</{attr}>")
+        align_style_print(self.pad, row, 3, f"<{attr}>{right} </{attr}>")
+
     def draw_pad(self) -> None:
-        self.pad.clear()
+        """Render the visible choices that aren't already up to date in the pad
+        (newly scrolled-in rows, dirty rows, and the old and new cursor rows);
+        elements off of the window are never converted to strings"""
+        start_time = time.perf_counter()
+
+        self.rebase_pad()
 
-        for i, elem in enumerate(self.choices):
-            attr = "normal"
-            if i == self.cursor_pos:
-                attr = "so"
-                fill_line_attr(self.pad, i, curses.A_STANDOUT)
+        if self.cursor_pos != self.drawn_cursor_pos:
+            self.dirty_rows.update((self.cursor_pos, self.drawn_cursor_pos))
+            self.drawn_cursor_pos = self.cursor_pos
 
-            left, center, right = self.elem_to_strs(elem)
+        self.rendered_rows -= self.dirty_rows
+        self.dirty_rows.clear()
 
-            if i < self.pad_scroll or i > self.pad_scroll + self.PAD_DISP_HEIGHT:
-                continue # don't print elems off of window
+        self.frame_rows = 0
+        for i in range(self.pad_scroll, min(len(self.choices), self.pad_scroll + self.PAD_DISP_HEIGHT)):
+            if i not in self.rendered_rows:
+                self.draw_row(i)
+                self.rendered_rows.add(i)
+                self.frame_rows += 1
 
-            align_style_print(self.pad, i, 1, f"<{attr}> {left}</{attr}>")
-            align_style_print(self.pad, i, 2, f"<{attr}>{center}</{attr}>")
-            align_style_print(self.pad, i, 3, f"<{attr}>{right} </{attr}>")
+        self.frame_time = time.perf_counter() - start_time
 
     def move_down(self) -> None:
         """Increment self.cursor_pos if possible, incrementing pad_scroll if
@@ -108,10 +198,24 @@ class SelectFromList(KeyHandler):
         if self.cursor_pos < self.pad_scroll + self.SCROLL_THRESHOLD and self.pad_scroll > 0:
             self.pad_scroll -= 1
 
+    def move_by(self, count: int) -> None:
+        """Move the cursor down (or up, if negative) by count elements"""
+        step = self.move_down if count > 0 else self.move_up
+
+        for _ in range(min(abs(count), len(self.choices))):
+            step()
+
+    def screen_by(self, count: int) -> None:
+        """Scroll down (or up, if negative) by count lines"""
+        if count > 0:
+            self.screen_down(count)
+        else:
+            self.screen_up(-count)
+
     def screen_down(self, count: int) -> None:
         """Increment self.pad_scroll and self.cursor_pos, if possible, up to the
         given count"""
-        pad_inc = min(count, len(self.choices) - (self.pad_scroll + self.PAD_DISP_HEIGHT))
+        pad_inc = max(0, min(count, len(self.choices) - (self.pad_scroll + self.PAD_DISP_HEIGHT)))
         cursor_inc = min(count, len(self.choices) - 1 - self.cursor_pos)
 
         self.pad_scroll += pad_inc
@@ -127,20 +231,34 @@ class SelectFromList(KeyHandler):
         self.cursor_pos -= cursor_dec
 
     def refresh_pad(self) -> None:
-        self.pad.refresh(self.pad_scroll, 0, 2, 0, curses.LINES - 3, curses.COLS - 1)
+        self.pad.refresh(self.pad_scroll - self.pad_top, 0, 2, 0, curses.LINES - 3, curses.COLS - 1)
+
+    def show_frame_stats(self) -> None:
+        """Print the row count and time of the last frame at the right of the
+        header, leaving the footer to status messages"""
+        stats = f"frame: {self.frame_rows} rows, {self.frame_time * 1000:.2f} ms "
+        align_style_print(self.mm.scr, 0, 3, stats.rjust(FRAME_STATS_WIDTH))
+        self.mm.scr.refresh()
 
     def redraw(self) -> None:
         self.mm.redraw_scr(self.head_str, self.foot_str)
+        self.mark_dirty() # the screen was cleared, so the pad must be fully re-rendered
 
     def mainloop(self) -> None:
         self.redraw()
 
         while True:
-            self.pad.clear()
             self.draw_pad()
             self.refresh_pad()
 
-            if self.handle_key(self.mm.scr.getch()):
+            if self.mm.conf.show_frame_time:
+                self.show_frame_stats()
+
+            if not SelectFromList.first_frame_marked:
+                startup.mark("first list frame")
+                SelectFromList.first_frame_marked = True
+
+            if self.handle_keys(self.mm.getch_batch(self)):
                 break
 
         # clear pad before returning
@@ -152,52 +270,66 @@ class SelectFromList(KeyHandler):
         return True
 
     def get_selection(self) -> T:
-        return None if self.cursor_pos == -1 else self.choices[self.cursor_pos]
-
-    def set_choices(self, choices: list[T]):
-        assert(len(choices) == len(self.choices)) # can't change height of pad
+        return None if self.cursor_pos == -1 or not self.choices else self.choices[self.cursor_pos]
 
+    def set_choices(self, choices: Sequence[T]):
+        """Replace the list of choices (which may change length), keeping the
+        cursor and scroll position within the new bounds"""
         self.choices = choices
+        self.matches = []
+        self.invalidate_search_index()
+        self.mark_dirty()
+
+        self.cursor_pos = max(0, min(self.cursor_pos, len(self.choices) - 1))
+        self.pad_scroll = max(0, min(self.pad_scroll, len(self.choices) - self.PAD_DISP_HEIGHT))
+
+    def invalidate_search_index(self) -> None:
+        """Drop the search index (i.e. after choices changed), so it is rebuilt
+        on the next search"""
+        self.search_index = None
 
     def search(self) -> None:
+        if self.search_index is None:
+            self.search_index = SearchIndex(self.choices, self.elem_to_haystack)
+
         def update(query: str) -> None:
             query = query[1:] # ignore '/'
-            for i, elem in enumerate(self.choices):
-                self.is_match[i] = self.elem_is_match(elem, query)
+            self.matches = self.search_index.matches(query)
 
             # go to next match
             self.next_match(0)
-            self.pad.clear()
             self.draw_pad()
             self.refresh_pad()
 
-        update(InputLine(self.mm, "", "/", True, update).out())
+        delay = self.mm.conf.search_delay_ms
+        update_delay = SEARCH_DELAY_MS if delay is None else delay
 
-    def next_match(self, offset: int = 1) -> None:
-        for i in range(offset, offset + len(self.choices)):
-            if self.is_match[(self.cursor_pos + i) % len(self.choices)]:
-                target = (self.cursor_pos + i) % len(self.choices)
-                diff = target - self.cursor_pos
+        update(InputLine(self.mm, "", "/", True, update, update_delay).out())
+
+    def goto(self, target: int) -> None:
+        diff = target - self.cursor_pos
 
-                if diff < 0:
-                    self.screen_up(-diff)
-                else:
-                    self.screen_down(diff)
+        if diff < 0:
+            self.screen_up(-diff)
+        else:
+            self.screen_down(diff)
 
-                return
+    def next_match(self, offset: int = 1) -> None:
+        """Move to the first match at least offset elements below the cursor,
+        wrapping around to the top"""
+        if not self.matches:
+            self.mm.set_foot("<red>No match found</red>")
+            return
 
-        self.mm.set_foot("<red>No match found</red>")
+        i = bisect_left(self.matches, self.cursor_pos + offset)
+        self.goto(self.matches[i % len(self.matches)])
 
     def prev_match(self, offset: int = 1) -> None:
-        for i in range(offset, len(self.choices) + offset):
-            if self.is_match[(self.cursor_pos - i) % len(self.choices)]:
-                target = (self.cursor_pos - i) % len(self.choices)
-                diff = target - self.cursor_pos
-
-                if diff < 0:
-                    self.screen_up(-diff)
-                else:
-                    self.screen_down(diff)
-                return
-
-        self.mm.set_foot("<red>No match found</red>")
+        """Move to the first match at least offset elements above the cursor,
+        wrapping around to the bottom"""
+        if not self.matches:
+            self.mm.set_foot("<red>No match found</red>")
+            return
+
+        i = bisect_right(self.matches, self.cursor_pos - offset)
+        self.goto(self.matches[i - 1]) # i - 1 == -1 wraps to the last match
@@ -0,0 +1,95 @@
+import builtins
+import sys
+import time
+
+from typing import TextIO
+
+class ImportTimer:
+    """Records the (cumulative) time taken by each first-time import, nested
+    like the output of `python -X importtime`"""
+    records: list[tuple[int, str, float, float] | None]
+    stack: list[list[float]]
+
+    def __init__(self):
+        self.records = [] # (depth, module name, self time, cumulative time), in start order
+        self.stack = [] # [time spent in nested imports] for each import in progress
+        self.original_import = builtins.__import__
+
+    def install(self) -> None:
+        builtins.__import__ = self.timed_import
+
+    def uninstall(self) -> None:
+        builtins.__import__ = self.original_import
+
+    def timed_import(self, name, globals = None, locals = None, fromlist = (), level = 0):
+        if level == 0 and name in sys.modules:
+            return self.original_import(name, globals, locals, fromlist, level)
+
+        index = len(self.records)
+        self.records.append(None) # filled in once the import completes
+        start = time.perf_counter()
+        self.stack.append([0.0])
+
+        try:
+            return self.original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            nested_time = self.stack.pop()[0]
+
+            if self.stack:
+                self.stack[-1][0] += elapsed
+
+            if level == 0: # relative imports are reported under their parent
+                self.records[index] = (len(self.stack), name, elapsed - nested_time, elapsed)
+
+class StartupProfile:
+    """Phase timers for the startup path (see mark()), plus an optional
+    import-time breakdown"""
+    start: float
+    last: float
+    phases: list[tuple[str, float, float]]
+    import_timer: ImportTimer
+
+    MIN_IMPORT_TIME = 0.001 # imports faster than this (cumulative) aren't reported
+
+    def __init__(self):
+        self.start = self.last = time.perf_counter()
+        self.phases = [] # (name, phase time, time since start)
+        self.import_timer = ImportTimer()
+        self.import_timer.install()
+
+    def mark(self, name: str) -> None:
+        if any(phase[0] == name for phase in self.phases):
+            return # only the first occurrence of a phase is recorded
+
+        now = time.perf_counter()
+        self.phases.append((name, now - self.last, now - self.start))
+        self.last = now
+
+    def report(self, file: TextIO = sys.stderr) -> None:
+        self.import_timer.uninstall()
+
+        print("import time:   self [ms] | cumulative [ms] | module", file = file)
+        for record in self.import_timer.records:
+            if record is None:
+                continue
+
+            depth, name, self_time, cumulative = record
+            if cumulative >= self.MIN_IMPORT_TIME:
+                print(f"import time: {self_time * 1000:10.1f} | {cumulative * 1000:15.1f} | "
+                      f"{'  ' * depth}{name}", file = file)
+
+        print("\nstartup phase:       phase [ms] |  total [ms] | phase", file = file)
+        for name, phase_time, total in self.phases:
+            print(f"startup phase: {phase_time * 1000:16.1f} | {total * 1000:11.1f} | {name}", file = file)
+
+profile: StartupProfile | None = None
+
+def enable_profile() -> None:
+    global profile
+    profile = StartupProfile()
+
+def mark(name: str) -> None:
+    """Records the end of a startup phase (a no-op unless profiling)"""
+    if profile is not None:
+        profile.mark(name)
@@ -1,9 +1,11 @@
+import threading
+
 from typing import Callable
 
 import anki.collection as collection
 
 from anki.sync import SyncAuth
-from anki.errors import SyncError
+from anki.errors import Interrupted, SyncError
 
 from acurses.conf import ConfigManager
 
@@ -33,12 +35,84 @@ prompt: Callable[[str], str]
 
     return auth
 
-def sync_collection(
+class BackgroundSync:
+    """Runs a collection sync and a media sync concurrently, each on its own
+    worker thread; the UI thread polls running() and progress_str(). While the
+    collection sync runs, any other backend call blocks until it finishes."""
+    col: collection.Collection
+    auth: SyncAuth
+    error: str | None
+    media_error: str | None
+
+    def __init__(self, col: collection.Collection, auth: SyncAuth):
+        self.col = col
+        self.auth = auth
+        self.error = None
+        self.media_error = None
+        self.threads = [threading.Thread(target = self.sync_collection, daemon = True),
+                        threading.Thread(target = self.sync_media, daemon = True)]
+
+    def start(self) -> None:
+        for thread in self.threads:
+            thread.start()
+
+    def running(self) -> bool:
+        return any(thread.is_alive() for thread in self.threads)
+
+    def cancel(self) -> None:
+        self.col.abort_sync()
+        self.col.abort_media_sync()
+
+    def sync_collection(self) -> None:
+        try:
+            result = self.col.sync_collection(self.auth)
+        except Interrupted:
+            self.error = "Sync cancelled"
+        except Exception as e:
+            self.error = f"Error while syncing: {e}"
+        else:
+            if result.required != result.NO_CHANGES:
+                self.error = "Full sync required. Please use qt."
+
+    def sync_media(self) -> None:
+        try:
+            self.col.sync_media(self.auth)
+        except Interrupted:
+            pass
+        except Exception as e:
+            self.media_error = f"Error while syncing media: {e}"
+
+    def progress_str(self) -> str:
+        """Describes the latest progress reported by the backend"""
+        progress = self.col.latest_progress()
+        kind = progress.WhichOneof("value")
+
+        if kind == "normal_sync":
+            p = progress.normal_sync
+            return f"Syncing... {p.stage} {p.added} {p.removed}"
+        elif kind == "media_sync":
+            p = progress.media_sync
+            return f"Syncing media... {p.checked} {p.added} {p.removed}"
+        else:
+            return "Syncing..."
+
+    def result_str(self) -> str:
+        """Footer markup describing how the (finished) sync went"""
+        errors = [e for e in (self.error, self.media_error) if e is not None]
+
+        if errors:
+            return f"<red>{'; '.join(errors)}</red>"
+        else:
+            return "Sync complete"
+
+def start_sync(
 conf: ConfigManager,
 col: collection.Collection,
 status: Callable[[str], None],
 prompt: Callable[[str], str]
-) -> None:
+) -> BackgroundSync:
+    """Authenticates (on the calling thread, as it may prompt), then starts
+    syncing in the background"""
     col.save(trx = False)
 
     status("Syncing... (authenticating)")
@@ -51,16 +125,7 @@ prompt: Callable[[str], str]
         except SyncError as e:
             raise Exception(f"Authentication error: {e}")
 
-    status("Syncing...")
-
-    try:
-        result = col.sync_collection(auth)
-    except Exception as e:
-        raise Exception(f"Error while syncing: {e}")
-    else:
-        if result.required == result.NO_CHANGES:
-            return
-        else:
-            raise Exception("Full sync required. Please use qt.")
+    sync = BackgroundSync(col, auth)
+    sync.start()
 
-    status("Success")
+    return sync
@@ -1,9 +1,15 @@
+from __future__ import annotations
+
 import curses
 import html
 
+from collections import OrderedDict
+from typing import Iterable, Iterator
+
 from anki.decks import DeckId
-from anki.notes import Note
+from anki.notes import NoteId
 from anki.collection import Collection
+from anki.utils import ids2str, split_fields
 
 from acurses.html import NoteParser
 
@@ -18,15 +24,14 @@ class DeckInfo:
         self.counts = counts
 
 class NoteInfo:
-    note_obj: Note
+    note_id: NoteId
     fields: list[str]
     field_str: str
     deck_str: str
 
-    def __init__(self, col: Collection, note_obj: Note):
-        self.note_obj = note_obj
-
-        self.fields = list(self.note_obj.values())
+    def __init__(self, note_id: NoteId, fields: list[str], deck_names: Iterable[str]):
+        self.note_id = note_id
+        self.fields = fields
 
         field_str = " / ".join([NoteParser.decode(f) for f in self.fields])
         field_str = field_str.replace('\n', ' ')
@@ -38,4 +43,73 @@ class NoteInfo:
             self.field_str = self.field_str[:-3] + "..."
         self.field_str = html.escape(self.field_str)
 
-        self.deck_str = ", ".join({col.decks.name(c.did) for c in note_obj.cards()})
+        self.deck_str = ", ".join(set(deck_names))
+
+class LazyNoteInfoList:
+    """A read-only sequence of NoteInfo for the given note ids, fetched a page at
+    a time (with one query per page) as elements are accessed; only the
+    MAX_PAGES most recently used pages are kept"""
+    col: Collection
+    note_ids: list[NoteId]
+    pages: OrderedDict[int, list[NoteInfo]]
+    deck_names: dict[DeckId, str]
+
+    PAGE_SIZE = 128
+    MAX_PAGES = 32
+    DELETED_NOTE = "(deleted)" # shown in place of the fields of a note that no longer exists
+
+    def __init__(self, col: Collection, note_ids: Iterable[NoteId]):
+        self.col = col
+        self.note_ids = list(note_ids)
+        self.pages = OrderedDict()
+        self.deck_names = {}
+
+    def __len__(self) -> int:
+        return len(self.note_ids)
+
+    def __getitem__(self, i: int) -> NoteInfo:
+        if not 0 <= i < len(self.note_ids):
+            raise IndexError(i)
+
+        page_idx = i // self.PAGE_SIZE
+
+        if page_idx in self.pages:
+            self.pages.move_to_end(page_idx)
+        else:
+            self.pages[page_idx] = self.load_page(page_idx)
+            if len(self.pages) > self.MAX_PAGES:
+                self.pages.popitem(last = False)
+
+        return self.pages[page_idx][i % self.PAGE_SIZE]
+
+    def __iter__(self) -> Iterator[NoteInfo]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def deck_name(self, did: DeckId) -> str:
+        if did not in self.deck_names:
+            self.deck_names[did] = self.col.decks.name(did)
+        return self.deck_names[did]
+
+    def load_page(self, page_idx: int) -> list[NoteInfo]:
+        page_ids = self.note_ids[page_idx * self.PAGE_SIZE:(page_idx + 1) * self.PAGE_SIZE]
+
+        # notes without cards are listed with no decks
+        rows = self.col.db.all("select n.id, n.flds, group_concat(distinct c.did) from notes n "
+                               f"left join cards c on c.nid = n.id where n.id in {ids2str(page_ids)} "
+                               "group by n.id")
+
+        infos = {}
+        for note_id, flds, dids in rows:
+            deck_ids = str(dids).split(",") if dids is not None else []
+            deck_names = [self.deck_name(DeckId(int(did))) for did in deck_ids]
+            infos[note_id] = NoteInfo(note_id, split_fields(flds), deck_names)
+
+        # notes deleted since the list was made keep their place, so the
+        # positions of the others don't change
+        return [infos.get(note_id) or NoteInfo(note_id, [self.DELETED_NOTE], [])
+                for note_id in page_ids]
+
+    def reload(self, i: int) -> None:
+        """Drop the page holding element i, so it is re-fetched (i.e. after an edit)"""
+        self.pages.pop(i // self.PAGE_SIZE, None)
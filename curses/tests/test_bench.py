@@ -0,0 +1,24 @@
+import argparse
+
+import pytest
+
+pytest.importorskip("anki.collection") # needs a built pylib
+
+from acurses import bench
+
+DECKS, NOTES, REVIEWS = 20, 200, 10
+
+@pytest.fixture(scope = "module")
+def col_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("bench") / "collection.anki2")
+    bench.build_synthetic_collection(path, DECKS, NOTES, REVIEWS)
+    return path
+
+@pytest.mark.parametrize("name", list(bench.SCENARIOS))
+def test_scenario(name, col_path):
+    args = argparse.Namespace(decks = DECKS, notes = NOTES, reviews = REVIEWS,
+                              typeahead = False, allocations = False)
+    out = bench.run_scenario(name, args, col_path)
+
+    assert not [line for line in out if line.strip().startswith("error:")]
+    assert any(line.strip().startswith("all ") for line in out) # keys were read and timed
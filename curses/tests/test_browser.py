@@ -0,0 +1,80 @@
+import pytest
+
+pytest.importorskip("anki.notes") # needs a built pylib
+
+from anki.errors import NotFoundError
+
+from acurses.browser import NoteBrowser
+from acurses.headless import FakeScreen, headless_curses
+
+class FakeNote:
+    def __init__(self, id):
+        self.id = id
+
+class FakeDB:
+    def __init__(self, col):
+        self.col = col
+
+    def all(self, sql):
+        return [(note_id, f"front {note_id}\x1fback", "1") for note_id in self.col.note_ids]
+
+class FakeDecks:
+    def name(self, did):
+        return "Default"
+
+class FakeCollection:
+    """Has the parts of Collection that the note browser uses"""
+
+    def __init__(self, note_ids):
+        self.note_ids = set(note_ids)
+        self.db = FakeDB(self)
+        self.decks = FakeDecks()
+
+    def get_note(self, note_id):
+        if note_id not in self.note_ids:
+            raise NotFoundError("not found", None, None, None)
+        return FakeNote(note_id)
+
+class FakeMainMenu:
+    def __init__(self, screen):
+        self.scr = screen
+        self.foot = ""
+        self.edited = []
+
+    def set_foot(self, s):
+        self.foot = s
+
+    def redraw_scr(self, head, foot):
+        pass
+
+    def edit_note(self, note):
+        self.edit_notes([note])
+
+    def edit_notes(self, notes):
+        self.edited.append([note.id for note in notes])
+
+@pytest.fixture
+def browser():
+    screen = FakeScreen(24, 80, [])
+    with headless_curses(screen):
+        col = FakeCollection([1, 2, 3])
+        browser = NoteBrowser(FakeMainMenu(screen), col, [1, 2, 3])
+        assert [note.note_id for note in browser.note_list] == [1, 2, 3] # the list is built
+        yield browser
+
+def test_edit_deleted_note(browser):
+    browser.col.note_ids.discard(1)
+
+    browser.edit_current()
+    assert browser.mm.edited == []
+    assert "1 note skipped" in browser.mm.foot
+    assert browser.note_list[0].fields == [browser.note_list.DELETED_NOTE]
+
+def test_edit_marked_skips_deleted_notes(browser):
+    browser.marked = {1, 2, 3}
+    browser.col.note_ids.discard(2)
+
+    browser.edit_marked()
+    assert browser.mm.edited == [[1, 3]]
+    assert "1 note skipped" in browser.mm.foot
+    assert not browser.marked
@@ -0,0 +1,183 @@
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+from acurses import daemon
+from acurses.daemon import (ATTACH, COMMAND, DB, DETACH, SHUTDOWN, CollectionDaemon, DaemonError,
+                            RemoteBridge, make_request, private_dir, recv_frame, send_frame)
+
+class FakeBridge:
+    """Records the requests passed to the backend"""
+
+    def __init__(self):
+        self.commands = []
+        self.db_requests = []
+
+    def command(self, service, method, data):
+        if data == b"fail":
+            raise Exception(b"serialized error")
+        self.commands.append((service, method, data))
+        return b"output"
+
+    def db_command(self, data):
+        self.db_requests.append(data)
+        return b"null"
+
+class FakeBackend:
+    def __init__(self):
+        self._backend = FakeBridge()
+
+class FakeCollection:
+    def __init__(self, path):
+        self.path = path
+        self._backend = FakeBackend()
+        self.closed = False
+
+    def save(self, trx = True):
+        pass
+
+    def close(self):
+        self.closed = True
+
+@pytest.fixture
+def served(tmp_path):
+    """A daemon serving a fake collection, and the path of its socket"""
+    col = FakeCollection(str(tmp_path / "collection.anki2"))
+    collection_daemon = CollectionDaemon(col)
+    path = str(tmp_path / "daemon.sock")
+    thread = threading.Thread(target = collection_daemon.serve, args = (path,), daemon = True)
+    thread.start()
+
+    while not daemon.daemon_running(path):
+        time.sleep(0.01)
+
+    yield collection_daemon, path
+
+    if thread.is_alive():
+        collection_daemon.server.shutdown()
+        thread.join()
+
+def db_requests(collection_daemon):
+    return collection_daemon.bridge.db_requests
+
+def test_frames():
+    a, b = socket.socketpair()
+    payloads = [b"", b"x", bytes(range(256)) * 1000]
+
+    # more than the socket buffers, so sent from another thread
+    sender = threading.Thread(target = lambda: [send_frame(a, payload) for payload in payloads])
+    sender.start()
+    assert [recv_frame(b) for _ in payloads] == payloads
+    sender.join()
+
+    # a frame cut short by the connection closing
+    a.sendall(daemon.FRAME_HEADER.pack(10) + b"abc")
+    a.close()
+    with pytest.raises(EOFError):
+        recv_frame(b)
+    b.close()
+
+def test_private_dir(tmp_path):
+    path = str(tmp_path / "private")
+    assert private_dir(path) == path
+    assert os.stat(path).st_mode & 0o777 == 0o700
+    assert private_dir(path) == path
+
+    os.chmod(path, 0o755)
+    with pytest.raises(DaemonError):
+        private_dir(path)
+
+def test_socket_is_private(served):
+    _, path = served
+    assert os.stat(path).st_mode & 0o077 == 0
+    assert daemon.served_by_user(daemon.connect(path), path)
+
+def test_attach_detach(served):
+    collection_daemon, path = served
+    col_path = collection_daemon.col.path
+    client = RemoteBridge(path)
+
+    with pytest.raises(DaemonError, match = "not attached"):
+        client.request(COMMAND, daemon.COMMAND_HEADER.pack(1, 2))
+    with pytest.raises(DaemonError, match = "is serving"):
+        client.request(ATTACH, b"/elsewhere.anki2")
+
+    client.request(ATTACH, col_path.encode())
+    assert client.command(1, 2, b"input") == b"output"
+    assert collection_daemon.bridge.commands == [(1, 2, b"input")]
+    with pytest.raises(Exception) as error:
+        client.command(1, 2, b"fail")
+    assert error.value.args == (b"serialized error",)
+
+    # only one client at a time
+    other = RemoteBridge(path)
+    with pytest.raises(DaemonError, match = "in use"):
+        other.request(ATTACH, col_path.encode())
+
+    client.db_command(b'{"kind":"begin"}')
+    assert collection_daemon.in_trx
+    client.db_command(b"\xa7\x01" + b"{" * 10) # binary requests aren't parsed
+    client.request(DETACH)
+    assert db_requests(collection_daemon)[-1] == b'{"kind":"commit"}'
+    assert collection_daemon.session is None and not collection_daemon.in_trx
+
+    other.request(ATTACH, col_path.encode())
+    other.request(DETACH)
+
+def test_disconnect_rolls_back(served):
+    collection_daemon, path = served
+    client = RemoteBridge(path)
+    client.request(ATTACH, collection_daemon.col.path.encode())
+    client.db_command(b'{"kind":"begin"}')
+
+    client.connection().close()
+    while collection_daemon.session is not None:
+        time.sleep(0.01)
+    assert db_requests(collection_daemon)[-1] == b'{"kind":"rollback"}'
+
+def test_idle_flush(served, monkeypatch):
+    monkeypatch.setattr(daemon, "IDLE_FLUSH_SECS", 0.1)
+    collection_daemon, path = served
+    client = RemoteBridge(path)
+    client.request(ATTACH, collection_daemon.col.path.encode())
+    client.db_command(b'{"kind":"begin"}')
+    client.db_command(b'{"kind":"query","sql":"update cards set mod = 0"}')
+
+    deadline = time.monotonic() + 5
+    while collection_daemon.unflushed and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert db_requests(collection_daemon)[-2:] == [b'{"kind":"commit"}', b'{"kind":"begin"}']
+    assert collection_daemon.in_trx
+
+def test_shutdown(served):
+    collection_daemon, path = served
+    client = RemoteBridge(path)
+    client.request(ATTACH, collection_daemon.col.path.encode())
+
+    # refused while another client is attached
+    sock = daemon.connect(path)
+    send_frame(sock, make_request(SHUTDOWN, bytes(16)))
+    assert recv_frame(sock)[0] == daemon.DAEMON_ERROR
+
+    # the attached client's changes are kept
+    client.request(SHUTDOWN)
+    while os.path.exists(path):
+        time.sleep(0.01)
+    assert db_requests(collection_daemon)[-1] == b'{"kind":"commit"}'
+    assert collection_daemon.col.closed
+
+def test_spawn_failure(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", private_dir(str(tmp_path / "runtime")))
+    path = daemon.socket_path()
+
+    # the daemon can't open a collection in a missing directory, and exits
+    start = time.monotonic()
+    with pytest.raises(DaemonError, match = "exited with status"):
+        daemon.spawn_daemon(str(tmp_path / "missing" / "collection.anki2"), path)
+    assert time.monotonic() - start < daemon.START_TIMEOUT / 2
+
+    with open(os.path.join(os.path.dirname(path), daemon.LOG_NAME)) as log:
+        assert "Traceback" in log.read()
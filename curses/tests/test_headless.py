@@ -0,0 +1,28 @@
+from acurses.headless import PAUSE, FakeScreen, FakeWindow, keys
+
+def test_insstr():
+    win = FakeWindow(2, 8, [0])
+    win.addstr(0, 0, "abcdef")
+
+    win.insstr(0, 2, "XY")
+    assert win.text(0) == "abXYcdef"
+    win.insstr(0, 0, "12", 0) # the end of the line is pushed off
+    assert win.text(0) == "12abXYcd"
+
+    win.move(1, 3)
+    win.insstr("z")
+    win.insstr("y") # the cursor stays put
+    assert win.text(1) == "   yz"
+
+    win.insnstr(1, 0, "12345", 2)
+    assert win.text(1) == "12   yz"
+    assert win.counter == [6]
+
+def test_key_script():
+    screen = FakeScreen(2, 8, keys("ab", PAUSE, "c"))
+    assert [screen.getch(), screen.getch()] == [ord("a"), ord("b")]
+
+    screen.timeout(100) # a timed read times out at the pause
+    assert screen.getch() == -1
+    assert screen.getch() == ord("c")
+    assert len(screen.records) == 3
@@ -0,0 +1,14 @@
+import pytest
+
+from acurses.html import NoteParser
+
+@pytest.mark.parametrize("tag", ["b", "i", "u"])
+def test_escaped_tags_round_trip(tag):
+    text = f"a <{tag}>x</{tag}> b"
+    decoded = NoteParser.decode(text)
+
+    assert decoded == f"a \\{tag}x\\{tag.upper()} b"
+    assert NoteParser.encode(decoded) == text # closing tags are written in lower case, as they're read
+
+def test_backslash_round_trip():
+    assert NoteParser.encode(NoteParser.decode("a\\b")) == "a\\b"
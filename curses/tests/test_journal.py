@@ -0,0 +1,64 @@
+import pytest
+
+pytest.importorskip("anki.scheduler.v3") # needs a built pylib
+
+from anki.errors import DBError, InvalidInput
+from anki.scheduler.v3 import CardAnswer
+
+from acurses.journal import ReviewJournal
+
+class FakeDB:
+    def scalar(self, sql, *args):
+        return None # no answer has been applied yet
+
+class FakeScheduler:
+    def __init__(self, error):
+        self.error = error
+        self.answered = []
+
+    def answer_card(self, answer):
+        if self.error is not None:
+            raise self.error
+        self.answered.append(answer.card_id)
+
+class FakeCollection:
+    """Has the parts of Collection that journals use"""
+
+    def __init__(self, error = None):
+        self.db = FakeDB()
+        self.sched = FakeScheduler(error)
+        self.saved = False
+
+    def save(self):
+        self.saved = True
+
+def journal_with_answer(tmp_path):
+    journal = ReviewJournal(str(tmp_path / "collection.anki2.acurses-journal"))
+    journal.append(CardAnswer(card_id = 1, answered_at_millis = 1000))
+    return journal
+
+def test_apply(tmp_path):
+    journal = journal_with_answer(tmp_path)
+    col = FakeCollection()
+
+    assert journal.apply(col) == (1, 0)
+    assert col.sched.answered == [1] and col.saved
+    assert len(journal) == 0 and journal.read() == ([], False)
+
+def test_apply_drops_stale_answers(tmp_path):
+    journal = journal_with_answer(tmp_path)
+    col = FakeCollection(InvalidInput("card was modified: ...", None, None, None))
+
+    assert journal.apply(col) == (0, 1)
+    assert len(journal) == 0 and journal.read() == ([], False)
+
+def test_apply_keeps_answers_on_other_errors(tmp_path):
+    journal = journal_with_answer(tmp_path)
+    col = FakeCollection(DBError("database is locked", None, None, None))
+
+    with pytest.raises(DBError):
+        journal.apply(col)
+
+    assert journal.card_ids() == {1}
+    journal.close()
+    assert [answer.card_id for answer in ReviewJournal(journal.path).pending] == [1]
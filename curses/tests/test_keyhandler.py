@@ -0,0 +1,28 @@
+from acurses.keyhandler import KeyHandler
+
+class Handler(KeyHandler):
+    def __init__(self):
+        self.calls = []
+        self.parent = None
+        self.keys_handled_by_parent = None
+        self.keybind_map = {'j': lambda: self.calls.append("bound")}
+        self.count_keybind_map = {'j': (self.move, 1), 'k': (self.move, -1)}
+
+    def move(self, count):
+        self.calls.append(count)
+
+def test_keybind_map_takes_precedence():
+    handler = Handler()
+    handler.handle_key(ord('j'))
+    handler.handle_keys([ord('j')])
+    assert handler.calls == ["bound", "bound"]
+
+def test_count_keys_are_folded():
+    handler = Handler()
+    handler.handle_keys([ord(c) for c in "kkjk"])
+    assert handler.calls == [-2, "bound", -1]
+
+    del handler.keybind_map['j']
+    handler.calls.clear()
+    handler.handle_keys([ord(c) for c in "jjjk"])
+    assert handler.calls == [2]
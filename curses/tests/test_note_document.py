@@ -0,0 +1,83 @@
+import pytest
+
+pytest.importorskip("anki.notes") # needs a built pylib
+
+from acurses.html import NoteParser
+from acurses.note_document import NoteDocumentError, parse_notes, serialize_notes
+
+class FakeNote:
+    """Has the parts of Note that note documents use"""
+
+    def __init__(self, id, fields):
+        self.id = id
+        self.fields = fields
+
+    def keys(self):
+        return list(self.fields)
+
+    def items(self):
+        return list(self.fields.items())
+
+def round_trip(notes):
+    return parse_notes(serialize_notes(notes), notes)
+
+def test_round_trip():
+    notes = [
+        FakeNote(1, {"Front": "one", "Back": "two &amp; three"}),
+        FakeNote(2, {"Front": "first<div>second</div><div>third</div>", "Back": "a\\b"}),
+    ]
+
+    values = round_trip(notes)
+    assert list(values) == [1, 2]
+    for note in notes:
+        assert values[note.id] == dict(note.fields)
+
+def test_empty_fields():
+    notes = [FakeNote(1, {"Front": "", "Back": ""}), FakeNote(2, {"Front": "x", "Back": ""})]
+    assert round_trip(notes) == {1: {"Front": "", "Back": ""}, 2: {"Front": "x", "Back": ""}}
+
+def test_trailing_breaks():
+    # trailing line breaks don't survive the round trip, which is why
+    # edit_notes only writes back fields that were edited
+    notes = [FakeNote(1, {"Front": "x<br>", "Back": "y<br><br>"})]
+    assert round_trip(notes) == {1: {"Front": "x", "Back": "y"}}
+
+def test_escaped_delimiters():
+    text = "=== note 2 ===<div>--- Back ---</div><div>== note 3 ==</div>"
+    notes = [FakeNote(1, {"Front": text, "Back": "=== note 1 ==="}), FakeNote(2, {"Front": "", "Back": ""})]
+    doc = serialize_notes(notes)
+
+    assert "\\=== note 2 ===\n\\--- Back ---\n== note 3 ==\n" in doc
+    assert round_trip(notes)[1] == {"Front": text, "Back": "=== note 1 ==="}
+
+def test_edited_document():
+    notes = [FakeNote(1, {"Front": "old", "Back": ""})]
+    doc = serialize_notes(notes).replace("old", "new\nline")
+
+    assert parse_notes(doc, notes) == {1: {"Front": "new<div>line</div>", "Back": ""}}
+    assert NoteParser.decode(parse_notes(doc, notes)[1]["Front"]) == "new\nline\n"
+
+@pytest.mark.parametrize("doc, error", [
+    ("--- Front ---\n", "line 1: field before the first note"),
+    ("stray\n=== note 1 ===\n", "line 1: text outside of a field"),
+    ("=== note 1 ===\nstray\n", "line 2: text outside of a field"),
+    ("=== note 3 ===\n", "line 1: note 3 isn't being edited"),
+    ("=== note 1 ===\n--- Front ---\n--- Back ---\n=== note 1 ===\n", "line 4: note 1 appears twice"),
+    ("=== note 1 ===\n--- Back ---\n", "line 2: unexpected field 'Back' in note 1"),
+    ("=== note 1 ===\n--- Front ---\n--- Back ---\n--- Extra ---\n", "line 4: unexpected field 'Extra'"),
+    ("=== note 1 ===\n--- Front ---\n=== note 2 ===\n", r"line 3: note 1 is missing fields \['Back'\]"),
+    ("=== note 1 ===\n--- Front ---\n--- Back ---\n=== note 2 ===\n--- Front ---\n",
+     r"note 2 is missing fields \['Back'\]"),
+    ("=== note 1 ===\n--- Front ---\n--- Back ---\n", r"notes missing from the document: \[2\]"),
+    ("=== note 1 ===\n--- Front ---\n\\x\n--- Back ---\n", "note 1, field 'Front': .*invalid backslash escape"),
+])
+def test_errors(doc, error):
+    notes = [FakeNote(1, {"Front": "", "Back": ""}), FakeNote(2, {"Front": "", "Back": ""})]
+
+    with pytest.raises(NoteDocumentError, match = error):
+        parse_notes(doc, notes)
+
+def test_comments():
+    notes = [FakeNote(1, {"Front": "", "Back": ""})]
+    doc = "# a comment\n\n" + serialize_notes(notes) + "\n"
+    assert parse_notes(doc, notes) == {1: {"Front": "", "Back": ""}}
@@ -13,10 +13,11 @@ from markdown import markdown
 import anki.buildinfo
 from anki import _rsbridge, backend_pb2, i18n_pb2
 from anki._backend_generated import RustBackendGenerated
+from anki._dbwire import DbColumns, decode_db_result, encode_execute_many
 from anki._fluent import GeneratedTranslations
 from anki.dbproxy import Row as DBRow
 from anki.dbproxy import ValueForDB
-from anki.utils import from_json_bytes, to_json_bytes
+from anki.utils import to_json_bytes
 
 from .errors import (
     BackendError,
@@ -81,21 +82,73 @@ class RustBackend(RustBackendGenerated):
             server=server,
         )
         self._backend = _rsbridge.open_backend(init_msg.SerializeToString())
+        # incremented on every call into the backend
+        self.command_count = 0
+        # incremented on every call that may change the collection (ops,
+        # undo, syncs, imports, and DB statements that write); lets callers
+        # tell whether a result they fetched earlier could be out of date
+        self.change_count = 0
+
+    # query results and executemany() arguments are sent in the compact
+    # binary format of _dbwire when True, and as JSON otherwise
+    binary_db_rows = True
 
     @staticmethod
     def syncserver() -> None:
         _rsbridge.syncserver()
 
     def db_query(
-        self, sql: str, args: Sequence[ValueForDB], first_row_only: bool
+        self,
+        sql: str,
+        args: Sequence[ValueForDB],
+        first_row_only: bool,
+        modifies: bool,
     ) -> list[DBRow]:
+        "modifies is whether sql writes to the collection, as DBProxy classified it."
+        if modifies:
+            self.change_count += 1
         return self._db_command(
-            dict(kind="query", sql=sql, args=args, first_row_only=first_row_only)
+            dict(
+                kind="query",
+                sql=sql,
+                args=args,
+                first_row_only=first_row_only,
+                binary=self.binary_db_rows,
+            )
         )
 
     def db_execute_many(self, sql: str, args: list[list[ValueForDB]]) -> list[DBRow]:
+        self.change_count += 1
+        if self.binary_db_rows and (request := encode_execute_many(sql, args)):
+            return self._db_command_bytes(request)
         return self._db_command(dict(kind="executemany", sql=sql, args=args))
 
+    def db_columns(self, sql: str, args: Sequence[ValueForDB]) -> DbColumns:
+        return self._db_command(dict(kind="columns", sql=sql, args=args))
+
+    def db_iterate(
+        self,
+        sql: str,
+        args: Sequence[ValueForDB],
+        batch_size: int,
+        modifies: bool,
+        key: str,
+    ) -> dict[str, Any]:
+        "Opens a cursor, returning its first batch as dict(cursor=, rows=, done=)."
+        if modifies:
+            self.change_count += 1
+        return self._db_command(
+            dict(kind="iterate", sql=sql, args=args, batch_size=batch_size, key=key)
+        )
+
+    def db_fetch(self, cursor: int, batch_size: int) -> dict[str, Any]:
+        return self._db_command(
+            dict(kind="fetch", cursor=cursor, batch_size=batch_size)
+        )
+
+    def db_close_cursor(self, cursor: int) -> None:
+        return self._db_command(dict(kind="closecursor", cursor=cursor))
+
     def db_begin(self) -> None:
         return self._db_command(dict(kind="begin"))
 
@@ -103,14 +156,20 @@ class RustBackend(RustBackendGenerated):
         return self._db_command(dict(kind="commit"))
 
     def db_rollback(self) -> None:
+        self.change_count += 1
         return self._db_command(dict(kind="rollback"))
 
     def _db_command(self, input: dict[str, Any]) -> Any:
-        bytes_input = to_json_bytes(input)
+        return self._db_command_bytes(to_json_bytes(input))
+
+    def _db_command_bytes(self, input: bytes) -> Any:
+        self.command_count += 1
         try:
-            return from_json_bytes(self._backend.db_command(bytes_input))
+            output = self._backend.db_command(input)
         except Exception as error:
             err_bytes = bytes(error.args[0])
+        else:
+            return decode_db_result(output)
         err = backend_pb2.BackendError()
         err.ParseFromString(err_bytes)
         raise backend_exception_to_pylib(err)
@@ -146,6 +205,9 @@ class RustBackend(RustBackendGenerated):
         return self.format_timespan(seconds=seconds, context=context)
 
     def _run_command(self, service: int, method: int, input: bytes) -> bytes:
+        self.command_count += 1
+        if (service, method) in self._changing_commands:
+            self.change_count += 1
         try:
             return self._backend.command(service, method, input)
         except Exception as error:
@@ -0,0 +1,224 @@
+# Copyright: Ankitects Pty Ltd and contributors
+# License: GNU AGPL, version 3 or later; http://www.gnu.org/licenses/agpl.html
+
+"""
+Binary encoding of DB rows exchanged with the backend (see dbproxy.rs).
+
+Rows are sent column by column. A column whose values all share a type is
+packed: integers and floats as little-endian 8-byte arrays, text as the
+character count of each value followed by their concatenated UTF-8, and
+blobs as byte lengths followed by the concatenated bytes. Other columns
+(eg. with some nulls) tag each value with its type.
+
+    magic (2 bytes), row count (u32), column count (u32), then per column:
+    type (u8), data
+
+Query results use this format when the backend supports it; anything else
+the backend returns is JSON. executemany() arguments are sent this way when
+every column is packable, and as JSON otherwise.
+
+The result of DBProxy.columns() starts with its own magic and the column
+names (a u32 count, then each name as a u32 length and UTF-8), followed by
+the rows as above. Its integer and float columns are returned undecoded, so
+they can be read into arrays without creating Python objects.
+"""
+
+from __future__ import annotations
+
+import struct
+import sys
+from array import array
+from itertools import accumulate
+from typing import Any, NamedTuple, Sequence
+
+from anki.dbproxy import Row, ValueForDB
+from anki.utils import from_json_bytes
+
+MAGIC = b"\xa7\x01"  # can't start a JSON document
+COLUMNS_MAGIC = b"\xa7\x02"
+HEADER = struct.Struct("<II")  # rows, columns
+EXECUTE_MANY_HEADER = struct.Struct("<BI")  # request kind, sql length
+EXECUTE_MANY = 1
+
+NULL, INT, REAL, TEXT, BLOB, MIXED = range(6)
+
+_U32 = struct.Struct("<I")
+_I64 = struct.Struct("<q")
+_F64 = struct.Struct("<d")
+
+
+def _array(typecode: str, data: bytes | memoryview) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+def _array_bytes(values: array) -> bytes:
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values.tobytes()
+
+
+def _slices(data: Any, lengths: Sequence[int]) -> list:
+    ends = list(accumulate(lengths))
+    return [data[start:end] for start, end in zip([0] + ends[:-1], ends)]
+
+
+def _decode_mixed(view: memoryview, pos: int, count: int) -> tuple[list, int]:
+    column: list[ValueForDB | bytes] = []
+    for _ in range(count):
+        kind = view[pos]
+        pos += 1
+        if kind == NULL:
+            column.append(None)
+        elif kind == INT:
+            column.append(_I64.unpack_from(view, pos)[0])
+            pos += 8
+        elif kind == REAL:
+            column.append(_F64.unpack_from(view, pos)[0])
+            pos += 8
+        else:
+            (length,) = _U32.unpack_from(view, pos)
+            pos += 4
+            value = bytes(view[pos : pos + length])
+            column.append(value.decode() if kind == TEXT else value)
+            pos += length
+    return column, pos
+
+
+class DbColumns(NamedTuple):
+    "The result of a columns request."
+
+    count: int
+    names: list[str]
+    kinds: list[int]
+    # memoryviews of little-endian 8-byte values for INT and REAL columns,
+    # and lists for the others
+    values: list[memoryview | list]
+
+
+def decode_columns(
+    data: bytes, pos: int = 0, kinds: list[int] | None = None
+) -> tuple[int, list]:
+    """Returns (row count, columns) from a block starting at pos. If kinds
+    is provided, each column's type is added to it, and INT and REAL columns
+    are left undecoded."""
+    view = memoryview(data)
+    count, column_count = HEADER.unpack_from(view, pos)
+    pos += HEADER.size
+    columns = []
+
+    for _ in range(column_count):
+        kind = view[pos]
+        pos += 1
+        column: memoryview | list
+        if kinds is not None:
+            kinds.append(kind)
+        if kind == NULL:
+            column = [None] * count
+        elif kind in (INT, REAL):
+            end = pos + 8 * count
+            if kinds is not None:
+                column = view[pos:end]
+            else:
+                column = _array("q" if kind == INT else "d", view[pos:end]).tolist()
+            pos = end
+        elif kind in (TEXT, BLOB):
+            lengths = _array("I", view[pos : pos + 4 * count])
+            pos += 4 * count
+            if kind == TEXT:
+                (size,) = _U32.unpack_from(view, pos)
+                pos += 4
+                column = _slices(bytes(view[pos : pos + size]).decode(), lengths)
+            else:
+                size = sum(lengths)
+                column = _slices(bytes(view[pos : pos + size]), lengths)
+            pos += size
+        elif kind == MIXED:
+            column, pos = _decode_mixed(view, pos, count)
+        else:
+            raise Exception(f"unknown column type {kind}")
+        columns.append(column)
+
+    return count, columns
+
+
+def decode_rows(data: bytes) -> list[Row]:
+    count, columns = decode_columns(data, len(MAGIC))
+    if not columns:
+        return [[] for _ in range(count)]
+    return list(map(list, zip(*columns)))
+
+
+def decode_named_columns(data: bytes) -> DbColumns:
+    view = memoryview(data)
+    pos = len(COLUMNS_MAGIC)
+    (name_count,) = _U32.unpack_from(view, pos)
+    pos += 4
+    names = []
+    for _ in range(name_count):
+        (length,) = _U32.unpack_from(view, pos)
+        pos += 4
+        names.append(bytes(view[pos : pos + length]).decode())
+        pos += length
+
+    kinds: list[int] = []
+    count, values = decode_columns(data, pos, kinds)
+    return DbColumns(count, names, kinds, values)
+
+
+def decode_db_result(data: bytes) -> Any:
+    "Decodes a DB command's output, which is binary rows or columns, or JSON."
+    magic = data[: len(MAGIC)]
+    if magic == MAGIC:
+        return decode_rows(data)
+    elif magic == COLUMNS_MAGIC:
+        return decode_named_columns(data)
+    return from_json_bytes(data)
+
+
+def _encode_column(column: Sequence) -> bytes | None:
+    types = set(map(type, column))
+    if types == {int}:
+        try:
+            return bytes([INT]) + _array_bytes(array("q", column))
+        except OverflowError:
+            return None
+    elif types == {float}:
+        return bytes([REAL]) + _array_bytes(array("d", column))
+    elif types == {str}:
+        data = "".join(column).encode()
+        lengths = _array_bytes(array("I", map(len, column)))
+        return bytes([TEXT]) + lengths + _U32.pack(len(data)) + data
+    elif types == {bytes}:
+        lengths = _array_bytes(array("I", map(len, column)))
+        return bytes([BLOB]) + lengths + b"".join(column)
+    elif types == {type(None)}:
+        return bytes([NULL])
+    else:
+        return None
+
+
+def encode_execute_many(
+    sql: str, rows: Sequence[Sequence[ValueForDB]]
+) -> bytes | None:
+    """An executemany request for the backend, or None if its arguments can't
+    be sent in binary (a column mixes types), and JSON should be used."""
+    width = len(rows[0]) if rows else 0
+    if any(len(row) != width for row in rows):
+        return None
+
+    parts = [HEADER.pack(len(rows), width)]
+    for column in zip(*rows):
+        encoded = _encode_column(column)
+        if encoded is None:
+            return None
+        parts.append(encoded)
+
+    sql_bytes = sql.encode()
+    return b"".join(
+        [MAGIC, EXECUTE_MANY_HEADER.pack(EXECUTE_MANY, len(sql_bytes)), sql_bytes]
+        + parts
+    )
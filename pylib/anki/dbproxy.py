@@ -4,10 +4,14 @@
 from __future__ import annotations
 
 import re
+from collections import OrderedDict
+from itertools import islice
 from re import Match
-from typing import TYPE_CHECKING, Any, Iterable, Sequence, Union
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator, Sequence, Union
 
 if TYPE_CHECKING:
+    import numpy
+
     import anki._backend
 
 # DBValue is actually Union[str, int, float, None], but if defined
@@ -18,6 +22,13 @@ Row = Sequence[ValueFromDB]
 
 ValueForDB = Union[str, int, float, None]
 
+# rows decoded at a time by DBProxy.iterate()
+DEFAULT_BATCH_SIZE = 1000
+# rows sent to the backend at a time by DBProxy.executemany()
+DEFAULT_CHUNK_SIZE = 5000
+# statements kept by DBProxy.prepare(); the backend keeps as many compiled
+MAX_STATEMENTS = 50
+
 
 class DBProxy:
     # Lifecycle
@@ -27,6 +38,9 @@ class DBProxy:
         self._backend = backend
         self.modified_in_python = False
         self.last_begin_at = 0
+        self._statements: OrderedDict[str, Statement] = OrderedDict()
+        self.statement_hits = 0
+        self.statement_misses = 0
 
     # Transactions
     ###############
@@ -51,14 +65,17 @@ class DBProxy:
         first_row_only: bool = False,
         **kwargs: ValueForDB,
     ) -> list[Row]:
-        # mark modified?
-        cananoized = sql.strip().lower()
-        for stmt in "insert", "update", "delete":
-            if cananoized.startswith(stmt):
-                self.modified_in_python = True
+        modifies = self._mark_if_modifying(sql)
         sql, args2 = emulate_named_args(sql, args, kwargs)
         # fetch rows
-        return self._backend.db_query(sql, args2, first_row_only)
+        return self._backend.db_query(sql, args2, first_row_only, modifies)
+
+    def _mark_if_modifying(self, sql: str) -> bool:
+        "Note if sql modifies the collection, returning whether it does."
+        if is_modifying(sql):
+            self.modified_in_python = True
+            return True
+        return False
 
     # Query shortcuts
     ###################
@@ -89,16 +106,176 @@ class DBProxy:
     # with .all()
     execute = all
 
+    def iterate(
+        self,
+        sql: str,
+        *args: ValueForDB,
+        key: str,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        **kwargs: ValueForDB,
+    ) -> Iterator[Row]:
+        """Yield the rows of a query, reading batch_size rows at a time, so
+        only one batch is held in memory, on either side of the backend.
+
+        key names a unique, non-null column of the result (eg. "id"). Rows
+        are returned in its order, and each batch re-runs the query for the
+        rows after the last key of the one before, so no row is skipped or
+        repeated, and batches stay fast on large tables."""
+        modifies = self._mark_if_modifying(sql)
+        sql, args2 = emulate_named_args(sql, args, kwargs)
+        batch = self._backend.db_iterate(sql, args2, batch_size, modifies, key)
+        try:
+            while True:
+                yield from batch["rows"]
+                if batch["done"]:
+                    return
+                batch = self._backend.db_fetch(batch["cursor"], batch_size)
+        finally:
+            if not batch["done"]:
+                self._backend.db_close_cursor(batch["cursor"])
+
+    def columns(
+        self,
+        sql: str,
+        *args: ValueForDB,
+        dtypes: dict[str, Any] | None = None,
+        **kwargs: ValueForDB,
+    ) -> dict[str, numpy.ndarray]:
+        """Return a query's columns as NumPy arrays, keyed by column name.
+
+        Integer and float columns are read straight into int64 and float64
+        arrays, without creating a Python object per value. Other columns
+        (text, blobs, or a mix of types, including nulls) become object
+        arrays. dtypes maps column names to the dtype to use instead.
+
+        Requires numpy, which Anki doesn't depend on."""
+        import numpy as np
+
+        from anki._dbwire import INT, REAL
+
+        self._mark_if_modifying(sql)
+        sql, args2 = emulate_named_args(sql, args, kwargs)
+        result = self._backend.db_columns(sql, args2)
+        dtypes = dtypes or {}
+        arrays = {}
+        for name, kind, values in zip(result.names, result.kinds, result.values):
+            dtype = dtypes.get(name)
+            if kind in (INT, REAL):
+                packed = np.frombuffer(values, "<i8" if kind == INT else "<f8")
+                arrays[name] = packed.astype(dtype or packed.dtype.newbyteorder("="))
+            else:
+                arrays[name] = np.array(values, dtype=dtype or object)
+        return arrays
+
+    # Prepared statements
+    ######################
+
+    def prepare(self, sql: str) -> Statement:
+        """Return a statement that can be run repeatedly with different
+        arguments, for queries in loops. Named arguments aren't supported.
+
+        The MAX_STATEMENTS most recently prepared statements are kept, so
+        preparing the same SQL again usually returns the same one. The
+        backend separately keeps the statements it has compiled most
+        recently (rusqlite's prepare_cached()), for all queries."""
+        statement = self._statements.get(sql)
+        if statement is None:
+            self.statement_misses += 1
+            statement = self._statements[sql] = Statement(self, sql)
+            if len(self._statements) > MAX_STATEMENTS:
+                self._statements.popitem(last=False)
+        else:
+            self.statement_hits += 1
+            self._statements.move_to_end(sql)
+        return statement
+
+    def statement_stats(self) -> dict[str, int]:
+        "Hits and misses of prepare(), and the number of statements kept."
+        return dict(
+            hits=self.statement_hits,
+            misses=self.statement_misses,
+            size=len(self._statements),
+        )
+
     # Updates
     ################
 
-    def executemany(self, sql: str, args: Iterable[Sequence[ValueForDB]]) -> None:
+    def executemany(
+        self,
+        sql: str,
+        args: Iterable[Sequence[ValueForDB]],
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        progress: Callable[[int], None] | None = None,
+    ) -> None:
+        """Run sql with each of args, which may be a generator.
+
+        The arguments are read and sent to the backend chunk_size rows at a
+        time, so they needn't all be in memory at once. If there's more than
+        one chunk, they're written inside a savepoint, and either all rows
+        are written, or none are; args mustn't commit the collection while
+        it's being read. progress is called with the number of rows written
+        so far after each chunk."""
         self.modified_in_python = True
-        if isinstance(args, list):
-            list_args = args
-        else:
-            list_args = list(args)
-        self._backend.db_execute_many(sql, list_args)
+        rows = iter(args)
+        chunk = list(islice(rows, chunk_size))
+        if len(chunk) < chunk_size:
+            self._backend.db_execute_many(sql, chunk)
+            if progress:
+                progress(len(chunk))
+            return
+
+        self.execute("savepoint executemany")
+        try:
+            written = 0
+            while chunk:
+                self._backend.db_execute_many(sql, chunk)
+                written += len(chunk)
+                if progress:
+                    progress(written)
+                chunk = list(islice(rows, chunk_size))
+        except:
+            self.execute("rollback to executemany")
+            raise
+        finally:
+            self.execute("release executemany")
+
+
+class Statement:
+    """A query from DBProxy.prepare(). Whether it modifies the collection is
+    only worked out once, and passed to the backend on each run."""
+
+    def __init__(self, db: DBProxy, sql: str) -> None:
+        self.db = db
+        self.sql = sql
+        self.modifies = is_modifying(sql)
+
+    def _query(self, args: Sequence[ValueForDB], first_row_only: bool) -> list[Row]:
+        if self.modifies:
+            self.db.modified_in_python = True
+        return self.db._backend.db_query(
+            self.sql, args, first_row_only, self.modifies
+        )
+
+    def all(self, *args: ValueForDB) -> list[Row]:
+        return self._query(args, first_row_only=False)
+
+    def list(self, *args: ValueForDB) -> list[ValueFromDB]:
+        return [x[0] for x in self._query(args, first_row_only=False)]
+
+    def first(self, *args: ValueForDB) -> Row | None:
+        rows = self._query(args, first_row_only=True)
+        return rows[0] if rows else None
+
+    def scalar(self, *args: ValueForDB) -> ValueFromDB:
+        rows = self._query(args, first_row_only=True)
+        return rows[0][0] if rows else None
+
+    execute = all
+
+
+def is_modifying(sql: str) -> bool:
+    "True if sql is an insert, update or delete."
+    return sql.strip().lower().startswith(("insert", "update", "delete"))
 
 
 # convert kwargs to list format
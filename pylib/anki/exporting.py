@@ -14,7 +14,7 @@ import time
 import unicodedata
 import zipfile
 from io import BufferedWriter
-from typing import Any, Optional, Sequence
+from typing import Any, Iterator, Optional, Sequence
 from zipfile import ZipFile
 
 from anki import hooks
@@ -211,37 +211,45 @@ class AnkiExporter(Exporter):
         cids = self.cardIds()
         # copy cards, noting used nids
         nids = {}
-        data: list[Sequence] = []
-        for row in self.src.db.execute(
-            "select * from cards where id in " + ids2str(cids)
-        ):
-            # clear flags
-            row = list(row)
-            row[-2] = 0
-            nids[row[1]] = True
-            data.append(row)
+
+        def cards() -> Iterator[Sequence]:
+            for row in self.src.db.iterate(
+                "select * from cards where id in " + ids2str(cids), key="id"
+            ):
+                # clear flags
+                row = list(row)
+                row[-2] = 0
+                nids[row[1]] = True
+                yield row
+
         self.dst.db.executemany(
-            "insert into cards values (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)", data
+            "insert into cards values (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)", cards()
         )
         # notes
         strnids = ids2str(list(nids.keys()))
-        notedata = []
-        for row in self.src.db.all("select * from notes where id in " + strnids):
-            # remove system tags if not exporting scheduling info
-            if not self.includeSched:
-                row = list(row)
-                row[5] = self.removeSystemTags(row[5])
-            notedata.append(row)
+
+        def notes() -> Iterator[Sequence]:
+            for row in self.src.db.iterate(
+                "select * from notes where id in " + strnids, key="id"
+            ):
+                # remove system tags if not exporting scheduling info
+                if not self.includeSched:
+                    row = list(row)
+                    row[5] = self.removeSystemTags(row[5])
+                yield row
+
         self.dst.db.executemany(
-            "insert into notes values (?,?,?,?,?,?,?,?,?,?,?)", notedata
+            "insert into notes values (?,?,?,?,?,?,?,?,?,?,?)", notes()
         )
         # models used by the notes
         mids = self.dst.db.list("select distinct mid from notes where id in " + strnids)
         # card history and revlog
         if self.includeSched:
-            data = self.src.db.all("select * from revlog where cid in " + ids2str(cids))
             self.dst.db.executemany(
-                "insert into revlog values (?,?,?,?,?,?,?,?,?)", data
+                "insert into revlog values (?,?,?,?,?,?,?,?,?)",
+                self.src.db.iterate(
+                    "select * from revlog where cid in " + ids2str(cids), key="id"
+                ),
             )
         else:
             # need to reset card state
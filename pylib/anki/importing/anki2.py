@@ -5,7 +5,7 @@
 
 import os
 import unicodedata
-from typing import Optional
+from typing import Iterator, Optional
 
 from anki.cards import CardId
 from anki.collection import Collection
@@ -108,7 +108,7 @@ class Anki2Importer(Importer):
         dupesIdentical = []
         dupesIgnored = []
         total = 0
-        for note in self.src.db.execute("select * from notes"):
+        for note in self.src.db.iterate("select * from notes", key="id"):
             total += 1
             # turn the db result into a mutable list
             note = list(note)
@@ -318,80 +318,86 @@ class Anki2Importer(Importer):
         ):
             existing[cid] = True
             self._cards[(guid, ord)] = cid
-        # loop through src
-        cards = []
-        revlog = []
-        cnt = 0
+        # source card ids, mapped to their ids in dst
+        imported: dict[CardId, CardId] = {}
         usn = self.dst.usn()
         aheadBy = self.src.sched.today - self.dst.sched.today
-        for card in self.src.db.execute(
-            "select f.guid, f.mid, c.* from cards c, notes f where c.nid = f.id"
-        ):
-            guid = card[0]
-            if guid in self._ignoredGuids:
-                continue
-            # does the card's note exist in dst col?
-            if guid not in self._notes:
-                continue
-            # does the card already exist in the dst col?
-            ord = card[5]
-            if (guid, ord) in self._cards:
-                # fixme: in future, could update if newer mod time
-                continue
-            # doesn't exist. strip off note info, and save src id for later
-            card = list(card[2:])
-            scid = card[0]
-            # ensure the card id is unique
-            while card[0] in existing:
-                card[0] += 999
-            existing[card[0]] = True
-            # update cid, nid, etc
-            card[1] = self._notes[guid][0]
-            card[2] = self._did(card[2])
-            card[4] = int_time()
-            card[5] = usn
-            # review cards have a due date relative to collection
-            if (
-                card[7] in (QUEUE_TYPE_REV, QUEUE_TYPE_DAY_LEARN_RELEARN)
-                or card[6] == CARD_TYPE_REV
+
+        # cards are read from src as they're written to dst
+        def cards() -> Iterator[list]:
+            for card in self.src.db.iterate(
+                "select f.guid, f.mid, c.* from cards c, notes f where c.nid = f.id",
+                key="id",
             ):
-                card[8] -= aheadBy
-            # odue needs updating too
-            if card[14]:
-                card[14] -= aheadBy
-            # if odid true, convert card from filtered to normal
-            if card[15]:
-                # odid
-                card[15] = 0
-                # odue
-                card[8] = card[14]
-                card[14] = 0
-                # queue
-                if card[6] == CARD_TYPE_LRN:  # type
-                    card[7] = QUEUE_TYPE_NEW
-                else:
-                    card[7] = card[6]
-                # type
-                if card[6] == CARD_TYPE_LRN:
-                    card[6] = CARD_TYPE_NEW
-            cards.append(card)
-            # we need to import revlog, rewriting card ids and bumping usn
-            for rev in self.src.db.execute("select * from revlog where cid = ?", scid):
-                rev = list(rev)
-                rev[1] = card[0]
-                rev[2] = self.dst.usn()
-                revlog.append(rev)
-            cnt += 1
+                guid = card[0]
+                if guid in self._ignoredGuids:
+                    continue
+                # does the card's note exist in dst col?
+                if guid not in self._notes:
+                    continue
+                # does the card already exist in the dst col?
+                ord = card[5]
+                if (guid, ord) in self._cards:
+                    # fixme: in future, could update if newer mod time
+                    continue
+                # doesn't exist. strip off note info, and save src id for later
+                card = list(card[2:])
+                scid = card[0]
+                # ensure the card id is unique
+                while card[0] in existing:
+                    card[0] += 999
+                existing[card[0]] = True
+                # update cid, nid, etc
+                card[1] = self._notes[guid][0]
+                card[2] = self._did(card[2])
+                card[4] = int_time()
+                card[5] = usn
+                # review cards have a due date relative to collection
+                if (
+                    card[7] in (QUEUE_TYPE_REV, QUEUE_TYPE_DAY_LEARN_RELEARN)
+                    or card[6] == CARD_TYPE_REV
+                ):
+                    card[8] -= aheadBy
+                # odue needs updating too
+                if card[14]:
+                    card[14] -= aheadBy
+                # if odid true, convert card from filtered to normal
+                if card[15]:
+                    # odid
+                    card[15] = 0
+                    # odue
+                    card[8] = card[14]
+                    card[14] = 0
+                    # queue
+                    if card[6] == CARD_TYPE_LRN:  # type
+                        card[7] = QUEUE_TYPE_NEW
+                    else:
+                        card[7] = card[6]
+                    # type
+                    if card[6] == CARD_TYPE_LRN:
+                        card[6] = CARD_TYPE_NEW
+                imported[scid] = card[0]
+                yield card
+
+        # we need to import revlog, rewriting card ids and bumping usn
+        def revlog() -> Iterator[list]:
+            for rev in self.src.db.iterate("select * from revlog", key="id"):
+                if rev[1] in imported:
+                    rev = list(rev)
+                    rev[1] = imported[rev[1]]
+                    rev[2] = usn
+                    yield rev
+
         # apply
         self.dst.db.executemany(
             """
 insert or ignore into cards values (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)""",
-            cards,
+            cards(),
         )
         self.dst.db.executemany(
             """
 insert or ignore into revlog values (?,?,?,?,?,?,?,?,?)""",
-            revlog,
+            revlog(),
         )
 
     # Media
@@ -144,6 +144,7 @@ class NoteImporter(Importer):
         self._cards: list[tuple] = []
         dupeCount = 0
         dupes: list[str] = []
+        note_fields = self.col.db.prepare("select flds from notes where id = ?")
         for n in notes:
             for c, field in enumerate(n.fields):
                 if not self.allowHTML:
@@ -170,7 +171,7 @@ class NoteImporter(Importer):
             if csum in csums:
                 # csum is not a guarantee; have to check
                 for id in csums[csum]:
-                    flds = self.col.db.scalar("select flds from notes where id = ?", id)
+                    flds = note_fields.scalar(id)
                     sflds = split_fields(flds)
                     if fld0 == sflds[0]:
                         # duplicate
@@ -14,6 +14,7 @@ as '2' internally.
 
 from __future__ import annotations
 
+import time
 from typing import Literal, Optional, Sequence
 
 from anki import scheduler_pb2
@@ -34,6 +35,10 @@ SchedulingContext = scheduler_pb2.SchedulingContext
 SchedulingStatesWithContext = scheduler_pb2.SchedulingStatesWithContext
 CardAnswer = scheduler_pb2.CardAnswer
 
+# seconds a queue snapshot is reused for; learning cards become due as time
+# passes without any change to the collection
+QUEUE_SNAPSHOT_SECS = 1.0
+
 
 class Scheduler(SchedulerBaseWithLegacy):
     version = 3
@@ -41,6 +46,9 @@ class Scheduler(SchedulerBaseWithLegacy):
     # don't rely on this, it will likely be removed in the future
     reps = 0
 
+    # (backend change count when fetched, time fetched, fetch limit, queued cards)
+    _queue_snapshot: tuple[int, float, int, QueuedCards] | None = None
+
     # Fetching the next card
     ##########################################################################
 
@@ -55,6 +63,31 @@ class Scheduler(SchedulerBaseWithLegacy):
             fetch_limit=fetch_limit, intraday_learning_only=intraday_learning_only
         )
 
+    def queue_snapshot(self, *, fetch_limit: int = 1) -> QueuedCards:
+        """Like get_queued_cards(), but reuses the previous result if nothing
+        that could change the collection has been sent to the backend since
+        it was fetched, within QUEUE_SNAPSHOT_SECS, so a card and the counts
+        can be read with a single queue build. The result may hold more than
+        fetch_limit cards, if an earlier caller asked for more."""
+        change_count = self.col._backend.change_count
+        now = time.monotonic()
+        snapshot = self._queue_snapshot
+        if (
+            snapshot is None
+            or snapshot[0] != change_count
+            or now - snapshot[1] >= QUEUE_SNAPSHOT_SECS
+            or snapshot[2] < fetch_limit
+        ):
+            queued = self.get_queued_cards(fetch_limit=fetch_limit)
+            snapshot = (change_count, now, fetch_limit, queued)
+            self._queue_snapshot = snapshot
+        return snapshot[3]
+
+    def invalidate_queue_snapshot(self, changes: OpChanges | None = None) -> None:
+        "Discard the queue snapshot if changes (or any change, if None) affect the queues."
+        if changes is None or changes.study_queues:
+            self._queue_snapshot = None
+
     def describe_next_states(self, next_states: SchedulingStates) -> Sequence[str]:
         "Labels for each of the answer buttons."
         return self.col._backend.describe_next_states(next_states)
@@ -94,7 +127,9 @@ class Scheduler(SchedulerBaseWithLegacy):
         "Update card to provided state, and remove it from queue."
         self.reps += 1
         op_bytes = self.col._backend.answer_card_raw(input.SerializeToString())
-        return OpChanges.FromString(op_bytes)
+        changes = OpChanges.FromString(op_bytes)
+        self.invalidate_queue_snapshot(changes)
+        return changes
 
     def state_is_leech(self, new_state: SchedulingState) -> bool:
         "True if new state marks the card as a leech."
@@ -105,12 +140,12 @@ class Scheduler(SchedulerBaseWithLegacy):
 
     def reset(self) -> None:
         # backend automatically resets queues as operations are performed
-        pass
+        self.invalidate_queue_snapshot()
 
     def getCard(self) -> Optional[Card]:
         """Fetch the next card from the queue. None if finished."""
         try:
-            queued_card = self.get_queued_cards().cards[0]
+            queued_card = self.queue_snapshot().cards[0]
         except IndexError:
             return None
 
@@ -121,10 +156,10 @@ class Scheduler(SchedulerBaseWithLegacy):
 
     def _is_finished(self) -> bool:
         "Don't use this, it is a stop-gap until this code is refactored."
-        return not self.get_queued_cards().cards
+        return not self.queue_snapshot().cards
 
     def counts(self, card: Optional[Card] = None) -> tuple[int, int, int]:
-        info = self.get_queued_cards()
+        info = self.queue_snapshot()
         return (info.new_count, info.learning_count, info.review_count)
 
     @property
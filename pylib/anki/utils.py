@@ -94,7 +94,9 @@ def timestamp_id(db: DBProxy, table: str) -> int:
     # be careful not to create multiple objects without flushing them, or they
     # may share an ID.
     timestamp = int_time(1000)
-    while db.scalar(f"select id from {table} where id = ?", timestamp):
+    # db holds on to the statement, so it's only prepared once per table
+    taken = db.prepare(f"select id from {table} where id = ?")
+    while taken.scalar(timestamp):
         timestamp += 1
     return timestamp
 
@@ -8,7 +8,7 @@ import tempfile
 from typing import Any
 
 from anki.collection import Collection as aopen
-from anki.dbproxy import emulate_named_args
+from anki.dbproxy import MAX_STATEMENTS, emulate_named_args
 from anki.lang import TR, without_unicode_isolation
 from anki.stdmodels import _legacy_add_basic_model, get_stock_notetypes
 from anki.utils import is_win
@@ -173,3 +173,83 @@ def test_db_named_args(capsys):
 
     # swallow the warning
     _ = capsys.readouterr()
+
+
+def test_db_iterate():
+    col = getEmptyCol()
+    col.db.execute("create table t (a int, b text)")
+    col.db.executemany("insert into t values (?, ?)", ((i, str(i)) for i in range(25)))
+    rows = col.db.all("select * from t order by a")
+    # batches of any size yield the same rows as all(), in the key's order,
+    # each starting after the last key of the one before
+    for batch_size in (1, 7, 25, 100):
+        it = col.db.iterate("select * from t", key="a", batch_size=batch_size)
+        assert list(it) == rows
+    it = col.db.iterate("select b, a from t where a > ?", 22, key="a", batch_size=1)
+    assert list(it) == [["23", 23], ["24", 24]]
+    assert list(col.db.iterate("select * from t where a < 0", key="a")) == []
+    # rows inserted behind the cursor while it's read aren't repeated
+    it = col.db.iterate("select a from t", key="a", batch_size=10)
+    assert next(it) == [0]
+    col.db.execute("insert into t values (-1, '-1')")
+    assert [row[0] for row in it] == list(range(1, 25))
+    col.db.execute("delete from t where a = -1")
+    # a key that isn't a column of the result is an error
+    assertException(Exception, lambda: list(col.db.iterate("select b from t", key="a")))
+    # stopping early closes the cursor, leaving the rest unread
+    it = col.db.iterate("select a from t", key="a", batch_size=10)
+    assert next(it) == [0]
+    it.close()
+    assert col.db.scalar("select count() from t") == 25
+
+
+def test_db_prepare():
+    col = getEmptyCol()
+    col.db.execute("create table t (a int, b text)")
+    col.db.executemany("insert into t values (?, ?)", ((i, str(i)) for i in range(5)))
+
+    select = col.db.prepare("select b from t where a = ?")
+    assert not select.modifies
+    assert [select.scalar(i) for i in range(6)] == ["0", "1", "2", "3", "4", None]
+    assert select.all(2) == col.db.all("select b from t where a = ?", 2)
+    assert select.first(9) is None
+    assert col.db.prepare("select b from t where a = ?") is select
+
+    col.db.modified_in_python = False
+    change_count = col._backend.change_count
+    update = col.db.prepare(" UPDATE t set b = ? where a = ?")
+    assert update.modifies
+    update.execute("x", 1)
+    assert col.db.modified_in_python
+    assert col._backend.change_count == change_count + 1
+    assert select.scalar(1) == "x"
+    assert col._backend.change_count == change_count + 1
+
+    # only the most recently prepared statements are kept
+    assert col.db.statement_stats() == dict(hits=1, misses=2, size=2)
+    for i in range(MAX_STATEMENTS):
+        col.db.prepare(f"select {i}")
+    assert col.db.statement_stats()["size"] == MAX_STATEMENTS
+    assert col.db.prepare("select b from t where a = ?") is not select
+
+
+def test_db_executemany_chunks():
+    col = getEmptyCol()
+    col.db.execute("create table t (a int primary key)")
+    written = []
+    col.db.executemany(
+        "insert into t values (?)",
+        ([i] for i in range(25)),
+        chunk_size=10,
+        progress=written.append,
+    )
+    assert written == [10, 20, 25]
+    assert col.db.list("select a from t order by a") == list(range(25))
+
+    # a failure in a later chunk undoes the earlier ones
+    rows = [[i] for i in range(100, 120)] + [[0]]
+    assertException(
+        Exception,
+        lambda: col.db.executemany("insert into t values (?)", rows, chunk_size=10),
+    )
+    assert col.db.scalar("select count() from t") == 25
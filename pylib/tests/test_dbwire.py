@@ -0,0 +1,103 @@
+# Copyright: Ankitects Pty Ltd and contributors
+# License: GNU AGPL, version 3 or later; http://www.gnu.org/licenses/agpl.html
+
+import os
+import time
+
+import pytest
+
+from anki._dbwire import MAGIC, decode_db_result, encode_execute_many
+from tests.shared import getEmptyCol
+
+# set to run the revlog scan benchmark, eg. ANKI_DB_BENCHMARK=1000000
+BENCHMARK_ROWS = int(os.environ.get("ANKI_DB_BENCHMARK", "0"))
+
+
+def test_encode_execute_many():
+    # columns of one type are sent in binary
+    assert encode_execute_many("sql", [[1, "a", b"", 1.5, None]]).startswith(MAGIC)
+    assert encode_execute_many("sql", []).startswith(MAGIC)
+    # others fall back to JSON
+    assert encode_execute_many("sql", [[1], [None]]) is None
+    assert encode_execute_many("sql", [[1], ["1"]]) is None
+    assert encode_execute_many("sql", [[True]]) is None
+    assert encode_execute_many("sql", [[2**63]]) is None
+    assert encode_execute_many("sql", [[1, 2], [3]]) is None
+    # results that aren't rows are JSON
+    assert decode_db_result(b"null") is None
+
+
+def test_binary_rows_match_json():
+    col = getEmptyCol()
+    rows = [
+        [1, "añb😀", b"\x00\xff", 1.5, None],
+        [-(2**63), "", b"", -0.0, None],
+        [2**63 - 1, "x" * 1000, b"y" * 1000, 1e300, None],
+    ]
+    mixed = [[None, 1, 2.5, "é", b"z"]]
+    col.db.execute("create table t (a, b, c, d, e)")
+
+    for binary in (True, False):
+        col._backend.binary_db_rows = binary
+        col.db.execute("delete from t")
+        col.db.executemany("insert into t values (?, ?, ?, ?, ?)", rows)
+        col.db.executemany("insert into t values (?, ?, ?, ?, ?)", mixed)
+        assert col.db.all("select * from t order by rowid") == rows + mixed
+        assert col.db.all("select * from t where a is null") == mixed
+        assert col.db.first("select b, d from t") == ["añb😀", 1.5]
+        assert col.db.all("select * from t where 0") == []
+        assert col.db.list("select a from t order by rowid") == [
+            1,
+            -(2**63),
+            2**63 - 1,
+            None,
+        ]
+
+
+def test_revlog_scan_benchmark():
+    if not BENCHMARK_ROWS:
+        pytest.skip("set ANKI_DB_BENCHMARK to the number of revlog rows to scan")
+
+    col = getEmptyCol()
+    revlog = [
+        [i + 1, i % 5000, -1, i % 4 + 1, i % 365, i % 100, 2500, i % 60000, 1]
+        for i in range(BENCHMARK_ROWS)
+    ]
+    col.db.executemany("insert into revlog values (?,?,?,?,?,?,?,?,?)", revlog)
+
+    results = {}
+    for binary in (False, True):
+        col._backend.binary_db_rows = binary
+        start = time.perf_counter()
+        results[binary] = col.db.all("select * from revlog")
+        elapsed = time.perf_counter() - start
+        print(
+            f"{'binary' if binary else 'json'}: {BENCHMARK_ROWS / elapsed:,.0f} rows/s"
+        )
+
+    assert results[True] == results[False] == revlog
+
+
+def test_columns():
+    np = pytest.importorskip("numpy")
+    col = getEmptyCol()
+    col.db.execute("create table t (a, b, c, d)")
+    col.db.executemany(
+        "insert into t values (?, ?, ?, ?)", [[1, 1.5, "x", None], [2, 2.5, None, 3]]
+    )
+
+    cols = col.db.columns("select a, b, c, d as e from t order by a")
+    assert list(cols) == ["a", "b", "c", "e"]
+    assert cols["a"].dtype == np.int64 and list(cols["a"]) == [1, 2]
+    assert cols["b"].dtype == np.float64 and list(cols["b"]) == [1.5, 2.5]
+    assert cols["c"].dtype == object and list(cols["c"]) == ["x", None]
+    assert list(cols["e"]) == [None, 3]
+
+    cols = col.db.columns(
+        "select a, d from t where a > ?", 0, dtypes=dict(a=np.int32, d=float)
+    )
+    assert cols["a"].dtype == np.int32
+    assert np.isnan(cols["d"][0]) and cols["d"][1] == 3.0
+
+    cols = col.db.columns("select a, b from t where 0", dtypes=dict(b=float))
+    assert len(cols["a"]) == 0 and cols["b"].dtype == np.float64
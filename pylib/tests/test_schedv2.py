@@ -966,6 +966,48 @@ def test_counts_idx_new():
     assert col.sched.countIdx(c) == 0
 
 
+def test_queue_snapshot():
+    if not is_2021():
+        pytest.skip("new sched only")
+    col = getEmptyCol()
+    note = col.newNote()
+    note["Front"] = "one"
+    col.addNote(note)
+    col.reset()
+    # repeated reads share a single queue build
+    snapshot = col.sched.queue_snapshot()
+    assert col.sched.queue_snapshot() is snapshot
+    assert col.sched.counts() == (1, 0, 0)
+    c = col.sched.getCard()
+    assert col.sched.queue_snapshot() is snapshot
+    # answering invalidates it
+    col.sched.answerCard(c, 1)
+    assert col.sched.queue_snapshot() is not snapshot
+    assert col.sched.counts() == (0, 1, 0)
+    # reads don't
+    snapshot = col.sched.queue_snapshot()
+    col.sched.deck_due_tree()
+    col.db.scalar("select count() from cards")
+    assert col.sched.queue_snapshot() is snapshot
+    # other operations, undo and writes through the db do
+    col.sched.bury_cards([c.id])
+    assert col.sched.counts() == (0, 0, 0)
+    assert col.sched.queue_snapshot() is not snapshot
+    col.undo()
+    assert col.sched.counts() == (0, 1, 0)
+    snapshot = col.sched.queue_snapshot()
+    col.db.execute("update cards set queue = -1")
+    assert col.sched.queue_snapshot() is not snapshot
+    # and it expires, as learning cards become due over time
+    snapshot = col.sched.queue_snapshot()
+    col.sched._queue_snapshot = (col._backend.change_count, float("-inf"), 1, snapshot)
+    assert col.sched.queue_snapshot() is not snapshot
+    # a snapshot of more cards serves smaller requests, but not larger ones
+    snapshot = col.sched.queue_snapshot(fetch_limit=3)
+    assert col.sched.queue_snapshot() is snapshot
+    assert col.sched.queue_snapshot(fetch_limit=4) is not snapshot
+
+
 def test_repCounts():
     col = getEmptyCol()
     note = col.newNote()
@@ -55,6 +55,8 @@ LABEL_REQUIRED = 2
 LABEL_REPEATED = 3
 
 RAW_ONLY = {"TranslateString"}
+# services whose commands may all change the collection (eg. undo, syncing)
+CHANGING_SERVICES = {"COLLECTION", "SYNC", "IMPORT_EXPORT"}
 
 
 def python_type(field):
@@ -160,14 +162,36 @@ def render_method(service_idx, method_idx, method):
     return buf
 
 
+def is_op_changes(message):
+    return message.name.startswith("OpChanges")
+
+
+def may_change_collection(service_name, method):
+    "True for ops, which return OpChanges, and the commands of CHANGING_SERVICES."
+    output = method.output_type
+    return (
+        service_name in CHANGING_SERVICES
+        or is_op_changes(output)
+        or any(
+            f.type == TYPE_MESSAGE and is_op_changes(f.message_type)
+            for f in output.fields
+        )
+    )
+
+
 out: list[str] = []
+changing: list[str] = []
 
 
 def render_service(
-    service: google.protobuf.descriptor.ServiceDescriptor, service_index: int
+    service: google.protobuf.descriptor.ServiceDescriptor,
+    service_index: int,
+    service_name: str,
 ) -> None:
     for method_index, method in enumerate(service.methods):
         out.append(render_method(service_index, method_index, method))
+        if may_change_collection(service_name, method):
+            changing.append(f"({service_index}, {method_index})")
 
 
 service_modules = dict(
@@ -200,7 +224,7 @@ for service in anki.backend_pb2.ServiceIndex.DESCRIPTOR.values:
         continue
     service_obj = getattr(service_pkg, service_var)
     service_index = service.number
-    render_service(service_obj, service_index)
+    render_service(service_obj, service_index, base)
 
 with open(sys.argv[1], "w", encoding="utf8") as f:
     f.write(
@@ -243,6 +267,11 @@ import anki.import_export_pb2
 import anki.image_occlusion_pb2
 
 class RustBackendGenerated:
+    # the (service, method) of each command that may change the collection
+    _changing_commands: frozenset[tuple[int, int]] = frozenset({'''
+        + ", ".join(changing)
+        + '''})
+
     def _run_command(self, service: int, method: int, input: Any) -> bytes:
         raise Exception("not implemented")
 
@@ -46,12 +46,16 @@ impl AnkidroidService for Backend {
     }
 
     fn run_db_command(&self, input: Json) -> Result<Json> {
-        self.with_col(|col| db_command_bytes(col, &input.json))
-            .map(|json| Json { json })
+        self.with_col(|col| {
+            db_command_bytes(col, &mut self.db_cursors.lock().unwrap(), &input.json)
+        })
+        .map(|json| Json { json })
     }
 
     fn run_db_command_proto(&self, input: Json) -> Result<DbResponse> {
-        self.with_col(|col| db_command_proto(col, &input.json))
+        self.with_col(|col| {
+            db_command_proto(col, &mut self.db_cursors.lock().unwrap(), &input.json)
+        })
     }
 
     fn run_db_command_for_row_count(&self, input: Json) -> Result<pb::generic::Int64> {
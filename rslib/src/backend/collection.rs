@@ -56,6 +56,7 @@ impl CollectionService for Backend {
         self.abort_media_sync_and_wait();
         let mut guard = self.lock_open_collection()?;
         let col_inner = guard.take().unwrap();
+        self.db_cursors.lock().unwrap().clear();
 
         if let Err(e) = col_inner.close(desired_version) {
             error!(" failed: {:?}", e);
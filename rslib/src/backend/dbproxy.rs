@@ -1,6 +1,8 @@
 // Copyright: Ankitects Pty Ltd and contributors
 // License: GNU AGPL, version 3 or later; http://www.gnu.org/licenses/agpl.html
 
+use std::collections::HashMap;
+
 use rusqlite::params_from_iter;
 use rusqlite::types::FromSql;
 use rusqlite::types::FromSqlError;
@@ -11,6 +13,7 @@ use rusqlite::OptionalExtension;
 use serde_derive::Deserialize;
 use serde_derive::Serialize;
 
+use super::dbwire;
 use crate::pb;
 use crate::pb::ankidroid::sql_value::Data;
 use crate::pb::ankidroid::DbResponse;
@@ -27,6 +30,9 @@ pub(super) enum DbRequest {
         sql: String,
         args: Vec<SqlValue>,
         first_row_only: bool,
+        /// Return the rows in dbwire's format rather than JSON.
+        #[serde(default)]
+        binary: bool,
     },
     Begin,
     Commit,
@@ -35,16 +41,163 @@ pub(super) enum DbRequest {
         sql: String,
         args: Vec<Vec<SqlValue>>,
     },
+    /// Returns a query's columns by name, in dbwire's format.
+    Columns {
+        sql: String,
+        args: Vec<SqlValue>,
+    },
+    /// Opens a cursor over a query's rows, returning the first batch.
+    Iterate {
+        sql: String,
+        args: Vec<SqlValue>,
+        batch_size: usize,
+        /// A unique, non-null column the rows are read in order of, so each
+        /// batch can start after the last one's key.
+        key: String,
+    },
+    /// Returns the next batch of a cursor's rows.
+    Fetch {
+        cursor: u32,
+        batch_size: usize,
+    },
+    /// Discards a cursor that wasn't read to the end.
+    CloseCursor {
+        cursor: u32,
+    },
 }
 
 #[derive(Serialize)]
 #[serde(untagged)]
 pub(super) enum DbResult {
     Rows(Vec<Vec<SqlValue>>),
+    Batch {
+        cursor: u32,
+        rows: Vec<Vec<SqlValue>>,
+        done: bool,
+    },
+    Columns {
+        names: Vec<String>,
+        rows: Vec<Vec<SqlValue>>,
+    },
     None,
 }
 
-#[derive(Serialize, Deserialize, Debug)]
+/// An open DBProxy cursor.
+///
+/// A prepared statement borrows the connection, so it can't be kept open
+/// between db commands. Instead, each batch re-runs the query for the rows
+/// after the previous batch's last key, which the key column's index (if it
+/// has one) finds without reading the rows before them. Only one batch of
+/// rows is ever in memory, and the first arrives without waiting for the rest
+/// of the query.
+struct DbCursor {
+    sql: String,
+    args: Vec<SqlValue>,
+    key: String,
+    last_key: Option<SqlValue>,
+}
+
+impl DbCursor {
+    /// The next batch_size rows, and whether they're the last.
+    fn next_batch(
+        &mut self,
+        ctx: &SqliteStorage,
+        batch_size: usize,
+    ) -> Result<(Vec<Vec<SqlValue>>, bool)> {
+        let batch_size = batch_size.max(1);
+        // one more than is returned, to tell if there are any left
+        let limit = SqlValue::Int(batch_size as i64 + 1);
+        // numbered after the query's own arguments
+        let first = self.args.len() + 1;
+        let key = &self.key;
+        let (sql, window): (String, Vec<&SqlValue>) = match &self.last_key {
+            None => (
+                format!("select * from ({}) order by {key} limit ?{first}", self.sql),
+                vec![&limit],
+            ),
+            Some(last_key) => (
+                format!(
+                    "select * from ({}) where {key} > ?{first} order by {key} limit ?{}",
+                    self.sql,
+                    first + 1
+                ),
+                vec![last_key, &limit],
+            ),
+        };
+        let (names, mut rows) = db_query_columns(ctx, &sql, self.args.iter().chain(window))?;
+
+        let done = rows.len() <= batch_size;
+        rows.truncate(batch_size);
+        if let Some(last) = rows.last() {
+            let idx = names
+                .iter()
+                .position(|name| name == key)
+                .or_invalid(format!("cursor key {key} is not a column"))?;
+            self.last_key = Some(last[idx].clone());
+        }
+
+        Ok((rows, done))
+    }
+}
+
+/// The open DBProxy cursors.
+#[derive(Default)]
+pub(crate) struct DbCursors {
+    next_id: u32,
+    open: HashMap<u32, DbCursor>,
+}
+
+impl DbCursors {
+    fn open(
+        &mut self,
+        ctx: &SqliteStorage,
+        sql: String,
+        args: Vec<SqlValue>,
+        key: String,
+        batch_size: usize,
+    ) -> Result<DbResult> {
+        require!(
+            !key.is_empty() && key.chars().all(|c| c.is_ascii_alphanumeric() || c == '_'),
+            "invalid cursor key: {key}"
+        );
+        self.next_id = self.next_id.wrapping_add(1);
+        let cursor = self.next_id;
+        self.open.insert(
+            cursor,
+            DbCursor {
+                // it's wrapped in a subquery
+                sql: sql.trim().trim_end_matches(';').into(),
+                args,
+                key,
+                last_key: None,
+            },
+        );
+        self.fetch(ctx, cursor, batch_size)
+    }
+
+    fn fetch(&mut self, ctx: &SqliteStorage, cursor: u32, batch_size: usize) -> Result<DbResult> {
+        let open = self
+            .open
+            .get_mut(&cursor)
+            .or_invalid(format!("no such cursor: {cursor}"))?;
+        let result = open.next_batch(ctx, batch_size);
+        if !matches!(result, Ok((_, false))) {
+            self.open.remove(&cursor);
+        }
+        let (rows, done) = result?;
+        Ok(DbResult::Batch { cursor, rows, done })
+    }
+
+    fn close(&mut self, cursor: u32) {
+        self.open.remove(&cursor);
+    }
+
+    pub(super) fn clear(&mut self) {
+        self.open.clear();
+    }
+}
+
+#[derive(Serialize, Deserialize, Debug, Clone)]
 #[serde(untagged)]
 pub(super) enum SqlValue {
     Null,
@@ -116,17 +269,44 @@ impl FromSql for SqlValue {
     }
 }
 
-pub(super) fn db_command_bytes(col: &mut Collection, input: &[u8]) -> Result<Vec<u8>> {
-    serde_json::to_vec(&db_command_bytes_inner(col, input)?).map_err(Into::into)
+pub(super) fn db_command_bytes(
+    col: &mut Collection,
+    cursors: &mut DbCursors,
+    input: &[u8],
+) -> Result<Vec<u8>> {
+    let req = parse_request(input)?;
+    let binary = matches!(req, DbRequest::Query { binary: true, .. });
+    match run_request(col, cursors, req)? {
+        DbResult::Rows(rows) if binary => Ok(dbwire::encode_rows(&rows)),
+        DbResult::Columns { names, rows } => Ok(dbwire::encode_columns(&names, &rows)),
+        result => serde_json::to_vec(&result).map_err(Into::into),
+    }
 }
 
-pub(super) fn db_command_bytes_inner(col: &mut Collection, input: &[u8]) -> Result<DbResult> {
-    let req: DbRequest = serde_json::from_slice(input)?;
+pub(super) fn db_command_bytes_inner(
+    col: &mut Collection,
+    cursors: &mut DbCursors,
+    input: &[u8],
+) -> Result<DbResult> {
+    run_request(col, cursors, parse_request(input)?)
+}
+
+/// Requests are JSON, apart from executemany, which may be sent in binary.
+fn parse_request(input: &[u8]) -> Result<DbRequest> {
+    if input.starts_with(dbwire::MAGIC) {
+        dbwire::decode_request(input)
+    } else {
+        serde_json::from_slice(input).map_err(Into::into)
+    }
+}
+
+fn run_request(col: &mut Collection, cursors: &mut DbCursors, req: DbRequest) -> Result<DbResult> {
     let resp = match req {
         DbRequest::Query {
             sql,
             args,
             first_row_only,
+            ..
         } => {
             update_state_after_modification(col, &sql);
             if first_row_only {
@@ -156,6 +336,27 @@ pub(super) fn db_command_bytes_inner(col: &mut Collection, input: &[u8]) -> Resu
             update_state_after_modification(col, &sql);
             db_execute_many(&col.storage, &sql, &args)?
         }
+        DbRequest::Columns { sql, args } => {
+            update_state_after_modification(col, &sql);
+            let (names, rows) = db_query_columns(&col.storage, &sql, &args)?;
+            DbResult::Columns { names, rows }
+        }
+        DbRequest::Iterate {
+            sql,
+            args,
+            batch_size,
+            key,
+        } => {
+            update_state_after_modification(col, &sql);
+            cursors.open(&col.storage, sql, args, key, batch_size)?
+        }
+        DbRequest::Fetch { cursor, batch_size } => {
+            cursors.fetch(&col.storage, cursor, batch_size)?
+        }
+        DbRequest::CloseCursor { cursor } => {
+            cursors.close(cursor);
+            DbResult::None
+        }
     };
     Ok(resp)
 }
@@ -178,11 +379,17 @@ fn is_dql(sql: &str) -> bool {
     head.starts_with("select")
 }
 
-pub(crate) fn db_command_proto(col: &mut Collection, input: &[u8]) -> Result<DbResponse> {
-    let result = db_command_bytes_inner(col, input)?;
+pub(crate) fn db_command_proto(
+    col: &mut Collection,
+    cursors: &mut DbCursors,
+    input: &[u8],
+) -> Result<DbResponse> {
+    let result = db_command_bytes_inner(col, cursors, input)?;
     let proto_resp = match result {
         DbResult::None => ProtoDbResult { rows: Vec::new() },
-        DbResult::Rows(rows) => ProtoDbResult::from(&rows),
+        DbResult::Rows(rows) | DbResult::Batch { rows, .. } | DbResult::Columns { rows, .. } => {
+            ProtoDbResult::from(&rows)
+        }
     };
     let trimmed = super::ankidroid::db::trim_and_cache_remaining(
         col,
@@ -217,7 +424,17 @@ pub(super) fn db_query_row(ctx: &SqliteStorage, sql: &str, args: &[SqlValue]) ->
 }
 
 pub(super) fn db_query(ctx: &SqliteStorage, sql: &str, args: &[SqlValue]) -> Result<DbResult> {
+    Ok(DbResult::Rows(db_query_columns(ctx, sql, args)?.1))
+}
+
+/// The column names of a query, and its rows.
+fn db_query_columns<'a>(
+    ctx: &SqliteStorage,
+    sql: &str,
+    args: impl IntoIterator<Item = &'a SqlValue>,
+) -> Result<(Vec<String>, Vec<Vec<SqlValue>>)> {
     let mut stmt = ctx.db.prepare_cached(sql)?;
+    let names = stmt.column_names().into_iter().map(Into::into).collect();
     let columns = stmt.column_count();
 
     let res: std::result::Result<Vec<Vec<_>>, rusqlite::Error> = stmt
@@ -231,7 +448,7 @@ pub(super) fn db_query(ctx: &SqliteStorage, sql: &str, args: &[SqlValue]) -> Res
         })?
         .collect();
 
-    Ok(DbResult::Rows(res?))
+    Ok((names, res?))
 }
 
 pub(super) fn db_execute_many(
@@ -0,0 +1,273 @@
+// Copyright: Ankitects Pty Ltd and contributors
+// License: GNU AGPL, version 3 or later; http://www.gnu.org/licenses/agpl.html
+
+//! Binary encoding of the rows exchanged with DBProxy, which avoids the cost
+//! of JSON for large results. See pylib/anki/_dbwire.py for the format.
+
+use super::dbproxy::DbRequest;
+use super::dbproxy::SqlValue;
+use crate::prelude::*;
+
+/// Starts binary requests and results; can't start a JSON document.
+pub(super) const MAGIC: &[u8] = b"\xa7\x01";
+/// Starts the result of a columns request, whose rows follow the column names.
+const COLUMNS_MAGIC: &[u8] = b"\xa7\x02";
+
+const EXECUTE_MANY: u8 = 1;
+
+const NULL: u8 = 0;
+const INT: u8 = 1;
+const REAL: u8 = 2;
+const TEXT: u8 = 3;
+const BLOB: u8 = 4;
+const MIXED: u8 = 5;
+
+fn value_type(value: &SqlValue) -> u8 {
+    match value {
+        SqlValue::Null => NULL,
+        SqlValue::Int(_) => INT,
+        SqlValue::Double(_) => REAL,
+        SqlValue::String(_) => TEXT,
+        SqlValue::Blob(_) => BLOB,
+    }
+}
+
+fn push_u32(out: &mut Vec<u8>, value: usize) {
+    out.extend_from_slice(&(value as u32).to_le_bytes());
+}
+
+pub(super) fn encode_rows(rows: &[Vec<SqlValue>]) -> Vec<u8> {
+    let columns = rows.first().map_or(0, Vec::len);
+    let mut out = Vec::with_capacity(MAGIC.len() + 8 + rows.len() * columns * 9);
+    out.extend_from_slice(MAGIC);
+    encode_block(&mut out, rows, columns);
+    out
+}
+
+pub(super) fn encode_columns(names: &[String], rows: &[Vec<SqlValue>]) -> Vec<u8> {
+    let size: usize = names.iter().map(|name| name.len() + 4).sum();
+    let mut out =
+        Vec::with_capacity(COLUMNS_MAGIC.len() + 12 + size + rows.len() * names.len() * 9);
+    out.extend_from_slice(COLUMNS_MAGIC);
+    push_u32(&mut out, names.len());
+    for name in names {
+        push_u32(&mut out, name.len());
+        out.extend_from_slice(name.as_bytes());
+    }
+    encode_block(&mut out, rows, names.len());
+    out
+}
+
+/// Row and column counts, then each column's type and values.
+fn encode_block(out: &mut Vec<u8>, rows: &[Vec<SqlValue>], columns: usize) {
+    push_u32(out, rows.len());
+    push_u32(out, columns);
+
+    for column in 0..columns {
+        let values = || rows.iter().map(move |row| &row[column]);
+        let mut types = values().map(value_type);
+        let first = types.next().unwrap_or(NULL);
+        let kind = if types.all(|kind| kind == first) {
+            first
+        } else {
+            MIXED
+        };
+        out.push(kind);
+
+        match kind {
+            NULL => (),
+            TEXT => {
+                let mut size = 0;
+                for value in values() {
+                    if let SqlValue::String(s) = value {
+                        push_u32(out, s.chars().count());
+                        size += s.len();
+                    }
+                }
+                push_u32(out, size);
+                for value in values() {
+                    if let SqlValue::String(s) = value {
+                        out.extend_from_slice(s.as_bytes());
+                    }
+                }
+            }
+            BLOB => {
+                for value in values() {
+                    if let SqlValue::Blob(b) = value {
+                        push_u32(out, b.len());
+                    }
+                }
+                for value in values() {
+                    if let SqlValue::Blob(b) = value {
+                        out.extend_from_slice(b);
+                    }
+                }
+            }
+            _ => {
+                for value in values() {
+                    if kind == MIXED {
+                        out.push(value_type(value));
+                    }
+                    match value {
+                        SqlValue::Null => (),
+                        SqlValue::Int(i) => out.extend_from_slice(&i.to_le_bytes()),
+                        SqlValue::Double(d) => out.extend_from_slice(&d.to_le_bytes()),
+                        SqlValue::String(s) => {
+                            push_u32(out, s.len());
+                            out.extend_from_slice(s.as_bytes());
+                        }
+                        SqlValue::Blob(b) => {
+                            push_u32(out, b.len());
+                            out.extend_from_slice(b);
+                        }
+                    }
+                }
+            }
+        }
+    }
+}
+
+/// Decodes a binary request; only executemany is sent this way.
+pub(super) fn decode_request(input: &[u8]) -> Result<DbRequest> {
+    let mut reader = Reader {
+        data: &input[MAGIC.len()..],
+    };
+    let kind = reader.u8()?;
+    require!(kind == EXECUTE_MANY, "unknown binary db request {kind}");
+    let sql_len = reader.u32()?;
+    let sql = reader.string(sql_len)?;
+    let args = decode_rows(&mut reader)?;
+    Ok(DbRequest::ExecuteMany { sql, args })
+}
+
+fn decode_rows(reader: &mut Reader) -> Result<Vec<Vec<SqlValue>>> {
+    let count = reader.u32()?;
+    let columns = reader.u32()?;
+    let mut rows: Vec<Vec<SqlValue>> = (0..count).map(|_| Vec::with_capacity(columns)).collect();
+
+    for _ in 0..columns {
+        let kind = reader.u8()?;
+        match kind {
+            NULL => rows.iter_mut().for_each(|row| row.push(SqlValue::Null)),
+            TEXT => {
+                let lengths = reader.u32s(count)?;
+                let size = reader.u32()?;
+                let text = reader.str(size)?;
+                let mut rest = text;
+                for (row, length) in rows.iter_mut().zip(lengths) {
+                    // lengths are in characters, so Python can slice one str
+                    let end = rest
+                        .char_indices()
+                        .nth(length)
+                        .map_or(rest.len(), |(idx, _)| idx);
+                    row.push(SqlValue::String(rest[..end].to_string()));
+                    rest = &rest[end..];
+                }
+            }
+            BLOB => {
+                let lengths = reader.u32s(count)?;
+                for (row, length) in rows.iter_mut().zip(lengths) {
+                    row.push(SqlValue::Blob(reader.take(length)?.to_vec()));
+                }
+            }
+            INT | REAL | MIXED => {
+                for row in rows.iter_mut() {
+                    let value_kind = if kind == MIXED { reader.u8()? } else { kind };
+                    row.push(reader.value(value_kind)?);
+                }
+            }
+            _ => invalid_input!("unknown db column type {kind}"),
+        }
+    }
+
+    Ok(rows)
+}
+
+struct Reader<'a> {
+    data: &'a [u8],
+}
+
+impl<'a> Reader<'a> {
+    fn take(&mut self, len: usize) -> Result<&'a [u8]> {
+        require!(self.data.len() >= len, "truncated binary db request");
+        let (head, rest) = self.data.split_at(len);
+        self.data = rest;
+        Ok(head)
+    }
+
+    fn u8(&mut self) -> Result<u8> {
+        Ok(self.take(1)?[0])
+    }
+
+    fn u32(&mut self) -> Result<usize> {
+        Ok(u32::from_le_bytes(self.take(4)?.try_into().unwrap()) as usize)
+    }
+
+    fn u32s(&mut self, count: usize) -> Result<Vec<usize>> {
+        (0..count).map(|_| self.u32()).collect()
+    }
+
+    fn bytes8(&mut self) -> Result<[u8; 8]> {
+        Ok(self.take(8)?.try_into().unwrap())
+    }
+
+    fn str(&mut self, len: usize) -> Result<&'a str> {
+        std::str::from_utf8(self.take(len)?).or_invalid("invalid utf8 in db request")
+    }
+
+    fn string(&mut self, len: usize) -> Result<String> {
+        self.str(len).map(ToString::to_string)
+    }
+
+    fn value(&mut self, kind: u8) -> Result<SqlValue> {
+        Ok(match kind {
+            NULL => SqlValue::Null,
+            INT => SqlValue::Int(i64::from_le_bytes(self.bytes8()?)),
+            REAL => SqlValue::Double(f64::from_le_bytes(self.bytes8()?)),
+            TEXT => {
+                let len = self.u32()?;
+                SqlValue::String(self.string(len)?)
+            }
+            BLOB => {
+                let len = self.u32()?;
+                SqlValue::Blob(self.take(len)?.to_vec())
+            }
+            _ => invalid_input!("unknown db value type {kind}"),
+        })
+    }
+}
+
+#[cfg(test)]
+mod test {
+    use super::*;
+
+    #[test]
+    fn execute_many_round_trip() -> Result<()> {
+        let rows = vec![
+            vec![
+                SqlValue::Int(1),
+                SqlValue::String("añb".into()),
+                SqlValue::Null,
+                SqlValue::Blob(vec![0, 1]),
+            ],
+            vec![
+                SqlValue::Int(-2),
+                SqlValue::String("".into()),
+                SqlValue::Double(1.5),
+                SqlValue::Blob(vec![]),
+            ],
+        ];
+        let mut input = MAGIC.to_vec();
+        input.push(EXECUTE_MANY);
+        input.extend_from_slice(&3u32.to_le_bytes());
+        input.extend_from_slice(b"sql");
+        input.extend_from_slice(&encode_rows(&rows)[MAGIC.len()..]);
+
+        let DbRequest::ExecuteMany { sql, args } = decode_request(&input)? else {
+            unreachable!()
+        };
+        assert_eq!(sql, "sql");
+        assert_eq!(format!("{args:?}"), format!("{rows:?}"));
+        Ok(())
+    }
+}
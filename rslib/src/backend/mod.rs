@@ -11,6 +11,7 @@ mod cardrendering;
 mod collection;
 mod config;
 mod dbproxy;
+mod dbwire;
 mod deckconfig;
 mod decks;
 mod error;
@@ -63,6 +64,7 @@ use self::sync::SyncService;
 use self::sync::SyncState;
 use self::tags::TagsService;
 use crate::backend::dbproxy::db_command_bytes;
+use crate::backend::dbproxy::DbCursors;
 use crate::pb;
 use crate::pb::backend::ServiceIndex;
 use crate::prelude::*;
@@ -76,6 +78,7 @@ pub struct Backend {
     runtime: OnceCell<Runtime>,
     state: Arc<Mutex<BackendState>>,
     backup_task: Arc<Mutex<Option<JoinHandle<Result<()>>>>>,
+    db_cursors: Arc<Mutex<DbCursors>>,
 }
 
 #[derive(Default)]
@@ -108,6 +111,7 @@ impl Backend {
             runtime: OnceCell::new(),
             state: Arc::new(Mutex::new(BackendState::default())),
             backup_task: Arc::new(Mutex::new(None)),
+            db_cursors: Arc::new(Mutex::new(DbCursors::default())),
         }
     }
 
@@ -195,6 +199,6 @@ impl Backend {
     }
 
     fn db_command(&self, input: &[u8]) -> Result<Vec<u8>> {
-        self.with_col(|col| db_command_bytes(col, input))
+        self.with_col(|col| db_command_bytes(col, &mut self.db_cursors.lock().unwrap(), input))
     }
 }